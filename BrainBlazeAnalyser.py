@@ -1,61 +1,228 @@
 
-import time
-import json
-import os
 import argparse
 
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-import re
 from datetime import timedelta, datetime, timezone
-from dateutil.parser import isoparse
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Iterable, Iterator, Tuple
 
 from google_access_lib import YouTubeWrapper
+from channel_sync import sync_channel_videos, refresh_video_details, metadata_max_age, \
+    statistics_max_age
+from video_store import VideoStore, DEFAULT_STORE_FN
+from view_history import ViewHistory, DEFAULT_VIEW_HISTORY_DIR
+from channel_registry import ChannelRegistry, RegisteredChannelID, DEFAULT_REGISTRY_FN
+from iso8601 import ISO8601_duration_to_time_delta, _ISO8601_duration_pattern, \
+    _ISO8601_duration_seconds
+
+def ISO8601_durations_to_seconds(values) -> pd.Series:
+    """
+    function to convert a whole column of ISO8601 relative periods (used for video durations)
+    into a number of seconds in a single vectorised pass, this is much faster than applying
+    ISO8601_duration_to_time_delta to each entry
+
+    :param values: Series (or other sequence) of strings containing ISO durations
+    :return: duration in seconds as a nullable integer Series, entries that could not be
+             processed are <NA>
+    """
+    values = pd.Series(values, dtype='string')
+    analysis = values.str.extract(_ISO8601_duration_pattern)
+
+    seconds = pd.Series(0, index=values.index, dtype='Int64')
+    for unit, unit_seconds in _ISO8601_duration_seconds.items():
+        seconds += analysis[unit].astype('Int64').fillna(0) * unit_seconds
+
+    # an entry that did not match (or matched but has no values, e.g. "PT") is invalid
+    invalid = analysis.isna().all(axis=1)
+    if invalid.any():
+        print(f'failed to process: {list(values[invalid])}')
+    seconds[invalid] = pd.NA
+
+    return seconds
 
-def ISO8601_duration_to_time_delta(value: str) -> Optional[timedelta]:
+def ISO8601_timestamps_to_datetime(values) -> pd.Series:
     """
-    function to convert ISO8601 relative periods (used for video durations) into a Python
-    timedelta
+    function to convert a whole column of ISO8601 timestamps (for example the publishedAt of
+    the videos) into a datetime64[ns, UTC] Series in a single vectorised pass
 
-    :param value: a string containing a ISO duration
-    :return: duration as a timedelta
+    :param values: Series (or other sequence) of strings containing ISO timestamps
+    :return: Series of UTC timestamps
     """
+    # YouTube only includes the fractional seconds when they are not zero, without the format
+    # pandas infers it from the first timestamp and fails on the ones with a different precision
+    return pd.to_datetime(pd.Series(values), utc=True, format='ISO8601')
+
+# writers known to have written Brain Blaze videos, these are the categories of the Writer column
+known_writers = ['Unknown', 'Liam Bird', 'Kevin Jennings']
+
+# compact column types used by all the video DataFrames, the channel and writer are repeated on
+# every row so are stored as categories. Any column in a DataFrame which is not listed keeps its
+# type
+video_DataFrame_schema = {'Channel': 'category',
+                          'channel_id': 'category',
+                          'Writer': pd.CategoricalDtype(known_writers),
+                          'Stream': 'bool',
+                          'Likes': 'Int32',
+                          'Dislikes': 'Int32',
+                          'Views': 'uint64',
+                          'Like:Dislike Ratio': 'float32',
+                          'Like:Views Ratio': 'float32',
+                          'Dislikes:Views Ratio': 'float32'}
+
+def apply_video_schema(DataFrame: pd.DataFrame) -> pd.DataFrame:
+    """
+    function to convert the columns of a video DataFrame to the compact types defined in
+    video_DataFrame_schema
+
+    :param DataFrame: video DataFrame
+    :return: DataFrame with the columns converted
+    """
+    return DataFrame.astype({column: dtype for column, dtype in video_DataFrame_schema.items()
+                             if column in DataFrame.columns})
 
-    if value[0:2] == 'PT':
-        analysis = re.findall(r'(\d+\D)', value[2:])
-
-        if analysis is None:
-            print(f'failed to process: {value}')
-            return None
-        else:
-            min = 0
-            sec = 0
-            hour = 0
-            for entry in analysis:
-                if entry[-1] == 'M':
-                    min = int(entry[:-1])
-                elif entry[-1] == 'S':
-                    sec = int(entry[:-1])
-                elif entry[-1] == 'H':
-                    hour = int(entry[:-1])
-                else:
-                    print('unhanded subsection {entry} in {value}')
-
-            return timedelta(minutes=min, seconds=sec, hours=hour)
-    else:
-        print(f'string should start PT, {value}')
-        return None
+class VideoColumns:
+    """
+    Column buffers the video metadata records are appended to one at a time, so a DataFrame can
+    be built from a stream of records (for example pages arriving from the API) without first
+    collecting the records in a list. The buffers are preallocated arrays which are doubled in
+    size when they fill up
+
+    :param capacity: initial number of rows, if the number of videos is known in advance the
+                     buffers never need to grow
+    """
+
+    # buffers for each column, the strings are kept as references to the strings of the records
+    # and the publish times and durations are parsed for the whole column at once when the
+    # DataFrame is built
+    _column_dtypes = {'video_id': object,
+                      'Title': object,
+                      'Channel': object,
+                      'publishedAt': object,
+                      'duration': object,
+                      'Stream': np.bool_,
+                      'Likes': np.int64,
+                      'Dislikes': np.float64,
+                      'Views': np.uint64}
+
+    def __init__(self, capacity: int = 1024):
+        self.__size = 0
+        self.__columns = {name: np.empty(max(capacity, 1), dtype=dtype)
+                          for name, dtype in self._column_dtypes.items()}
+
+    def __len__(self):
+        return self.__size
+
+    def __grow(self):
+        capacity = 2 * len(self.__columns['video_id'])
+        for name, column in self.__columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.__size] = column[:self.__size]
+            self.__columns[name] = grown
+
+    def append(self, video_data: dict):
+        """
+        Append a video metadata record, as returned by YouTubeWrapper.get_metadata_bulk
+        """
+        if self.__size == len(self.__columns['video_id']):
+            self.__grow()
+        row = self.__size
+        columns = self.__columns
+        statistics = video_data['statistics']
+
+        columns['video_id'][row] = video_data['video_id']
+        columns['Title'][row] = video_data['title']
+        columns['Channel'][row] = video_data['Channel']
+        columns['publishedAt'][row] = video_data['publishedAt']
+        columns['duration'][row] = video_data['contentDetails']['duration']
+        # the key is present (set to None) for videos that were never live
+        columns['Stream'][row] = video_data.get('liveStreamingDetails') is not None
+        columns['Likes'][row] = int(statistics['likeCount'])
+        columns['Dislikes'][row] = int(statistics['dislikeCount']) \
+            if 'dislikeCount' in statistics else np.nan
+        columns['Views'][row] = int(statistics['viewCount'])
+        self.__size += 1
+
+    def extend(self, videos_detail: Iterable[dict]):
+        """
+        Append a sequence (or generator) of video metadata records
+        """
+        for video_data in videos_detail:
+            self.append(video_data)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        The filled part of a column buffer
+        """
+        return self.__columns[name][:self.__size]
+
+    def DataFrame(self) -> pd.DataFrame:
+        """
+        Build a DataFrame of the videos appended so far, with the same columns as
+        BrainBlazeDataSet.DataFrame
+
+        :return: DataFrame with a row for each video, indexed by video ID
+        """
+        # the details are keyed by their own video_id, videos that have been deleted since the
+        # search was run are not in the details so the two lists do not necessarily line up
+        DataFrame = pd.DataFrame({
+            'Title': self.column('Title'),
+            'Channel': self.column('Channel'),
+            'Published Time': ISO8601_timestamps_to_datetime(self.column('publishedAt')).array,
+            'Duration (s)': ISO8601_durations_to_seconds(self.column('duration')).to_numpy(
+                dtype='float64', na_value=np.nan),
+            'Stream': self.column('Stream'),
+            'Likes': self.column('Likes'),
+            'Dislikes': self.column('Dislikes'),
+            'Views': self.column('Views')},
+            index=self.column('video_id'))
+        # videos whose duration could not be processed are excluded
+        DataFrame = DataFrame[DataFrame['Duration (s)'].notna()]
+
+        DataFrame['Like:Dislike Ratio'] = DataFrame['Likes'] / DataFrame['Dislikes']
+        DataFrame['Like:Views Ratio'] = DataFrame['Likes'] / DataFrame['Views']
+        DataFrame['Dislikes:Views Ratio'] = DataFrame['Dislikes'] / DataFrame['Views']
+        DataFrame['Views Seconds'] = DataFrame['Duration (s)'] * DataFrame['Views']
+        DataFrame['Writer'] = 'Unknown'
+
+        return apply_video_schema(DataFrame)
+
+def memory_footprint(DataFrame: pd.DataFrame) -> pd.DataFrame:
+    """
+    function to report the memory used by each column of a DataFrame
+
+    :param DataFrame: DataFrame to report on
+    :return: DataFrame with the type, total bytes and bytes per row of each column (and the
+             index)
+    """
+    usage = DataFrame.memory_usage(index=True, deep=True)
+    dtypes = DataFrame.dtypes.astype(str)
+    dtypes['Index'] = str(DataFrame.index.dtype)
+
+    footprint = pd.DataFrame({'dtype': dtypes.reindex(usage.index), 'bytes': usage})
+    footprint['bytes per row'] = footprint['bytes'] / max(len(DataFrame), 1)
+    footprint.loc['Total'] = ['', footprint['bytes'].sum(), footprint['bytes per row'].sum()]
+
+    return footprint
+
+def rolling_average(values, window: int = 10) -> np.ndarray:
+    """
+    function to calculate the rolling average of a sequence of values, for example the durations
+    of videos in publication order
+
+    :param values: Series (or other sequence) of numbers
+    :param window: number of consecutive values in each average
+    :return: array of averages, the first value is the average of the first window values so the
+             array is window - 1 shorter than the values
+    """
+    return np.convolve(values, np.ones(window) / window, mode='valid')
 
 # constant used in the code to determine
 three_month_back = datetime.now(tz=timezone.utc) - timedelta(weeks=13)
 
 class BrainBlazeDataSet:
 
-    # YouTube Channel ID for Brain Blaze (formally known as Business Blaze)
-    brain_blaze_channel_ID = 'UCYY5GWf7MHFJ6DZeHreoXgw'
     # First ever BrainBlaze Video
     dawn_brain_blaze = datetime(year=2019,
                                 month=9,
@@ -63,44 +230,66 @@ class BrainBlazeDataSet:
                                 tzinfo=timezone.utc)
 
     # YouTube heavily restrict their API usage, to help manage daily allowances, this library uses
-    # a data cache, stored in some JSON files
-    _brain_blaze_video_fn = 'brain_blaze_videos.json'
-    _detailed_blaze_video_fn = 'detailed_brain_blaze_videos.json'
+    # a data cache, stored in a SQLite database shared with the other scripts (see video_store)
+    _video_store_fn = DEFAULT_STORE_FN
+    # daily snapshots of the statistics, recorded each time they are refreshed (see view_history)
+    _view_history_dir = DEFAULT_VIEW_HISTORY_DIR
+    # the channels analysed, only the Brain Blaze channel is loaded (see channel_registry)
+    _channel_registry_fn = DEFAULT_REGISTRY_FN
+    # YouTube Channel ID for Brain Blaze (formally known as Business Blaze)
+    brain_blaze_channel_ID = RegisteredChannelID('brain_blaze')
+
+    # engine used to find the videos on each channel, walking the uploads playlist costs 1 quota
+    # unit per page against 100 for a search, see YouTubeWrapper.channel_videos
+    channel_video_engine = 'uploads'
 
     def __init__(self, api_key):
 
         self.easy_wrapper = YouTubeWrapper()
         self.easy_wrapper.initialize(api_key=api_key)
+        self.video_store = VideoStore(self._video_store_fn)
+        self.easy_wrapper.response_cache = self.video_store
+        self.channel_registry = ChannelRegistry(self._channel_registry_fn)
+        self.view_history = ViewHistory(self._view_history_dir,
+                                        start_date=self.dawn_brain_blaze.date())
+
+        # the DataFrame is built once and cached, it is discarded when the videos change
+        self.__DataFrame_cache = None
+        # the videos in the data set are versioned, each change bumps the version and the
+        # DataFrame records the version it was built from. Only the IDs are held, the metadata is
+        # streamed from the video store when the DataFrame is built
+        self.__DataFrame_version = None
+        self.__detail_version = 0
+        self.__brain_blaze_videos = []
+        self.__brain_blaze_video_ids = ()
 
         # the data set is split into brain blaze videos and other simon whistler videos, this
         # allow the usage of the YouTube API to be managed, for example the analyser by default
         # retrieves data on every brain blaze video ever made but restricts other channels to the
         # last three months
         self.brain_blaze_videos = self.retrieve_brain_blaze_videos()
-        self.brain_blaze_videos_detail = self.retrieve_brain_blaze_videos_details()
+        self.brain_blaze_video_ids = self.retrieve_brain_blaze_videos_details()
 
     def retrieve_brain_blaze_videos(self):
 
-        return self.channel_videos(cache_file=self._brain_blaze_video_fn,
-                                   channel_id_list=[self.brain_blaze_channel_ID],
-                                   earliest_date=self.dawn_brain_blaze)
+        first_published = self.channel_registry['brain_blaze'].first_published
+        return self.channel_videos(channel_id_list=[self.brain_blaze_channel_ID],
+                                   earliest_date=first_published or self.dawn_brain_blaze)
 
-    def retrieve_brain_blaze_videos_details(self):
+    def retrieve_brain_blaze_videos_details(self) -> List[str]:
 
-        return self.video_details(cache_file=self._detailed_blaze_video_fn,
-                                  videos=self.brain_blaze_videos)
+        return self.update_video_details(videos=self.brain_blaze_videos)
 
-    def channel_videos(self, cache_file: str, earliest_date: datetime, channel_id_list: List[str]):
+    def channel_videos(self, earliest_date: datetime, channel_id_list: List[str]):
         """
         Search for Video published on a channel (or list of channels), this has two modes of
-        operation, depending on whether the cache exists or not:
-        - If the cache does not exist it retrieves all videos from earliest date
-        - If the cache exists it looks for video after the last date in the cache
+        operation, depending on whether the channel is already in the video store or not:
+        - If the channel is not in the store it retrieves all videos from earliest date
+        - If the channel is in the store it looks for video after the last date in the store,
+          using the per-channel high water mark (see channel_sync)
 
         This search returns some basic information in each video found
 
-        :param cache_file: filename of the file to use as the cache
-        :type cache_file: str
         :param earliest_date: date to start the search from
         :type earliest_date: datetime
         :param channel_id_list: list of the YouTube channel IDs to search
@@ -108,143 +297,186 @@ class BrainBlazeDataSet:
 
         :return:
         """
-        def get_videos(search_start_date):
-
-            vid_list = []
-            for channel_id in channel_id_list:
-                vid_list += self.easy_wrapper.channel_videos(channelID=channel_id,
-                                                             order='date',
-                                                             publishedAfter=search_start_date)
+        return sync_channel_videos(easy_wrapper=self.easy_wrapper,
+                                   video_store=self.video_store,
+                                   earliest_date=earliest_date,
+                                   channel_id_list=channel_id_list,
+                                   engine=self.channel_video_engine)
 
-            return vid_list
+    @staticmethod
+    def _get_video_id_list(videos):
 
-        if os.path.isfile(cache_file) is False:
-            # The cache file does not exist and must be generated from scratch
-            videos = get_videos(earliest_date)
+        id_list = []
+        for video in videos:
+            id_list.append(video['video_id'])
 
-            with open(cache_file, 'w') as fp:
-                json.dump(videos, fp)
+        return id_list
 
-        else:
-            # cache file exists and must be updated
-            with open(cache_file) as fp:
-                videos = json.load(fp)
+    def update_video_details(self, videos) -> List[str]:
+        """
+        Bring the detailed metadata for a list of videos up to date in the video store, using the
+        store to minimise the API usage. Only videos that are not already in the store are
+        requested in full and these are fetched in bulk (50 videos per API call), the views and
+        likes change daily so for the other videos only the statistics are refreshed once they
+        are a day old
 
-            last_update_time = os.path.getmtime(cache_file)
-            current_time = time.time()
-            one_day_secs = 24 * 60 * 60
-            if (current_time - one_day_secs) > last_update_time:
-                # if the file was last updated more than 24 hours ago do an update
+        :param videos: videos (as returned by channel_videos) to get the details for
 
-                # find the latest video publish date in the set of videos read from the cache
-                videos = get_videos(earliest_date)
+        :return: IDs of the videos with metadata in the store, in the order of the videos
+                 (deleted and private videos have none)
+        """
+        video_ids = self._get_video_id_list(videos=videos)
+        refresh_video_details(easy_wrapper=self.easy_wrapper,
+                              video_store=self.video_store,
+                              video_ids=video_ids,
+                              max_age=metadata_max_age,
+                              statistics_max_age=statistics_max_age,
+                              view_history=self.view_history)
+        fetched_at = self.video_store.detail_fetched_at(video_ids)
+        return [video_id for video_id in video_ids if video_id in fetched_at]
+
+    def video_details(self, videos) -> Iterator[dict]:
+        """
+        Retrieve the detailed metadata for a list of videos, see update_video_details
 
-                with open(cache_file, 'w') as fid:
-                    json.dump(videos, fid)
-            else:
-                print(f'{cache_file=} is less than 24 hours old no update performed')
+        :param videos: videos (as returned by channel_videos) to get the details for
 
-        return videos
+        :return: generator of video metadata records, read from the store a chunk at a time
+        """
+        return self.video_store.iter_details(self.update_video_details(videos=videos))
 
-    @staticmethod
-    def _get_video_id_list(videos):
+    @property
+    def brain_blaze_videos(self) -> List[dict]:
+        return self.__brain_blaze_videos
 
-        id_list = []
-        for video in videos:
-            id_list.append(video['video_id'])
+    @brain_blaze_videos.setter
+    def brain_blaze_videos(self, value: List[dict]):
+        self.__brain_blaze_videos = value
+        self.__DataFrame_cache = None
 
-        return id_list
+    @property
+    def brain_blaze_video_ids(self) -> Tuple[str, ...]:
+        """
+        The IDs of the videos in the data set, these are held as a tuple so they can only be
+        changed through the setter (or add_videos), which keeps the cached DataFrame in step
+        with them
+        """
+        return self.__brain_blaze_video_ids
 
-    def video_details(self, cache_file, videos):
+    @brain_blaze_video_ids.setter
+    def brain_blaze_video_ids(self, value: Iterable[str]):
+        self.__brain_blaze_video_ids = tuple(value)
+        self.__detail_version += 1
 
-        if os.path.isfile(cache_file) is False:
-            videos_details = []
-            for video in videos:
-                video_detail = self.easy_wrapper.get_metadata(video_id=video['video_id'])
-                videos_details.append(video_detail)
+    @property
+    def brain_blaze_videos_detail(self) -> Iterator[dict]:
+        """
+        The video metadata records of the data set, streamed from the video store
+        """
+        return self.video_store.iter_details(self.__brain_blaze_video_ids)
 
+    def add_videos(self, video_ids: Iterable[str]):
+        """
+        Add (or update) videos in the data set, if the DataFrame has already been built it is
+        extended with the new rows rather than rebuilt. An updated video keeps its position, new
+        videos are added at the end
 
-            with open(cache_file, 'w') as fp:
-                json.dump(videos_details, fp)
-        else:
-            with open(cache_file) as fp:
-                videos_details = json.load(fp)
+        :param video_ids: IDs of videos with metadata in the store, as returned by
+                          update_video_details
+        """
+        video_ids = list(video_ids)
+        cache_valid = self.__DataFrame_cache is not None and \
+            self.__DataFrame_version == self.__detail_version
+
+        merged_video_ids = dict.fromkeys(self.__brain_blaze_video_ids)
+        merged_video_ids.update(dict.fromkeys(video_ids))
+        self.__brain_blaze_video_ids = tuple(merged_video_ids)
+        self.__detail_version += 1
+
+        if cache_valid:
+            DataFrame = pd.concat([self.__DataFrame_cache,
+                                   self._build_DataFrame(self.video_store.iter_details(video_ids),
+                                                         capacity=len(video_ids))])
+            # an updated video replaces the existing row, the rows are put back in the order of
+            # the IDs and the categories of the two parts may differ so the schema is applied
+            # again
+            DataFrame = DataFrame[~DataFrame.index.duplicated(keep='last')]
+            self.__DataFrame_cache = apply_video_schema(
+                DataFrame.reindex(list(self.__brain_blaze_video_ids)))
+            self.__DataFrame_version = self.__detail_version
+
+    def refresh(self):
+        """
+        Bring the data set up to date with the channel, only the videos that are not already in
+        the data set have their details added, so the cached DataFrame is extended rather than
+        rebuilt
+        """
+        # assigned directly as the DataFrame is built from the IDs which are only extended
+        self.__brain_blaze_videos = self.retrieve_brain_blaze_videos()
+        known_video_ids = set(self.__brain_blaze_video_ids)
+        new_videos = [video for video in self.__brain_blaze_videos
+                      if video['video_id'] not in known_video_ids]
+        if len(new_videos) > 0:
+            self.add_videos(self.update_video_details(videos=new_videos))
 
-            last_update_time = os.path.getmtime(cache_file)
-            current_time = time.time()
-            one_day_secs = 24 * 60 * 60
-            if (current_time - one_day_secs) > last_update_time:
-                # if the file was last updated more than 24 hours ago do an update
+    @property
+    def _cached_DataFrame(self) -> pd.DataFrame:
+        """
+        The cached DataFrame, (re)built if the videos have changed since it was last built. This
+        must not be modified, the public properties return copies
+        """
+        if self.__DataFrame_cache is None or self.__DataFrame_version != self.__detail_version:
+            # the records are streamed from the store into the column buffers a chunk at a time
+            self.__DataFrame_cache = self._build_DataFrame(
+                self.video_store.iter_details(self.__brain_blaze_video_ids),
+                capacity=len(self.__brain_blaze_video_ids))
+            self.__DataFrame_version = self.__detail_version
 
-                video_id_list = self._get_video_id_list(videos=videos)
-                detailed_video_id_list = self._get_video_id_list(videos=videos_details)
+        return self.__DataFrame_cache
 
-                for video_id in video_id_list:
-                    if video_id not in detailed_video_id_list:
+    @staticmethod
+    def _build_DataFrame(videos_detail: Iterable[dict],
+                         capacity: Optional[int] = None) -> pd.DataFrame:
+        """
+        Build a DataFrame from a list (or generator) of video metadata records, the records are
+        appended to column buffers one at a time
 
-                        video_detail = self.easy_wrapper.get_metadata(video_id=video_id,
-                                                                      include_comments=False)
-                        videos_details.append(video_detail)
+        :param videos_detail: video metadata records as returned by video_details
+        :param capacity: optional number of records expected, for a generator
+        :return: DataFrame with a row for each video, indexed by video ID
+        """
+        if capacity is None:
+            capacity = len(videos_detail) if hasattr(videos_detail, '__len__') else 1024
+        columns = VideoColumns(capacity=capacity)
+        columns.extend(videos_detail)
 
-                    with open(cache_file, 'w') as fp:
-                        json.dump(videos_details, fp)
-            else:
-                print(f'{cache_file=} is less than 24 hours old no update performed')
+        return columns.DataFrame()
 
+    @property
+    def DataFrame(self) -> pd.DataFrame:
+        """
+        Return a DataFrame with all the videos in the data set, this is only built the first time
+        it is used (or after the videos change), each call returns a copy so the caller is free
+        to modify it
 
-        return videos_details
+        :return:
+        """
+        return self._cached_DataFrame.copy()
 
-    @property
-    def DataFrame(self):
-
-        # create a panda dataframe for the data
-        duration_list = []
-        published_list = []
-        title_list = []
-        stream_list = []
-        views_list = []
-        like_list = []
-        dislike_list = []
-        video_id_list = []
-        channel_list = []
-
-        videos = self.brain_blaze_videos
-        videos_detail = self.brain_blaze_videos_detail
-
-        for (video_summary, video_data) in zip(videos, videos_detail):
-
-            duration = ISO8601_duration_to_time_delta(video_data['contentDetails']['duration'])
-            if duration is None:
-                continue
-
-            channel_list.append(video_data['Channel'])
-            duration_list.append(duration.total_seconds())
-            published_list.append(isoparse(video_data['publishedAt']))
-            stream_list.append('liveStreamingDetails' in video_data.keys())
-            views_list.append(int(video_data['statistics']['viewCount']))
-            like_list.append(int(video_data['statistics']['likeCount']))
-            if 'dislikeCount' in video_data['statistics']:
-                dislike_list.append(int(video_data['statistics']['dislikeCount']))
-            else:
-                dislike_list.append(np.nan)
-            video_id_list.append(video_summary['video_id'])
-            title_list.append(video_data['title'])
-
-        DataFrame = pd.DataFrame({'Title': title_list,
-                                        'Channel': channel_list,
-                                        'Published Time': published_list,
-                                        'Duration (s)': duration_list,
-                                        'Stream': stream_list,
-                                        'Likes': like_list,
-                                        'Dislikes': dislike_list,
-                                        'Views': views_list}, index=video_id_list)
-        DataFrame['Like:Dislike Ratio'] = DataFrame['Likes'] / DataFrame['Dislikes']
-        DataFrame['Like:Views Ratio'] = DataFrame['Likes'] / DataFrame['Views']
-        DataFrame['Dislikes:Views Ratio'] = DataFrame['Dislikes'] / DataFrame['Views']
-        DataFrame['Views Seconds'] = DataFrame['Duration (s)'] * DataFrame['Views']
-        DataFrame['Writer'] = 'Unknown'
+    def views_in_first_days(self, days: int = 7) -> pd.DataFrame:
+        """
+        Return the views each video had a number of days after it was published, from the daily
+        snapshots of the statistics, so the early performance of the channels can be compared
 
-        return DataFrame
+        :param days: number of days after publication
+        :return: DataFrame with the Channel and Views of each video, indexed by video ID, the
+                 views are NaN for videos without a snapshot in that period
+        """
+        df = self._cached_DataFrame
+        views = self.view_history.value_after_days(dict(zip(df.index, df['Published Time'])),
+                                                   days=days)
+        return pd.DataFrame({'Channel': df['Channel'],
+                             'Views': pd.Series(views, dtype='float64').reindex(df.index)})
 
     @property
     def blaze_DataFrame(self) -> pd.DataFrame:
@@ -253,8 +485,8 @@ class BrainBlazeDataSet:
 
         :return:
         """
-        df = self.DataFrame
-        return df[df['Channel'] == 'Brain Blaze']
+        df = self._cached_DataFrame
+        return df[df['Channel'] == 'Brain Blaze'].copy()
 
     @property
     def scripted_blaze_DataFrame(self) -> pd.DataFrame:
@@ -308,7 +540,7 @@ if __name__ == "__main__":
     non_epic = video_DataFrame_noStreams[video_DataFrame_noStreams['Duration (s)'] / 60 < 80]
     epic =  video_DataFrame_noStreams[video_DataFrame_noStreams['Duration (s)'] / 60 >= 80]
     plt.plot(video_DataFrame_noStreams['Published Time'][9:],
-             np.convolve(video_DataFrame_noStreams['Duration (s)'] / 60, np.ones(10) / 10)[9:-9],
+             rolling_average(video_DataFrame_noStreams['Duration (s)'] / 60, window=10),
              linewidth=5,
              color='grey',
              label='10 Video rolling average')
@@ -344,7 +576,7 @@ if __name__ == "__main__":
 
     writer_fig = plt.figure()
     ax = plt.gca()
-    writer_summary = video_DataFrame_noStreams.groupby('Writer')['Duration (s)'].sum() / 60
+    writer_summary = video_DataFrame_noStreams.groupby('Writer', observed=True)['Duration (s)'].sum() / 60
     writer_summary.plot(kind='pie', autopct='%.5f%%', pctdistance=1.2, labeldistance=1.5,
                         ylabel='',
                         title='Cumulative Total of Brain Blaze Video Duration by Writer')
@@ -1,39 +1,27 @@
 
-from typing import List
-import datetime
-import time
-import json
+from typing import List, Optional, Tuple
 import os
+import datetime
 import argparse
 from random import randint
 
-from dateutil.parser import isoparse
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
 import numpy as np
-import tweepy
 
-from BrainBlazeAnalyser import ISO8601_duration_to_time_delta
+from BrainBlazeAnalyser import ISO8601_durations_to_seconds, ISO8601_timestamps_to_datetime, \
+    apply_video_schema
 from google_access_lib import YouTubeWrapper
-
-today = datetime.date.today()
-midnight_monday = datetime.datetime.combine(time=datetime.time(),
-                                            date=today - datetime.timedelta(days=today.weekday(),
-                                                                            weeks=0),
-                                            tzinfo=datetime.timezone.utc)
-minight_last_monday = datetime.datetime.combine(time=datetime.time(),
-                                                date=today - datetime.timedelta(days=today.weekday(),
-                                                                                weeks=1),
-                                                tzinfo=datetime.timezone.utc)
-midight_13_week_ago_monday = datetime.datetime.combine(time=datetime.time(),
-                                                date=today - datetime.timedelta(days=today.weekday(),
-                                                                                weeks=13),
-                                                tzinfo=datetime.timezone.utc)
-midight_12_week_ago_monday = datetime.datetime.combine(time=datetime.time(),
-                                                date=today - datetime.timedelta(days=today.weekday(),
-                                                                                weeks=12),
-                                                tzinfo=datetime.timezone.utc)
+from channel_sync import sync_channel_videos, sync_video_details, one_day_secs, \
+    metadata_max_age, batches
+from video_store import VideoStore, DEFAULT_STORE_FN
+from channel_registry import ChannelRegistry, RegisteredChannelIDs, DEFAULT_REGISTRY_FN
+from report_period import ReportPeriod
+from weekly_cube import WeeklyCube
+from weekly_metrics import WeeklyMetrics
+from figure_renderer import FigureRenderer
+from publisher import TweetPublisher, Post
 
 import pandas as pd
 
@@ -42,83 +30,70 @@ class BrainBlazeInfoGraphic:
     class for retrieving data about Simon Whistler YouTube Channels
     """
 
-    # YouTube Channel ID other Simon Whistler YouTube channels, these are used to make sure
-    # Simon is not overly focusing on the "wrong" channels
-    whistler_channels = ['UCYY5GWf7MHFJ6DZeHreoXgw',  # BrainBlaze
-                         'UC0woBco6Dgcxt0h8SwyyOmw',  # Megaprojects
-                         'UC3Wn3dABlgESm8Bzn8Vamgg',  # Side Projects
-                         'UCVH8lH7ZLDUe_d9mZ3dlyYQ',  # xplrd
-                         'UCf-U0uPVQZtcqXUWa_Hl4Mw',  # Into the shadows
-                         'UCp1tsmksyf6TgKFMdt8-05Q',  # Casual Crimalist
-                         'UC64UiPJwM_e9AqAd7RiD7JA',  # Today I found Out
-                         'UCZdWrz8pF6B5Y_c6Zi6pmdQ',  # decoding the unknown
-                         'UC9h8BDcXwkhZtnqoQJ7PggA',  # Warographics
-                         'UC2NW669ad9CX7KxmykdHbqA',  # The Simon Whistler Show
-                         'UC6udLPIYhLsi_w7MD0iD0tw',  # Science of Science Fiction
-                         'UCMjQHrxCqxxYRGIkjQeKhIw']  # Astrographics
-
-    _video_cache_fn = 'BrainBlazeInfoGraphic_video_cache.json'
-    _video_detail_cache_fn = 'BrainBlazeInfoGraphic_video_detail_cache.json'
-    _channel_cache_fn = 'BrainBlazeInfoGraphic_channel_cache.json'
-
-    def __init__(self, api_key, earliest_date=midight_13_week_ago_monday):
-
-        self.easy_wrapper = YouTubeWrapper()
-        self.easy_wrapper.initialize(api_key=api_key)
+    # the Simon Whistler YouTube channels are the whistler group of the channel registry (see
+    # channel_registry), these are used to make sure Simon is not overly focusing on the "wrong"
+    # channels
+    _channel_registry_fn = DEFAULT_REGISTRY_FN
+    whistler_channels = RegisteredChannelIDs('whistler')
+
+    # the data is cached in a SQLite database shared with the other scripts (see video_store)
+    _video_store_fn = DEFAULT_STORE_FN
+
+    # engine used to find the videos on each channel, walking the uploads playlist costs 1 quota
+    # unit per page against 100 for a search, see YouTubeWrapper.channel_videos
+    channel_video_engine = 'uploads'
+    # number of channels crawled concurrently and the overall ceiling on the YouTube API request
+    # rate shared by all of them
+    crawl_max_workers = 6
+    max_requests_per_second = 10.0
 
+    def __init__(self, api_key, earliest_date: Optional[datetime.datetime] = None):
 
+        if earliest_date is None:
+            earliest_date = ReportPeriod.for_date().earliest_date
+
+        self.easy_wrapper = YouTubeWrapper(max_requests_per_second=self.max_requests_per_second)
+        self.easy_wrapper.initialize(api_key=api_key)
+        self.video_store = VideoStore(self._video_store_fn)
+        self.easy_wrapper.response_cache = self.video_store
+        self.channel_registry = ChannelRegistry(self._channel_registry_fn)
 
         # the data set is split into brain blaze videos and other simon whistler videos, this
         # allow the usage of the YouTube API to be managed, for example the analyser by default
         # retrieves data on every brain blaze video ever made but restricts other channels to the
         # last three months
-        self.videos = self._channel_videos(cache_file=self._video_cache_fn,
-                                           channel_id_list=self.whistler_channels,
+        self.videos = self._channel_videos(channel_id_list=self.whistler_channels,
                                            earliest_date=earliest_date)
-        self.videos_detail = self._video_details(cache_file=self._video_detail_cache_fn,
-                                                 videos=self.videos)
+        self.videos_detail = self._video_details(videos=self.videos)
 
     @property
     def channels(self):
 
-        if os.path.isfile(self._channel_cache_fn) is False:
-            channel_data = self.easy_wrapper.channel(channelID=','.join(self.whistler_channels))
-
-            with open(self._channel_cache_fn, 'w') as fp:
-                json.dump(channel_data, fp)
-
+        whistler_channels = self.whistler_channels
+        channel_data = self.video_store.channels(whistler_channels, max_age=one_day_secs)
+        if len(channel_data) < len(whistler_channels):
+            # if the channels were last updated more than 24 hours ago do an update, the API
+            # accepts up to 50 channel IDs in a request
+            channel_data = []
+            for channel_id_list in batches(whistler_channels,
+                                           self.easy_wrapper.max_ids_per_request):
+                channel_data += self.easy_wrapper.channel(channelID=','.join(channel_id_list))
+            self.video_store.upsert_channels(channel_data)
         else:
-            last_update_time = os.path.getmtime(self._channel_cache_fn)
-            current_time = time.time()
-            one_day_secs = 24 * 60 * 60
-            if (current_time - one_day_secs) > last_update_time:
-                # if the file was last updated more than 24 hours ago do an update
-
-                # The cache file does not exist and must be generated from scratch
-                channel_data = self.easy_wrapper.channel(channelID=','.join(self.whistler_channels))
-
-                with open(self._channel_cache_fn, 'w') as fp:
-                    json.dump(channel_data, fp)
-            else:
-                print(f'{self._channel_cache_fn=} is less than 24 hours old no update performed')
-
-                # cache file exists and must be updated
-                with open(self._channel_cache_fn) as fp:
-                    channel_data = json.load(fp)
+            print('channels are less than 24 hours old no update performed')
 
         return channel_data
 
-    def _channel_videos(self, cache_file: str, earliest_date: datetime, channel_id_list: List[str]):
+    def _channel_videos(self, earliest_date: datetime, channel_id_list: List[str]):
         """
         Search for Video published on a channel (or list of channels), this has two modes of
-        operation, depending on whether the cache exists or not:
-        - If the cache does not exist it retrieves all videos from earliest date
-        - If the cache exists it looks for video after the last date in the cache
+        operation, depending on whether the channel is already in the video store or not:
+        - If the channel is not in the store it retrieves all videos from earliest date
+        - If the channel is in the store it looks for video after the last date in the store,
+          using the per-channel high water mark (see channel_sync)
 
         This search returns some basic information in each video found
 
-        :param cache_file: filename of the file to use as the cache
-        :type cache_file: str
         :param earliest_date: date to start the search from
         :type earliest_date: datetime
         :param channel_id_list: list of the YouTube channel IDs to search
@@ -126,77 +101,28 @@ class BrainBlazeInfoGraphic:
 
         :return:
         """
-        def get_videos(search_start_date):
-
-            vid_list = []
-            for channel_id in channel_id_list:
-                vid_list += self.easy_wrapper.channel_videos(channelID=channel_id,
-                                                             order='date',
-                                                             publishedAfter=search_start_date)
-
-            return vid_list
-
-        if os.path.isfile(cache_file) is False:
-            # The cache file does not exist and must be generated from scratch
-            videos = get_videos(earliest_date)
-
-            with open(cache_file, 'w') as fp:
-                json.dump(videos, fp)
-
-        else:
-            last_update_time = os.path.getmtime(cache_file)
-            current_time = time.time()
-            one_day_secs = 24 * 60 * 60
-            if (current_time - one_day_secs) > last_update_time:
-                # if the file was last updated more than 24 hours ago do an update
-
-                # The cache file does not exist and must be generated from scratch
-                videos = get_videos(earliest_date)
-
-                with open(cache_file, 'w') as fp:
-                    json.dump(videos, fp)
-            else:
-                print(f'{cache_file=} is less than 24 hours old no update performed')
-
-                # cache file exists and must be updated
-                with open(cache_file) as fp:
-                    videos = json.load(fp)
+        return sync_channel_videos(easy_wrapper=self.easy_wrapper,
+                                   video_store=self.video_store,
+                                   earliest_date=earliest_date,
+                                   channel_id_list=channel_id_list,
+                                   engine=self.channel_video_engine,
+                                   max_workers=self.crawl_max_workers)
 
-        return videos
-
-    def _get_videos_meta_data(self, video_id):
-
-        if len(video_id) > 50:
-            items = []
-            for start_point in range(0, len(video_id), 50):
-                end_point = start_point + 50
-                if end_point > len(video_id):
-                    end_point = len(video_id)
-
-                results = self.easy_wrapper.service.videos().list(id=video_id[start_point:end_point],
-                                                                  part="id, snippet, contentDetails").execute()
-                items.extend( results.get("items", []))
-
-
-        else:
-            results = self.easy_wrapper.service.videos().list(id=video_id,
-                                             part="id, snippet, contentDetails").execute()
-            items = results.get("items", [])
-
-        output = []
-        for item in items:
-            output_record = dict.fromkeys(['video_id', 'duration'], None)
-
-            output_record['video_id'] = item['id']
-            output_record['duration'] = item['contentDetails']['duration']
-            output_record['channel_id'] = item['snippet']['channelId']
-            output_record['title'] = item['snippet']['title']
-            output_record['Channel'] = item['snippet']['channelTitle']
-            output_record['publishedAt'] = item['snippet']['publishedAt']
+    @staticmethod
+    def _summary_record(video_detail):
+        """
+        Reduce a video metadata record from the store to the fields used by the infographic
+        """
+        output_record = dict.fromkeys(['video_id', 'duration'], None)
 
-            output.append(output_record)
+        output_record['video_id'] = video_detail['video_id']
+        output_record['duration'] = video_detail['contentDetails']['duration']
+        output_record['channel_id'] = video_detail['channel_id']
+        output_record['title'] = video_detail['title']
+        output_record['Channel'] = video_detail['Channel']
+        output_record['publishedAt'] = video_detail['publishedAt']
 
-        return output
+        return output_record
 
     @staticmethod
     def _get_video_id_list(videos):
@@ -204,114 +130,124 @@ class BrainBlazeInfoGraphic:
         video_df = pd.DataFrame(videos)
         return list(video_df['video_id'])
 
-    def _video_details(self, cache_file, videos):
+    def _video_details(self, videos):
 
         video_id_list = self._get_video_id_list(videos)
 
-        if os.path.isfile(cache_file) is False:
+        # the infographic only uses the title, channel, duration and publish date which almost
+        # never change, so the statistics are not refreshed
+        videos_details = sync_video_details(easy_wrapper=self.easy_wrapper,
+                                            video_store=self.video_store,
+                                            video_ids=video_id_list,
+                                            max_age=metadata_max_age)
 
-            videos_details = self._get_videos_meta_data(video_id_list)
+        return [self._summary_record(video_detail) for video_detail in videos_details]
 
-            with open(cache_file, 'w') as fp:
-                json.dump(videos_details, fp)
-        else:
-
-
-            last_update_time = os.path.getmtime(cache_file)
-            current_time = time.time()
-            one_day_secs = 24 * 60 * 60
-            if (current_time - one_day_secs) > last_update_time:
-                # if the file was last updated more than 24 hours ago do an update
-                videos_details = self._get_videos_meta_data(video_id_list)
-
-                with open(cache_file, 'w') as fp:
-                    json.dump(videos_details, fp)
-            else:
-                print(f'{cache_file=} is less than 24 hours old no update performed')
+    @staticmethod
+    def _build_DataFrame(videos_detail: List[dict]) -> pd.DataFrame:
+        """
+        Build a DataFrame from a list of video summary records
 
-                with open(cache_file) as fp:
-                    videos_details = json.load(fp)
+        :param videos_detail: video summary records as returned by _video_details
+        :return: DataFrame with a row for each video, indexed by video ID
+        """
+        b = pd.DataFrame(videos_detail)
+        b.set_index('video_id', inplace=True)
+        # the publish times and durations are parsed for the whole column at once
+        b['Published Time'] = ISO8601_timestamps_to_datetime(b['publishedAt'])
+        b.drop('publishedAt', axis=1, inplace=True)
+        b['Duration (s)'] = ISO8601_durations_to_seconds(b['duration']).to_numpy(dtype='float64',
+                                                                                na_value=np.nan)
+        b.drop('duration', axis=1, inplace=True)
 
-        return videos_details
+        return apply_video_schema(b.drop_duplicates(keep='last'))
 
     @property
     def _df_videos_details(self):
 
-        b = pd.DataFrame(self.videos_detail)
-        b.set_index('video_id', inplace=True)
-        b['Published Time'] = b['publishedAt'].apply(isoparse)
-        b.drop('publishedAt', axis=1, inplace=True)
-        b['Duration (s)'] = b['duration'].apply(ISO8601_duration_to_time_delta).dt.total_seconds()
-        b.drop('duration', axis=1, inplace=True)
-
-        return b.drop_duplicates(keep='last')
+        return self._build_DataFrame(self.videos_detail)
 
     @property
     def DataFrame(self):
 
         return self._df_videos_details
 
-parse = argparse.ArgumentParser(description='Weekly Office of Basement accountabilit generator')
-parse.add_argument('-youtubeapikey', type=str, required=True)
-parse.add_argument('-twitter_consumer_key', type=str, required=True)
-parse.add_argument('-twitter_consumer_secret', type=str, required=True)
-parse.add_argument('-twitter_access_token', type=str, required=True)
-parse.add_argument('-twitter_access_secret', type=str, required=True)
-parse.add_argument('-test_mode', action='store_true')
-parse.add_argument('-test_mode_dm_user_name', type=str)
+def weekly_channel_totals(videos: pd.DataFrame):
+    """
+    Group the videos by channel and by the week (starting on a Monday) they were published
+
+    :param videos: video DataFrame, as returned by BrainBlazeInfoGraphic.DataFrame
+    :return: tuple of the number of videos and their total duration in minutes, each a Series
+             indexed by channel and week
+    """
+    grouped = videos.groupby(
+        ['Channel', pd.Grouper(key='Published Time', freq='W-MON', origin='start_day')],
+        observed=True)['Duration (s)']
 
+    return grouped.count(), grouped.sum() / 60
 
-if __name__ == "__main__":
 
-    command_args = parse.parse_args()
+def report_channel_list(channels: List[dict]) -> List[str]:
+    """
+    Names of the channels in the order they appear in the report, Brain Blaze first and then the
+    rest alphabetically
 
-    data_class = BrainBlazeInfoGraphic(api_key=command_args.youtubeapikey)
-    channel_list = []
-    for channel_entry in data_class.channels:
-        channel_list.append(channel_entry['title'])
-    channel_list.sort()
+    :param channels: channel records, as returned by BrainBlazeInfoGraphic.channels
+    """
+    channel_list = sorted(channel_entry['title'] for channel_entry in channels)
     channel_list.remove('Brain Blaze')
     channel_list.insert(0, 'Brain Blaze')
 
-    # inforgraphic
-    three_month_videos = data_class.DataFrame
-
-    
-    # Simon occasionally posts a large archive video with multiple episodes, normally
-    # Casual Criminalist
-    three_month_videos.drop(index=three_month_videos[three_month_videos['Duration (s)'] > 3*60*60].index,
-                            inplace=True, errors='ignore')
-
-    grouped_count = \
-        three_month_videos.groupby(
-            ['Channel', pd.Grouper(key='Published Time', freq='W-MON', origin='start_day')])[
-        'Duration (s)'].count()
-    grouped_count.fillna(0)
-    grouped_duration = \
-        three_month_videos.groupby(
-            ['Channel', pd.Grouper(key='Published Time', freq='W-MON', origin='start_day')])[
-            'Duration (s)'].sum() / 60
-    grouped_duration.fillna(0)
-    grouped_percentage_duration = grouped_duration / grouped_duration.groupby('Published Time').sum() * 100
-
-    max_brain_blaze_video_per_week = grouped_count.loc['Brain Blaze'].max()
+    return channel_list
+
+
+def weekly_channel_totals_from_cube(weekly_cube: WeeklyCube, channel_id_list: List[str],
+                                    period: ReportPeriod):
+    """
+    Read the weekly totals of the weeks shown in a report from the weekly totals kept in the
+    video store, this takes the same time whatever the number of videos in the store
+
+    Simon occasionally posts a large archive video with multiple episodes, normally Casual
+    Criminalist, these are left out
+
+    :param weekly_cube: weekly totals of the video store
+    :param channel_id_list: YouTube channel IDs to include
+    :param period: period of the report
+    :return: tuple of the number of videos and their total duration in minutes, each a Series
+             indexed by channel and week, as returned by weekly_channel_totals
+    """
+    totals = pd.DataFrame(weekly_cube.totals(channel_id_list=channel_id_list,
+                                             first_week=period.plot_start,
+                                             last_week=period.week_end,
+                                             include_archives=False),
+                          columns=['channel_id', 'Channel', 'week_end', 'video_count', 'duration',
+                                   'views_seconds'])
+    totals['Published Time'] = pd.to_datetime(totals['week_end'], utc=True)
+    totals.set_index(['Channel', 'Published Time'], inplace=True)
+
+    return totals['video_count'].rename('Duration (s)'), \
+        totals['duration'].rename('Duration (s)') / 60
+
+
+def report_figures(metrics: WeeklyMetrics) -> Tuple[go.Figure, go.Figure]:
+    """
+    Build the weekly infographic and the pie chart for a report period
+
+    :param metrics: indicators of the report period
+    :return: tuple of the infographic and pie chart figures
+    """
+    period = metrics.period
+    channel_list = metrics.channel_list
 
     fig = make_subplots(rows=2, cols=4,
                         row_heights=[0.8, 0.2],
-                        subplot_titles=['Content by Channel (last 12 weeks)'],
+                        subplot_titles=[f'Content by Channel (last {period.history_weeks} weeks)'],
                         specs=[[{"type": "xy", "colspan": 4},None, None, None],
                                [{"type": "domain"}, {"type": "domain"}, {"type": "domain"}, {"type": "domain"}]])
 
-    data_to_plot = grouped_duration.unstack('Channel').loc[midight_12_week_ago_monday:midnight_monday]
-    # add data for missing channels
-    inactive_channel=[]
-    for channel in channel_list:
-        if channel not in data_to_plot.columns:
-            data_to_plot[channel] = 0
-            inactive_channel.append(channel)
-
+    data_to_plot = metrics.durations
     for index, channel in enumerate(channel_list):
-        if channel in inactive_channel:
+        if channel in metrics.inactive_channels:
             channel_name = f'{channel} (inactive)'
         else:
             channel_name = channel
@@ -326,97 +262,171 @@ if __name__ == "__main__":
                                  stackgroup='one'),
                         row=1, col=1)
 
+    total_duration = metrics.total_duration
     fig.add_trace(go.Indicator(mode="gauge+number+delta",
-                                value=grouped_duration.unstack('Channel').loc[midnight_monday].sum(),
-                                delta={'reference': grouped_duration.unstack('Channel').loc[minight_last_monday].sum()},
-                                gauge={'axis': {'range': [0, grouped_duration.groupby('Published Time').sum().max() * 1.2]},
-                                      'threshold': {'value': grouped_duration.groupby('Published Time').sum().mean() }},
-                                title={'text': "Total Simon Whistler Output (minutes)"}),
+                               value=total_duration.value,
+                               delta={'reference': total_duration.reference},
+                               gauge={'axis': {'range': [0, total_duration.maximum * 1.2]},
+                                      'threshold': {'value': total_duration.mean}},
+                               title={'text': "Total Simon Whistler Output (minutes)"}),
                   row=2, col=1)
 
+    focus_share = metrics.focus_share
     fig.add_trace(go.Indicator(
         mode="gauge+number+delta",
-        value=grouped_percentage_duration.unstack('Channel').fillna(0)['Brain Blaze'].loc[midnight_monday],
-        delta={'reference': grouped_percentage_duration.unstack('Channel').fillna(0)['Brain Blaze'].loc[minight_last_monday]},
+        value=focus_share.value,
+        delta={'reference': focus_share.reference},
         number={'suffix': '%'},
         gauge={'axis': {'range': [0, 100]},
-               'threshold': {'value': grouped_percentage_duration.groupby('Channel').mean()['Brain Blaze']}},
-        title={'text': "Brain Blaze<br>Percent of total content"}),
+               'threshold': {'value': focus_share.mean}},
+        title={'text': f"{metrics.focus_channel}<br>Percent of total content"}),
                   row=2, col=2)
 
+    focus_count = metrics.focus_count
     fig.add_trace(go.Indicator(
         mode="gauge+number+delta",
-        value=grouped_count.unstack('Channel').fillna(0)['Brain Blaze'].loc[midnight_monday],
-        delta={'reference': grouped_count.unstack('Channel').fillna(0)['Brain Blaze'].loc[minight_last_monday]},
-
-        gauge={'axis': {'range': [0, max_brain_blaze_video_per_week+2 ],
-                        'nticks' : int(max_brain_blaze_video_per_week+3) },
-               'threshold': {'value': grouped_count.groupby('Channel').mean()['Brain Blaze']}},
-        title={'text': "Brain Blaze<br>Number of Videos"}),
+        value=focus_count.value,
+        delta={'reference': focus_count.reference},
+        gauge={'axis': {'range': [0, focus_count.maximum + 2],
+                        'nticks': int(focus_count.maximum + 3)},
+               'threshold': {'value': focus_count.mean}},
+        title={'text': f"{metrics.focus_channel}<br>Number of Videos"}),
                   row=2, col=3)
 
+    focus_duration = metrics.focus_duration
     fig.add_trace(go.Indicator(
         mode="gauge+number+delta",
-        value=grouped_duration.unstack('Channel').fillna(0)['Brain Blaze'].loc[midnight_monday],
-        delta={'reference': grouped_duration.unstack('Channel').fillna(0)['Brain Blaze'].loc[minight_last_monday]},
-        gauge={'axis': {'range': [0, grouped_duration.groupby('Channel').max()['Brain Blaze'] * 1.2]},
-               'threshold': {'value': grouped_duration.groupby('Channel').mean()['Brain Blaze']}},
-        title={'text': "Brain Blaze<br>duration (minutes)"}),
+        value=focus_duration.value,
+        delta={'reference': focus_duration.reference},
+        gauge={'axis': {'range': [0, focus_duration.maximum * 1.2]},
+               'threshold': {'value': focus_duration.mean}},
+        title={'text': f"{metrics.focus_channel}<br>duration (minutes)"}),
                   row=2, col=4)
 
 
     fig.update_layout(height=1000, width=1600,
-                      title_text=f'Office of Basement Accountability, Weekly report for period ending {midnight_monday:%d %b %Y}',
+                      title_text=f'Office of Basement Accountability, Weekly report for period ending {period.week_end:%d %b %Y}',
                       title_x=0.5)
     fig.update_xaxes(title_text="Date of Week Start (always a Monday)", row=1, col=1)
-    fig.update_xaxes(dtick=7*24*60*60*1000, tick0=midight_12_week_ago_monday )
+    fig.update_xaxes(dtick=7*24*60*60*1000, tick0=period.plot_start)
     fig.update_yaxes(title_text="Content Duration (minutes)", row=1, col=1)
 
-    fig.write_image('bb_infographic.png', engine='kaleido')
-
-    data_for_this_week = data_to_plot.loc[midnight_monday].fillna(0)
-    pull = np.zeros(len(channel_list))
+    data_for_this_week = metrics.this_week_durations
     pie_channels = list(data_for_this_week.index.values)
-    pull[pie_channels.index('Brain Blaze')] = 0.2
+    pull = np.zeros(len(pie_channels))
+    pull[pie_channels.index(metrics.focus_channel)] = 0.2
 
     fig2 = go.Figure(data=[go.Pie(labels=pie_channels, values=list(data_for_this_week.values), textinfo='label+percent',
                            insidetextorientation='radial', pull=pull, showlegend=False)])
     fig2.update_layout(height=1000, width=1000,
-                      title_text=f'Office of Basement Accountability, weekly breakdown ending {midnight_monday:%d %b %Y} by Video Duration',
+                      title_text=f'Office of Basement Accountability, weekly breakdown ending {period.week_end:%d %b %Y} by Video Duration',
                       title_x=0.5)
-    fig2.write_image('bb_piechart.png', engine='kaleido')
 
-    auth = tweepy.OAuthHandler(consumer_key=command_args.twitter_consumer_key,
-                               consumer_secret=command_args.twitter_consumer_secret)
-    auth.set_access_token(key=command_args.twitter_access_token,
-                          secret=command_args.twitter_access_secret)
+    return fig, fig2
 
-    twitter_v1_api = tweepy.API(auth)
 
-    dashboard_upload = twitter_v1_api.media_upload('bb_infographic.png')
-    piechart_upload = twitter_v1_api.media_upload('bb_piechart.png')
+def tweet_report(command_args, infographic_fn: str, piechart_fn: str):
+    """
+    Tweet the weekly infographic and pie chart, the two images are uploaded together and the two
+    tweets are independent so they are posted in parallel (see publisher)
 
-    twitter_api = tweepy.Client(consumer_key=command_args.twitter_consumer_key,
-                                consumer_secret=command_args.twitter_consumer_secret,
-                                access_token=command_args.twitter_access_token,
-                                access_token_secret=command_args.twitter_access_secret)
+    :param command_args: command line arguments, with the twitter credentials
+    :param infographic_fn: file name of the infographic image
+    :param piechart_fn: file name of the pie chart image
+    """
+    publisher = TweetPublisher.from_credentials(
+        consumer_key=command_args.twitter_consumer_key,
+        consumer_secret=command_args.twitter_consumer_secret,
+        access_token=command_args.twitter_access_token,
+        access_secret=command_args.twitter_access_secret)
 
     if command_args.test_mode:
-        tweet_string = f'Test dashboard: {randint(0, (2**32)-1):d}'
-    else:
-        tweet_string = 'Weekly report from the Office of Basement Accountability'
-    dashboard_tweet = twitter_api.create_tweet(text=tweet_string,
-                                               media_ids=[dashboard_upload.media_id_string])
-    if command_args.test_mode:
-        tweet_string = f'Test piechart: {randint(0, (2**32)-1):d}'
+        posts = [Post(f'Test dashboard: {randint(0, (2**32)-1):d}', media=(infographic_fn,)),
+                 Post(f'Test piechart: {randint(0, (2**32)-1):d}', media=(piechart_fn,))]
     else:
-        tweet_string = 'Weekly @SimonWhistler Output Breakdown'
-    pie_tweet = twitter_api.create_tweet(text=tweet_string,
-                             media_ids=[piechart_upload.media_id_string])
+        posts = [Post('Weekly report from the Office of Basement Accountability',
+                      media=(infographic_fn,)),
+                 Post('Weekly @SimonWhistler Output Breakdown', media=(piechart_fn,))]
+    tweet_ids = publisher.publish(posts)
 
     if command_args.test_mode:
         print('Deleting the test tweets')
-        twitter_api.delete_tweet(id=pie_tweet[0]['id'])
-        twitter_api.delete_tweet(id=dashboard_tweet[0]['id'])
+        publisher.delete(tweet_ids)
 
+    print(publisher.summary())
 
+
+parse = argparse.ArgumentParser(description='Weekly Office of Basement accountabilit generator')
+parse.add_argument('-youtubeapikey', type=str, required=True)
+parse.add_argument('-twitter_consumer_key', type=str)
+parse.add_argument('-twitter_consumer_secret', type=str)
+parse.add_argument('-twitter_access_token', type=str)
+parse.add_argument('-twitter_access_secret', type=str)
+parse.add_argument('-test_mode', action='store_true')
+parse.add_argument('-test_mode_dm_user_name', type=str)
+parse.add_argument('-report_date', type=datetime.date.fromisoformat,
+                   help='report on the last complete week on or before this date (YYYY-MM-DD), '
+                        'by default the last complete week')
+parse.add_argument('-backfill_from', type=datetime.date.fromisoformat,
+                   help='generate (without tweeting) the reports for every week from this date '
+                        '(YYYY-MM-DD) up to the report date')
+parse.add_argument('-output_dir', type=str, default='.',
+                   help='directory the report images are written to')
+parse.add_argument('-render_workers', type=int, default=1,
+                   help='number of processes to render the report images in')
+
+twitter_arguments = ['twitter_consumer_key', 'twitter_consumer_secret', 'twitter_access_token',
+                     'twitter_access_secret']
+
+
+if __name__ == "__main__":
+
+    command_args = parse.parse_args()
+
+    if command_args.backfill_from is None:
+        missing_arguments = [argument for argument in twitter_arguments
+                             if getattr(command_args, argument) is None]
+        if len(missing_arguments) > 0:
+            parse.error('the following arguments are required to tweet the report: ' +
+                        ', '.join('-' + argument for argument in missing_arguments))
+        report_periods = [ReportPeriod.for_date(command_args.report_date)]
+    else:
+        report_periods = list(ReportPeriod.weeks(first_date=command_args.backfill_from,
+                                                 last_date=command_args.report_date or
+                                                 datetime.date.today()))
+        if len(report_periods) == 0:
+            parse.error('-backfill_from must be on or before the report date')
+
+    # the data set is loaded once, covering every report period
+    data_class = BrainBlazeInfoGraphic(api_key=command_args.youtubeapikey,
+                                       earliest_date=report_periods[0].earliest_date)
+    channel_list = report_channel_list(data_class.channels)
+
+    os.makedirs(command_args.output_dir, exist_ok=True)
+    with FigureRenderer(max_workers=command_args.render_workers) as renderer:
+        for period in report_periods:
+            if command_args.backfill_from is None:
+                infographic_fn = os.path.join(command_args.output_dir, 'bb_infographic.png')
+                piechart_fn = os.path.join(command_args.output_dir, 'bb_piechart.png')
+            else:
+                infographic_fn = os.path.join(command_args.output_dir,
+                                              f'bb_infographic_{period.week_end:%Y-%m-%d}.png')
+                piechart_fn = os.path.join(command_args.output_dir,
+                                           f'bb_piechart_{period.week_end:%Y-%m-%d}.png')
+
+            # the weekly totals are read from the video store rather than grouping the videos
+            grouped_count, grouped_duration = weekly_channel_totals_from_cube(
+                data_class.video_store.weekly_cube,
+                channel_id_list=data_class.whistler_channels, period=period)
+            metrics = WeeklyMetrics(grouped_count, grouped_duration,
+                                    channel_list=channel_list, period=period)
+            fig, fig2 = report_figures(metrics)
+            renderer.submit(fig, infographic_fn)
+            renderer.submit(fig2, piechart_fn)
+
+        # all the figures are rendered together so the renderer only starts once
+        renderer.render()
+        print(renderer.summary())
+
+    if command_args.backfill_from is None:
+        tweet_report(command_args, infographic_fn=infographic_fn, piechart_fn=piechart_fn)
@@ -1,191 +1,95 @@
-
-from typing import List
+"""
+Daily check for new Brain Blaze videos, which are tweeted. The uploads playlist is polled back to
+the last video already tweeted (see channel_sync.poll_new_uploads) so a run with nothing new
+costs a single quota unit, and each video is recorded in the video store once tweeted so a rerun
+does not tweet it again.
+
+This runs every day so it is kept lean, only the modules needed to find the new videos are
+imported at start up (tweepy is imported once there is something to tweet) and the videos are
+handled as plain records rather than DataFrames, see benchmarks/bench_startup.py for the start up
+time budget
+"""
+from typing import List, Optional
 import datetime
-import time
-import json
-import os
-from dateutil.parser import isoparse
 import argparse
 
 from google_access_lib import YouTubeWrapper
-
-
-import tweepy
-
-today = datetime.date.today()
-one_day_old = datetime.datetime.combine(time=datetime.time(),
-                                            date=today - datetime.timedelta(hours=24),
-                                            tzinfo=datetime.timezone.utc)
-
-
-import pandas as pd
+from channel_sync import poll_new_uploads, sync_video_details
+from video_store import VideoStore, DEFAULT_STORE_FN
+from publisher import TweetPublisher, Post
+from channel_registry import ChannelRegistry, RegisteredChannelID, DEFAULT_REGISTRY_FN
 
 class DailyBrainBlaze:
 
-    # YouTube Channel ID other Simon Whistler YouTube channels, thise are used to make sure
-    # Simon is not overly focusing on the "wrong" channels
-    BrainBlazeChannelID = 'UCYY5GWf7MHFJ6DZeHreoXgw'
+    # the channel polled for new videos, from the registry (see channel_registry)
+    _channel_registry_fn = DEFAULT_REGISTRY_FN
+    BrainBlazeChannelID = RegisteredChannelID('brain_blaze')
+
+    # the data is cached in a SQLite database shared with the other scripts (see video_store),
+    # this also holds the watermark and the videos already tweeted
+    _video_store_fn = DEFAULT_STORE_FN
 
-    _video_cache_fn = 'DailyBrainBlaze_video_cache.json'
-    _video_detail_cache_fn = 'DailyBrainBlaze_video_detail_cache.json'
+    # on the first run the videos published in this period before the run are new
+    first_poll_period = datetime.timedelta(hours=24)
 
     def __init__(self, api_key):
 
         self.easy_wrapper = YouTubeWrapper()
         self.easy_wrapper.initialize(api_key=api_key)
-
-        # the data set is split into brain blaze videos and other simon whistler videos, this
-        # allow the usage of the YouTube API to be managed, for example the analyser by default
-        # retrieves data on every brain blaze video ever made but restricts other channels to the
-        # last three months
-        self.videos = self._channel_videos(cache_file=self._video_cache_fn,
-                                           channel_id_list=[self.BrainBlazeChannelID],
-                                           earliest_date=one_day_old)
-        self.videos_detail = self._video_details(cache_file=self._video_detail_cache_fn,
-                                                 videos=self.videos)
-
-    def _channel_videos(self, cache_file: str, earliest_date: datetime, channel_id_list: List[str]):
-        """
-        Search for Video published on a channel (or list of channels), this has two modes of
-        operation, depending on whether the cache exists or not:
-        - If the cache does not exist it retrieves all videos from earliest date
-        - If the cache exists it looks for video after the last date in the cache
-
-        This search returns some basic information in each video found
-
-        :param cache_file: filename of the file to use as the cache
-        :type cache_file: str
-        :param earliest_date: date to start the search from
-        :type earliest_date: datetime
-        :param channel_id_list: list of the YouTube channel IDs to search
-        :type channel_id_list: List[str]
-
-        :return:
-        """
-        def get_videos(search_start_date):
-
-            vid_list = []
-            for channel_id in channel_id_list:
-                vid_list += self.easy_wrapper.channel_videos(channelID=channel_id,
-                                                             order='date',
-                                                             publishedAfter=search_start_date)
-
-            return vid_list
-
-        if os.path.isfile(cache_file) is False:
-            # The cache file does not exist and must be generated from scratch
-            videos = get_videos(earliest_date)
-
-            with open(cache_file, 'w') as fp:
-                json.dump(videos, fp)
-
-        else:
-            last_update_time = os.path.getmtime(cache_file)
-            current_time = time.time()
-            one_day_secs = 24 * 60 * 60
-            if (current_time - one_day_secs) > last_update_time:
-                # if the file was last updated more than 24 hours ago do an update
-
-                # The cache file does not exist and must be generated from scratch
-                videos = get_videos(earliest_date)
-
-                with open(cache_file, 'w') as fp:
-                    json.dump(videos, fp)
-            else:
-                print(f'{cache_file=} is less than 24 hours old no update performed')
-
-                # cache file exists and must be updated
-                with open(cache_file) as fp:
-                    videos = json.load(fp)
-
-        return videos
-
-    def _get_videos_meta_data(self, video_id):
-
-        if len(video_id) > 50:
-            items = []
-            for start_point in range(0, len(video_id), 50):
-                end_point = start_point + 50
-                if end_point > len(video_id):
-                    end_point = len(video_id)
-
-                results = self.easy_wrapper.service.videos().list(id=video_id[start_point:end_point],
-                                                                  part="id, snippet, contentDetails, liveStreamingDetails").execute()
-                items.extend( results.get("items", []))
-
-
-        else:
-            results = self.easy_wrapper.service.videos().list(id=video_id,
-                                             part="id, snippet, contentDetails, liveStreamingDetails").execute()
-            items = results.get("items", [])
-
-        output = []
-        for item in items:
-            output_record = dict.fromkeys(
-                ['video_id', 'duration',
-                 'liveStreamingDetails'], None)
-
-            output_record['video_id'] = item['id']
-            output_record['title'] = item['snippet']['title']
-
-            output.append(output_record)
-
-        return output
+        self.video_store = VideoStore(self._video_store_fn)
+        self.easy_wrapper.response_cache = self.video_store
+        self.channel_registry = ChannelRegistry(self._channel_registry_fn)
+
+        # the uploads playlist is polled back to the last video already seen, so only the new
+        # videos have their metadata requested
+        earliest_date = datetime.datetime.now(datetime.timezone.utc) - self.first_poll_period
+        self.playlist_id, self.videos = poll_new_uploads(easy_wrapper=self.easy_wrapper,
+                                                         video_store=self.video_store,
+                                                         channel_id=self.BrainBlazeChannelID,
+                                                         earliest_date=earliest_date)
+        self.videos_detail = self._video_details(videos=self.videos)
 
     @staticmethod
-    def _get_video_id_list(videos):
+    def _get_video_id_list(videos) -> Optional[List[str]]:
 
-        video_df = pd.DataFrame(videos)
-        if len(video_df) == 0:
+        if len(videos) == 0:
             return None
-        return list(video_df['video_id'])
+        # a video can be listed more than once, the order it was first seen in is kept
+        return list(dict.fromkeys(video['video_id'] for video in videos))
 
-    def _video_details(self, cache_file, videos):
+    def _video_details(self, videos):
 
         video_id_list = self._get_video_id_list(videos)
         if video_id_list is None:
             return None
 
-        if os.path.isfile(cache_file) is False:
-
-            videos_details = self._get_videos_meta_data(video_id_list)
-
-            with open(cache_file, 'w') as fp:
-                json.dump(videos_details, fp)
-        else:
-
-
-            last_update_time = os.path.getmtime(cache_file)
-            current_time = time.time()
-            one_day_secs = 24 * 60 * 60
-            if (current_time - one_day_secs) > last_update_time:
-                # if the file was last updated more than 24 hours ago do an update
-                videos_details = self._get_videos_meta_data(video_id_list)
+        videos_details = sync_video_details(easy_wrapper=self.easy_wrapper,
+                                            video_store=self.video_store,
+                                            video_ids=video_id_list)
 
-                with open(cache_file, 'w') as fp:
-                    json.dump(videos_details, fp)
-            else:
-                print(f'{cache_file=} is less than 24 hours old no update performed')
-
-                with open(cache_file) as fp:
-                    videos_details = json.load(fp)
-
-        return videos_details
+        # only the title is needed for the tweets
+        return [{'video_id': video_detail['video_id'], 'title': video_detail['title'],
+                 'publishedAt': video_detail['publishedAt']}
+                for video_detail in videos_details]
 
     @property
-    def _df_videos_details(self):
-
+    def new_videos(self) -> List[dict]:
+        """
+        The new videos (oldest first), each a dictionary with the video_id, title and
+        publishedAt
+        """
         if self.videos_detail is None:
-            return None
-        b = pd.DataFrame(self.videos_detail)
-        b.set_index('video_id', inplace=True)
+            return []
+        return self.videos_detail
 
-        return b.drop_duplicates(keep='last')
-
-    @property
-    def DataFrame(self):
+    def mark_seen(self, video: dict):
+        """
+        Record a new video as handled (i.e. tweeted) so it is not returned by a later run
 
-        return self._df_videos_details
+        :param video: video from new_videos
+        """
+        self.video_store.mark_uploads_seen(channel_id=self.BrainBlazeChannelID,
+                                           playlist_id=self.playlist_id, uploads=[video])
 
     def __len__(self):
 
@@ -208,18 +112,28 @@ if __name__ == "__main__":
 
     if len(data_class) > 0:
 
-        twitter_api = tweepy.Client(consumer_key=command_args.twitter_consumer_key,
-                                    consumer_secret=command_args.twitter_consumer_secret,
-                                    access_token=command_args.twitter_access_token,
-                                    access_token_secret=command_args.twitter_access_secret)
-
-        for video_ID, item in data_class.DataFrame.iterrows():
-            tweet_text = f'New Brain Blaze Video: {item["title"]} \n https://www.youtube.com/watch?v={video_ID}'
+        posts = [Post(f'New Brain Blaze Video: {video["title"]} \n https://www.youtube.com/watch?v={video["video_id"]}',
+                      tag=video)
+                 for video in data_class.new_videos]
 
-            if command_args.test_mode:
-                print(f'tweet_sent: {tweet_text}')
-            else:
-                twitter_api.create_tweet(text=tweet_text)
-                print(f'tweet_sent: {tweet_text}')
+        if command_args.test_mode:
+            for post in posts:
+                print(f'tweet_sent: {post.text}')
+        else:
+            # tweepy is only imported when there is something to tweet
+            publisher = TweetPublisher.from_credentials(
+                consumer_key=command_args.twitter_consumer_key,
+                consumer_secret=command_args.twitter_consumer_secret,
+                access_token=command_args.twitter_access_token,
+                access_secret=command_args.twitter_access_secret)
+
+            def tweet_sent(post, tweet_id):
+                print(f'tweet_sent: {post.text}')
+                # each video is marked once its tweet is sent, so a rerun does not tweet it again
+                data_class.mark_seen(post.tag)
+
+            # the announcements are posted in the order the videos were published
+            publisher.publish(posts, ordered=True, on_posted=tweet_sent)
+            print(publisher.summary())
 
     print('End of Job')
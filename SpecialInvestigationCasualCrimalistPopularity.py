@@ -1,9 +1,10 @@
-
 import plotly.express as px
 
 import pandas as pd
 
 from BrainBlazeAnalyser import BrainBlazeDataSet, three_month_back
+from figure_renderer import FigureRenderer
+from weekly_cube import week_ending
 
 if __name__ == "__main__":
 
@@ -11,17 +12,24 @@ if __name__ == "__main__":
         api_key=fp.readlines()
 
     data_class = BrainBlazeDataSet(api_key=api_key)
-
-    video_DataFrame = data_class.DataFrame
-    video_DataFrame = video_DataFrame[video_DataFrame['Stream'] == False]  # gaming streams
-    video_DataFrame = video_DataFrame.drop(index='VTQU9TwKtqs')
-    video_DataFrame = video_DataFrame.query('Channel=="Brain Blaze" | Channel=="The Casual Criminalist"')
-    three_month_videos = video_DataFrame[video_DataFrame['Published Time'] > three_month_back]
-
-    grouped_duration_views = \
-        three_month_videos.groupby(
-            ['Channel', pd.Grouper(key='Published Time', freq='W-MON', origin='start_day')])[
-            'Views Seconds'].sum() / 3600
+    casual_criminalist_channel_ID = data_class.channel_registry.channel_id('casual_criminalist')
+
+    # the Brain Blaze statistics were refreshed when the data set was built, the Casual
+    # Criminalist videos are brought up to date the same way (with the same statistics_max_age)
+    # so the view times of the two channels are compared from statistics of the same age
+    data_class.update_video_details(videos=data_class.channel_videos(
+        earliest_date=three_month_back, channel_id_list=[casual_criminalist_channel_ID]))
+
+    # the weekly totals are read from the video store rather than grouping the videos, the
+    # streams are left out along with a streaming video that was not marked as such
+    weekly_totals = pd.DataFrame(data_class.video_store.weekly_cube.totals(
+        channel_id_list=[data_class.brain_blaze_channel_ID, casual_criminalist_channel_ID],
+        first_week=week_ending(three_month_back),
+        include_streams=False,
+        exclude_video_ids=['VTQU9TwKtqs']))
+    weekly_totals['Published Time'] = pd.to_datetime(weekly_totals['week_end'], utc=True)
+    weekly_totals['Views Seconds'] = weekly_totals['views_seconds'] / 3600
+    grouped_duration_views = weekly_totals.set_index(['Channel', 'Published Time'])['Views Seconds']
 
     fig=px.bar(grouped_duration_views.reset_index(), color='Channel', x='Published Time', y='Views Seconds', barmode='group')
     fig.update_layout(height=600, width=800,
@@ -30,4 +38,7 @@ if __name__ == "__main__":
     fig.update_xaxes(title_text="Aggragated videos published in week (Week start on a Monday)")
     fig.update_yaxes(title_text="Video view × duration [hours]")
 
-    fig.write_image('special_minutes.png', engine='kaleido')
\ No newline at end of file
+    with FigureRenderer() as renderer:
+        renderer.submit(fig, 'special_minutes.png')
+        renderer.render()
+        print(renderer.summary())
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Brain Blaze Analyser, these run against a local stand-in for the YouTube API
+(see fake_youtube) so they do not use any of the real API quota
+"""
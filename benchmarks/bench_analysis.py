@@ -0,0 +1,328 @@
+"""
+Benchmark of the analysis layer on synthetic video stores of increasing size, reporting the wall
+time and peak memory of each stage and comparing them against a stored baseline
+
+    python -m benchmarks.bench_analysis -sizes 1000 10000 100000 1000000
+    python -m benchmarks.bench_analysis -save_baseline
+
+The stores are generated the first time they are needed and kept in benchmarks/data, the process
+exits with a non-zero status if any stage is slower (or uses more memory) than the baseline by
+more than the tolerance and by more than an absolute margin, so the stages taking a few
+milliseconds do not fail on timing noise. The baseline records the machine it was measured on, times are only
+comparable on the same machine, so the pull request checks measure a baseline from the target
+branch on the same runner before comparing with it
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from BrainBlazeAnalyser import BrainBlazeDataSet, rolling_average
+from BrainBlazeInfoGraphic import BrainBlazeInfoGraphic, weekly_channel_totals, \
+    weekly_channel_totals_from_cube
+from report_period import ReportPeriod
+from channel_registry import ChannelRegistry
+from video_store import VideoStore
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(benchmark_dir, 'data')
+DEFAULT_BASELINE_FN = os.path.join(benchmark_dir, 'baselines', 'bench_analysis.json')
+
+# the synthetic videos are spread over the Simon Whistler channels of the channel registry
+synthetic_channels = {config.channel_id: config.name
+                      for config in ChannelRegistry().group('whistler')}
+# the synthetic videos are published in the five years up to this date
+synthetic_newest = datetime(year=2024, month=1, day=1, tzinfo=timezone.utc)
+synthetic_history = timedelta(weeks=5 * 52)
+
+
+def ISO8601_duration(seconds: int) -> str:
+    """
+    Format a number of seconds the way YouTube reports video durations, for example PT1H2M3S
+    """
+    if seconds == 0:
+        return 'P0D'
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return 'PT' + ''.join(f'{value}{unit}' for value, unit in
+                          [(hours, 'H'), (minutes, 'M'), (seconds, 'S')] if value > 0)
+
+
+def synthetic_detail(index: int, rng: random.Random) -> dict:
+    """
+    Generate a video metadata record in the form returned by YouTubeWrapper.get_metadata_bulk
+    """
+    channel_id, channel_name = rng.choice(list(synthetic_channels.items()))
+    published = synthetic_newest - synthetic_history * rng.random()
+    # most videos are 10 to 30 minutes, with occasional multi-hour compilations and upcoming
+    # streams (which have no duration yet)
+    if rng.random() < 0.001:
+        duration = 0
+    elif rng.random() < 0.01:
+        duration = rng.randint(2 * 3600, 5 * 3600)
+    else:
+        duration = int(rng.gauss(18 * 60, 6 * 60)) % (60 * 60) + 60
+
+    views = int(rng.lognormvariate(12, 1))
+    statistics = {'viewCount': str(views),
+                  'likeCount': str(int(views * rng.uniform(0.01, 0.05))),
+                  'favoriteCount': '0',
+                  'commentCount': str(int(views * 0.002))}
+    if rng.random() < 0.5:
+        statistics['dislikeCount'] = str(int(views * rng.uniform(0.0005, 0.002)))
+
+    record = {'video_id': f'syn{index:08d}',
+              'title': f'Synthetic video {index}',
+              'description': '',
+              'publishedAt': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+              'tags': [],
+              'contentDetails': {'duration': ISO8601_duration(duration),
+                                 'dimension': '2d',
+                                 'definition': 'hd'},
+              'statistics': statistics,
+              'Channel': channel_name,
+              'channel_id': channel_id}
+    if rng.random() < 0.02:
+        record['liveStreamingDetails'] = {'actualStartTime': record['publishedAt']}
+
+    return record
+
+
+def synthetic_store(data_dir: str, video_count: int, seed: int = 0) -> str:
+    """
+    Return the file name of a synthetic video store, generating it if it does not exist
+
+    :param data_dir: directory the stores are kept in
+    :param video_count: number of videos in the store
+    :param seed: seed for the random generation
+    :return: file name of the store
+    """
+    store_fn = os.path.join(data_dir, f'analysis_{video_count}_{seed}.sqlite')
+    if os.path.exists(store_fn):
+        return store_fn
+
+    print(f'generating a store of {video_count} videos: {store_fn}')
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+    chunk_size = 10000
+    # the store is generated under a temporary name so an interrupted run is not reused
+    with VideoStore(store_fn + '.tmp') as video_store:
+        for start_point in range(0, video_count, chunk_size):
+            video_store.upsert_details(
+                synthetic_detail(index, rng)
+                for index in range(start_point, min(start_point + chunk_size, video_count)))
+        video_store.snapshot(store_fn)
+    for suffix in ['.tmp', '.tmp-wal', '.tmp-shm']:
+        if os.path.exists(store_fn + suffix):
+            os.remove(store_fn + suffix)
+
+    return store_fn
+
+
+def load_details(video_store: VideoStore) -> list:
+    """
+    Read all the video metadata from a store, the way the analysis scripts do
+    """
+    videos = video_store.channel_videos(list(synthetic_channels.keys()))
+    return video_store.details([video['video_id'] for video in videos])
+
+
+def measure(function, repeats: int):
+    """
+    Measure a function, the wall time is the best of a number of repeats and the peak memory is
+    measured on a separate call (as tracing the memory slows the function down)
+
+    :return: tuple of the result of the function, the wall time in seconds and the peak memory
+             allocated in bytes
+    """
+    wall_time = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        wall_time = min(wall_time, time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, wall_time, peak_memory
+
+
+def run_size(store_fn: str, video_count: int) -> list:
+    """
+    Run each stage of the analysis on a synthetic store
+
+    :return: list of the results of each stage
+    """
+    # small data sets are repeated to get a stable time, their stages take a few milliseconds so
+    # a single slow run would otherwise dominate
+    repeats = max(3, min(20, 200000 // video_count))
+    results = []
+
+    def stage(name, function):
+        result, wall_time, peak_memory = measure(function, repeats)
+        results.append({'size': video_count, 'stage': name, 'wall_time': wall_time,
+                        'peak_memory': peak_memory})
+        return result
+
+    with VideoStore(store_fn) as video_store:
+        videos_detail = stage('store load', lambda: load_details(video_store))
+        report_period = ReportPeriod.for_date(synthetic_newest.date())
+        video_ids = [video['video_id']
+                     for video in video_store.channel_videos(list(synthetic_channels.keys()))]
+        # the records are streamed from the store into the column buffers without being
+        # collected in a list first
+        stage('store stream to DataFrame',
+              lambda: BrainBlazeDataSet._build_DataFrame(video_store.iter_details(video_ids)))
+        stage('weekly totals from the cube',
+              lambda: weekly_channel_totals_from_cube(video_store.weekly_cube,
+                                                      channel_id_list=list(synthetic_channels),
+                                                      period=report_period))
+
+    summaries = [BrainBlazeInfoGraphic._summary_record(video_detail)
+                 for video_detail in videos_detail]
+
+    analyser_DataFrame = stage('BrainBlazeDataSet DataFrame',
+                               lambda: BrainBlazeDataSet._build_DataFrame(videos_detail))
+    del videos_detail
+    info_graphic_DataFrame = stage('InfoGraphic _df_videos_details',
+                                   lambda: BrainBlazeInfoGraphic._build_DataFrame(summaries))
+    del summaries
+    stage('weekly W-MON aggregation', lambda: weekly_channel_totals(info_graphic_DataFrame))
+
+    durations = analyser_DataFrame.sort_values('Published Time')['Duration (s)'] / 60
+    stage('rolling average', lambda: rolling_average(durations, window=10))
+
+    return results
+
+
+def compare(results: list, baseline: dict, time_tolerance: float, memory_tolerance: float,
+            min_time_delta: float = 0.05, min_memory_delta: int = 2 ** 20) -> int:
+    """
+    Add the ratio to the baseline to each result, a stage has regressed if it exceeds both the
+    ratio and the absolute increase
+
+    :param time_tolerance: ratio to the baseline time above which a stage has regressed
+    :param memory_tolerance: ratio to the baseline peak memory above which a stage has regressed
+    :param min_time_delta: increase in seconds over the baseline time below which a stage is
+                           not counted as regressed, whatever its ratio
+    :param min_memory_delta: increase in bytes over the baseline peak memory below which a stage
+                             is not counted as regressed
+    :return: number of results that regressed beyond the tolerances
+    """
+    regressions = 0
+    for result in results:
+        # keys starting with an underscore (for example _machine) describe the baseline
+        baseline_result = baseline.get(f'{result["size"]}/{result["stage"]}')
+        if baseline_result is None:
+            result['time_ratio'] = result['memory_ratio'] = None
+            result['regression'] = False
+            continue
+
+        result['time_ratio'] = result['wall_time'] / baseline_result['wall_time']
+        result['memory_ratio'] = result['peak_memory'] / max(baseline_result['peak_memory'], 1)
+        time_regression = result['time_ratio'] > time_tolerance and \
+            result['wall_time'] - baseline_result['wall_time'] > min_time_delta
+        memory_regression = result['memory_ratio'] > memory_tolerance and \
+            result['peak_memory'] - baseline_result['peak_memory'] > min_memory_delta
+        result['regression'] = time_regression or memory_regression
+        regressions += result['regression']
+
+    return regressions
+
+
+def machine_description() -> dict:
+    """
+    Description of the machine the benchmark is run on, stored with the baseline
+    """
+    return {'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version()}
+
+
+def print_results(results: list):
+    print(f'{"videos":>8s} {"stage":32s} {"wall (s)":>9s} {"peak (MB)":>10s} '
+          f'{"time ratio":>11s} {"mem ratio":>10s}')
+    for result in results:
+        ratios = ''
+        if result.get('time_ratio') is not None:
+            ratios = f' {result["time_ratio"]:11.2f} {result["memory_ratio"]:10.2f}'
+            if result['regression']:
+                ratios += '  REGRESSION'
+        print(f'{result["size"]:8d} {result["stage"]:32s} {result["wall_time"]:9.4f} '
+              f'{result["peak_memory"] / 2 ** 20:10.1f}' + ratios)
+
+
+parse = argparse.ArgumentParser(description='Benchmark the analysis layer on synthetic video stores')
+parse.add_argument('-sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                   help='number of videos in each synthetic store')
+parse.add_argument('-seed', type=int, default=0)
+parse.add_argument('-data_dir', type=str, default=DEFAULT_DATA_DIR,
+                   help='directory the synthetic stores are kept in')
+parse.add_argument('-baseline', type=str, default=DEFAULT_BASELINE_FN)
+parse.add_argument('-save_baseline', action='store_true',
+                   help='store the results as the new baseline rather than comparing with it')
+parse.add_argument('-time_tolerance', type=float, default=1.5,
+                   help='ratio to the baseline time above which a stage has regressed')
+parse.add_argument('-memory_tolerance', type=float, default=1.2,
+                   help='ratio to the baseline peak memory above which a stage has regressed')
+parse.add_argument('-report_only', action='store_true',
+                   help='report the regressions without exiting with an error')
+parse.add_argument('-min_time_delta', type=float, default=0.05,
+                   help='increase in seconds over the baseline time a stage must also exceed to '
+                        'have regressed')
+parse.add_argument('-min_memory_delta', type=float, default=1.0,
+                   help='increase in MB over the baseline peak memory a stage must also exceed to '
+                        'have regressed')
+
+if __name__ == "__main__":
+
+    command_args = parse.parse_args()
+
+    results = []
+    for video_count in command_args.sizes:
+        store_fn = synthetic_store(command_args.data_dir, video_count, seed=command_args.seed)
+        results += run_size(store_fn, video_count)
+
+    regressions = 0
+    if command_args.save_baseline:
+        baseline = {}
+        if os.path.exists(command_args.baseline):
+            with open(command_args.baseline) as fp:
+                baseline = json.load(fp)
+        baseline.update({f'{result["size"]}/{result["stage"]}':
+                         {'wall_time': result['wall_time'], 'peak_memory': result['peak_memory']}
+                         for result in results})
+        baseline['_machine'] = machine_description()
+        os.makedirs(os.path.dirname(command_args.baseline), exist_ok=True)
+        with open(command_args.baseline, 'w') as fp:
+            json.dump(baseline, fp, indent=1, sort_keys=True)
+        print(f'baseline written to {command_args.baseline}')
+    elif os.path.exists(command_args.baseline):
+        with open(command_args.baseline) as fp:
+            baseline = json.load(fp)
+        if baseline.get('_machine') != machine_description():
+            print(f'the baseline was measured on {baseline.get("_machine")}, the times may not be '
+                  f'comparable with this machine ({machine_description()})')
+        regressions = compare(results, baseline,
+                              time_tolerance=command_args.time_tolerance,
+                              memory_tolerance=command_args.memory_tolerance,
+                              min_time_delta=command_args.min_time_delta,
+                              min_memory_delta=int(command_args.min_memory_delta * 2 ** 20))
+    else:
+        print(f'no baseline found at {command_args.baseline}, run with -save_baseline to create one')
+
+    print_results(results)
+    if regressions > 0:
+        print(f'{regressions} stages regressed against the baseline')
+        if not command_args.report_only:
+            sys.exit(1)
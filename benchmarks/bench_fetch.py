@@ -0,0 +1,147 @@
+"""
+Benchmark of the fetch layer (YouTubeWrapper and channel_sync) against the local fake YouTube
+API, reporting the wall time, request rate and quota used by each fetch strategy
+
+    python -m benchmarks.bench_fetch -videos_per_channel 2000 -latency 0.05
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from benchmarks.fake_youtube import FakeYouTubeService, FakeYouTubeWrapper
+from channel_sync import sync_channel_videos
+from video_store import VideoStore
+
+
+def run_strategy(name: str, fake_service: FakeYouTubeService, function,
+                 max_requests_per_second: float) -> dict:
+    """
+    Time a single fetch strategy on a fresh wrapper
+
+    :param name: name of the strategy for the report
+    :param fake_service: fake API to run against
+    :param function: function taking the wrapper and returning the number of items retrieved
+    :param max_requests_per_second: request rate ceiling of the wrapper
+    :return: dictionary of the results
+    """
+    wrapper = FakeYouTubeWrapper(fake_service, max_requests_per_second=max_requests_per_second)
+    start_requests = fake_service.requests
+    start_quota = fake_service.quota_used
+    start_not_modified = fake_service.not_modified
+
+    start_time = time.perf_counter()
+    items = function(wrapper)
+    wall_time = time.perf_counter() - start_time
+
+    requests = fake_service.requests - start_requests
+    return {'strategy': name,
+            'items': items,
+            'requests': requests,
+            'wall_time': wall_time,
+            'requests_per_second': requests / wall_time if wall_time > 0 else float('nan'),
+            'quota': fake_service.quota_used - start_quota,
+            'not_modified': fake_service.not_modified - start_not_modified,
+            'throttled_seconds': wrapper.throttle_metrics['throttled_seconds'],
+            'retries': wrapper.throttle_metrics['retries']}
+
+
+def fetch_strategies(fake_service: FakeYouTubeService, history: timedelta, metadata_videos: int,
+                     crawl_workers: int):
+    """
+    The fetch strategies to compare, as a list of (name, function) tuples
+    """
+    channels = list(fake_service.channel_map.values())
+    channel = channels[0]
+    earliest_date = channel.newest - history
+    video_ids = [channel.video_id(video_index)
+                 for video_index in range(min(metadata_videos, channel.video_count))]
+    channel_id_list = [channel.channel_id for channel in channels]
+
+    def sync(workers):
+        def run(wrapper):
+            with VideoStore(':memory:') as video_store:
+                return len(sync_channel_videos(wrapper, video_store, earliest_date,
+                                               channel_id_list, engine='uploads',
+                                               max_workers=workers))
+        return run
+
+    def uploads_refresh(wrapper):
+        # a second walk of the uploads playlist, conditional on the ETags of the first (the
+        # video statistics change daily so the videos requests are not made conditional)
+        with VideoStore(':memory:') as video_store:
+            wrapper.response_cache = video_store
+            wrapper.get_playlist(channel.uploads_playlist_id)
+            return len(wrapper.get_playlist(channel.uploads_playlist_id))
+
+    return [
+        ('channel_videos search', lambda wrapper: len(wrapper.channel_videos(
+            channel.channel_id, publishedAfter=earliest_date, engine='search'))),
+        ('channel_videos uploads', lambda wrapper: len(wrapper.channel_videos(
+            channel.channel_id, publishedAfter=earliest_date, engine='uploads'))),
+        ('get_playlist (full)', lambda wrapper: len(wrapper.get_playlist(
+            channel.uploads_playlist_id))),
+        ('get_metadata per video', lambda wrapper: len([wrapper.get_metadata(video_id)
+                                                        for video_id in video_ids])),
+        ('get_metadata_bulk 1 worker', lambda wrapper: len(wrapper.get_metadata_bulk(
+            video_ids, max_workers=1))),
+        ('get_metadata_bulk 4 workers', lambda wrapper: len(wrapper.get_metadata_bulk(
+            video_ids, max_workers=4))),
+        ('get_statistics_bulk 4 workers', lambda wrapper: len(wrapper.get_statistics_bulk(
+            video_ids, max_workers=4))),
+        ('uploads refresh with ETags', uploads_refresh),
+        (f'sync {len(channels)} channels 1 worker', sync(1)),
+        (f'sync {len(channels)} channels {crawl_workers} workers', sync(crawl_workers)),
+    ]
+
+
+def print_results(results: list):
+    print(f'{"strategy":36s} {"items":>8s} {"requests":>9s} {"wall (s)":>9s} '
+          f'{"req/s":>8s} {"quota":>7s} {"304s":>6s} {"throttled (s)":>14s} {"retries":>8s}')
+    for result in results:
+        print(f'{result["strategy"]:36s} {result["items"]:8d} {result["requests"]:9d} '
+              f'{result["wall_time"]:9.3f} {result["requests_per_second"]:8.1f} '
+              f'{result["quota"]:7d} {result["not_modified"]:6d} {result["throttled_seconds"]:14.3f} {result["retries"]:8d}')
+
+
+parse = argparse.ArgumentParser(description='Benchmark the fetch layer against a fake YouTube API')
+parse.add_argument('-channels', type=int, default=12)
+parse.add_argument('-videos_per_channel', type=int, default=2000)
+parse.add_argument('-history_weeks', type=int, default=13,
+                   help='how far back the date bounded strategies search')
+parse.add_argument('-metadata_videos', type=int, default=500,
+                   help='number of videos the metadata strategies request')
+parse.add_argument('-latency', type=float, default=0.02,
+                   help='simulated latency of each request in seconds')
+parse.add_argument('-rate_limit_error_rate', type=float, default=0.0)
+parse.add_argument('-server_error_rate', type=float, default=0.0)
+parse.add_argument('-max_requests_per_second', type=float, default=1000.0)
+parse.add_argument('-crawl_workers', type=int, default=6)
+parse.add_argument('-strategy', type=str, default=None,
+                   help='only run the strategies whose name contains this string')
+
+if __name__ == "__main__":
+
+    command_args = parse.parse_args()
+
+    fake_service = FakeYouTubeService.with_channels(
+        channel_count=command_args.channels,
+        videos_per_channel=command_args.videos_per_channel,
+        latency=command_args.latency,
+        rate_limit_error_rate=command_args.rate_limit_error_rate,
+        server_error_rate=command_args.server_error_rate)
+
+    strategies = fetch_strategies(fake_service,
+                                  history=timedelta(weeks=command_args.history_weeks),
+                                  metadata_videos=command_args.metadata_videos,
+                                  crawl_workers=command_args.crawl_workers)
+
+    results = []
+    for name, function in strategies:
+        if command_args.strategy is not None and command_args.strategy not in name:
+            continue
+        results.append(run_strategy(name, fake_service, function,
+                                    max_requests_per_second=command_args.max_requests_per_second))
+
+    print(f'{command_args.channels} channels of {command_args.videos_per_channel} videos, '
+          f'{command_args.latency * 1000:.0f}ms latency per request')
+    print_results(results)
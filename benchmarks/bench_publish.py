@@ -0,0 +1,115 @@
+"""
+Benchmark of the publisher against the local fake Twitter, reporting the wall time, requests
+and retries of publishing the weekly report and a set of new video announcements, one step at
+a time and concurrently
+
+    python -m benchmarks.bench_publish -upload_latency 0.5 -post_latency 0.2
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from benchmarks.fake_twitter import FakeTwitter, fake_publisher
+from publisher import Post
+
+
+def run_scenario(name: str, fake_twitter: FakeTwitter, posts: list, ordered: bool,
+                 max_workers: int) -> dict:
+    """
+    Time publishing a set of posts on a fresh publisher
+
+    :param name: name of the scenario for the report
+    :param fake_twitter: fake Twitter to publish to
+    :param posts: posts to publish
+    :param ordered: whether the posts must be made in order
+    :param max_workers: maximum number of concurrent uploads and posts
+    :return: dictionary of the results
+    """
+    # Twitter rejects a tweet duplicating an earlier one, so each scenario posts its own text
+    posts = [post._replace(text=f'{post.text} ({name})') for post in posts]
+    publisher = fake_publisher(fake_twitter, max_workers=max_workers)
+    start_requests = fake_twitter.requests
+    start_tweets = len(fake_twitter.tweets)
+
+    start_time = time.perf_counter()
+    tweet_ids = publisher.publish(posts, ordered=ordered)
+    wall_time = time.perf_counter() - start_time
+
+    if ordered:
+        posted = [tweet['text'] for tweet in fake_twitter.tweets[start_tweets:]]
+        if posted != [post.text for post in posts]:
+            raise RuntimeError(f'{name} posted the tweets out of order')
+
+    upload_latencies = [timing['latency'] for timing in publisher.timings
+                        if timing['step'] == 'upload']
+    post_latencies = [timing['latency'] for timing in publisher.timings
+                      if timing['step'] == 'post']
+    return {'scenario': name,
+            'tweets': len(tweet_ids),
+            'requests': fake_twitter.requests - start_requests,
+            'wall_time': wall_time,
+            'max_upload': max(upload_latencies, default=0.0),
+            'max_post': max(post_latencies, default=0.0),
+            'retries': publisher.retries}
+
+
+def print_results(results: list):
+    print(f'{"scenario":36s} {"tweets":>7s} {"requests":>9s} {"wall (s)":>9s} '
+          f'{"max upload (s)":>15s} {"max post (s)":>13s} {"retries":>8s}')
+    for result in results:
+        print(f'{result["scenario"]:36s} {result["tweets"]:7d} {result["requests"]:9d} '
+              f'{result["wall_time"]:9.3f} {result["max_upload"]:15.3f} '
+              f'{result["max_post"]:13.3f} {result["retries"]:8d}')
+
+
+parse = argparse.ArgumentParser(description='Benchmark the publisher against a fake Twitter')
+parse.add_argument('-upload_latency', type=float, default=0.2,
+                   help='simulated latency of each media upload in seconds')
+parse.add_argument('-post_latency', type=float, default=0.1,
+                   help='simulated latency of each post in seconds')
+parse.add_argument('-announcements', type=int, default=5,
+                   help='number of new video announcements to publish')
+parse.add_argument('-rate_limit_error_rate', type=float, default=0.0)
+parse.add_argument('-server_error_rate', type=float, default=0.0)
+parse.add_argument('-max_workers', type=int, default=4)
+
+if __name__ == "__main__":
+
+    command_args = parse.parse_args()
+
+    fake_twitter = FakeTwitter(upload_latency=command_args.upload_latency,
+                               post_latency=command_args.post_latency,
+                               rate_limit_error_rate=command_args.rate_limit_error_rate,
+                               server_error_rate=command_args.server_error_rate)
+
+    with tempfile.TemporaryDirectory() as image_dir:
+        image_fns = []
+        for image_name in ['bb_infographic.png', 'bb_piechart.png']:
+            image_fns.append(os.path.join(image_dir, image_name))
+            with open(image_fns[-1], 'wb') as fp:
+                fp.write(b'\x89PNG')
+
+        report = [Post('Weekly report from the Office of Basement Accountability',
+                       media=(image_fns[0],)),
+                  Post('Weekly @SimonWhistler Output Breakdown', media=(image_fns[1],))]
+        announcements = [Post(f'New Brain Blaze Video: video {index}')
+                         for index in range(command_args.announcements)]
+
+        results = [
+            run_scenario('weekly report sequential', fake_twitter, report, ordered=True,
+                         max_workers=1),
+            run_scenario('weekly report concurrent', fake_twitter, report, ordered=False,
+                         max_workers=command_args.max_workers),
+            run_scenario('announcements sequential', fake_twitter, announcements, ordered=True,
+                         max_workers=1),
+            run_scenario('announcements in order', fake_twitter, announcements, ordered=True,
+                         max_workers=command_args.max_workers),
+            run_scenario('announcements unordered', fake_twitter, announcements, ordered=False,
+                         max_workers=command_args.max_workers),
+        ]
+
+    print(f'{command_args.upload_latency * 1000:.0f}ms per upload, '
+          f'{command_args.post_latency * 1000:.0f}ms per post, '
+          f'at most {fake_twitter.max_in_flight} requests in flight')
+    print_results(results)
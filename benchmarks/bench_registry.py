@@ -0,0 +1,86 @@
+"""
+Benchmark of loading one channel from video stores holding an increasing number of channels,
+to check that the cost of an analysis depends on the channels it uses rather than the number of
+channels in the registry
+
+    python -m benchmarks.bench_registry -channel_counts 12 200 -videos_per_channel 1000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from benchmarks.bench_analysis import synthetic_detail
+from channel_registry import ChannelRegistry
+from video_store import VideoStore
+
+registry = ChannelRegistry()
+
+
+def build_store(store_fn: str, channel_count: int, videos_per_channel: int, seed: int = 0):
+    """
+    Build a store with the Brain Blaze channel and other synthetic channels, all with the same
+    number of videos
+
+    :param store_fn: file name of the store
+    :param channel_count: number of channels in the store, including Brain Blaze
+    :param videos_per_channel: number of videos of each channel
+    :param seed: seed for the random generation
+    """
+    rng = random.Random(seed)
+    channel_ids = [registry.channel_id('brain_blaze')] + \
+                  [f'UCsynthetic{index:011d}' for index in range(1, channel_count)]
+    with VideoStore(store_fn) as video_store:
+        for channel_index, channel_id in enumerate(channel_ids):
+            details = []
+            for video_index in range(videos_per_channel):
+                detail = synthetic_detail(channel_index * videos_per_channel + video_index, rng)
+                detail['channel_id'] = channel_id
+                details.append(detail)
+            video_store.upsert_details(details)
+
+
+def load_channel(video_store: VideoStore, channel_id: str) -> list:
+    """
+    Read the metadata of a channel's videos, the way BrainBlazeDataSet does
+    """
+    videos = video_store.channel_videos([channel_id])
+    return list(video_store.iter_details(video['video_id'] for video in videos))
+
+
+def measure(store_fn: str, repeats: int) -> (int, float):
+    """
+    Best of a number of repeats of loading the Brain Blaze channel from a store
+
+    :return: tuple of the number of videos loaded and the wall time in seconds
+    """
+    channel_id = registry.channel_id('brain_blaze')
+    wall_time = float('inf')
+    with VideoStore(store_fn) as video_store:
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            details = load_channel(video_store, channel_id)
+            wall_time = min(wall_time, time.perf_counter() - start_time)
+    return len(details), wall_time
+
+
+parse = argparse.ArgumentParser(description='Benchmark loading one channel from stores with '
+                                            'many channels')
+parse.add_argument('-channel_counts', type=int, nargs='+', default=[12, 200],
+                   help='numbers of channels in the stores')
+parse.add_argument('-videos_per_channel', type=int, default=1000)
+parse.add_argument('-repeats', type=int, default=5)
+
+if __name__ == "__main__":
+
+    command_args = parse.parse_args()
+
+    print(f'{"channels":>9s} {"videos in store":>16s} {"videos loaded":>14s} {"load (ms)":>10s}')
+    with tempfile.TemporaryDirectory() as data_dir:
+        for channel_count in command_args.channel_counts:
+            store_fn = os.path.join(data_dir, f'registry_{channel_count}.sqlite')
+            build_store(store_fn, channel_count, command_args.videos_per_channel)
+            loaded, wall_time = measure(store_fn, command_args.repeats)
+            print(f'{channel_count:9d} {channel_count * command_args.videos_per_channel:16d} '
+                  f'{loaded:14d} {wall_time * 1000:10.1f}')
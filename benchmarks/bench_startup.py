@@ -0,0 +1,120 @@
+"""
+Benchmark of the start up time of the daily job (DailyBrainBlaze.py), checking it against a time
+budget and that none of the heavy analysis modules are imported
+
+    python -m benchmarks.bench_startup -budget 1.0
+
+Each measurement runs in a fresh interpreter, the time of the interpreter starting on its own is
+subtracted so the result is the Python overhead of the job itself. The process exits with a
+non-zero status if the budget is exceeded
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+repository_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules the daily job does not need, importing any of them costs a large part of the budget
+heavy_modules = ['pandas', 'numpy', 'matplotlib', 'plotly', 'tweepy']
+
+startup_stages = {
+    'interpreter': 'pass',
+    'import DailyBrainBlaze': 'import DailyBrainBlaze',
+    'import and build the YouTube service':
+        'import DailyBrainBlaze\n'
+        'wrapper = DailyBrainBlaze.YouTubeWrapper()\n'
+        'wrapper.initialize(api_key="benchmark")',
+}
+
+# reports the modules that were loaded back to the benchmark
+module_report = '\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))'
+
+
+def run_stage(code: str) -> tuple:
+    """
+    Run some code in a fresh interpreter from the repository directory
+
+    :return: tuple of the wall time in seconds and the names of the modules loaded
+    """
+    start_time = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', code + module_report], cwd=repository_dir,
+                             capture_output=True, text=True, check=True)
+    wall_time = time.perf_counter() - start_time
+
+    return wall_time, json.loads(process.stdout.splitlines()[-1])
+
+
+def import_profile(code: str, count: int = 10) -> list:
+    """
+    The modules that take the longest to import (including the modules they import), down to
+    the modules imported by the top level imports
+
+    :return: list of tuples of the module name and cumulative import time in seconds
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                             cwd=repository_dir, capture_output=True, text=True, check=True)
+    profile = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        # only the modules imported directly by the top level imports, the deeper ones are
+        # included in their cumulative times
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        if depth > 1:
+            continue
+        profile.append((module.strip(), int(cumulative) / 1e6))
+
+    return sorted(profile, key=lambda entry: entry[1], reverse=True)[:count]
+
+
+parse = argparse.ArgumentParser(description='Benchmark the start up time of the daily job')
+parse.add_argument('-budget', type=float, default=1.0,
+                   help='start up time in seconds (over the bare interpreter) allowed for the '
+                        'daily job')
+parse.add_argument('-repeats', type=int, default=5)
+parse.add_argument('-profile', action='store_true',
+                   help='list the slowest imports of the daily job')
+
+if __name__ == "__main__":
+
+    command_args = parse.parse_args()
+
+    times = {}
+    loaded_modules = set()
+    for name, code in startup_stages.items():
+        stage_times = []
+        for _ in range(command_args.repeats):
+            wall_time, modules = run_stage(code)
+            stage_times.append(wall_time)
+            loaded_modules.update(modules)
+        times[name] = statistics.median(stage_times)
+
+    interpreter_time = times['interpreter']
+    print(f'{"stage":40s} {"wall (s)":>9s} {"overhead (s)":>13s}')
+    for name, wall_time in times.items():
+        print(f'{name:40s} {wall_time:9.3f} {wall_time - interpreter_time:13.3f}')
+
+    if command_args.profile:
+        print('\nslowest imports')
+        for module, cumulative in import_profile(startup_stages['import DailyBrainBlaze']):
+            print(f'{module:40s} {cumulative:9.3f}')
+
+    failures = []
+    startup_time = times['import and build the YouTube service'] - interpreter_time
+    if startup_time > command_args.budget:
+        failures.append(f'start up took {startup_time:.3f}s, the budget is '
+                        f'{command_args.budget:.3f}s')
+    imported_heavy_modules = [module for module in heavy_modules if module in loaded_modules]
+    if len(imported_heavy_modules) > 0:
+        failures.append(f'the daily job imports {", ".join(imported_heavy_modules)}')
+
+    for failure in failures:
+        print(failure)
+    if len(failures) > 0:
+        sys.exit(1)
+    print(f'start up time {startup_time:.3f}s is within the budget of {command_args.budget:.3f}s')
@@ -0,0 +1,148 @@
+"""
+This module provides a local stand-in for the parts of tweepy used by the publisher
+(tweepy.API.media_upload, tweepy.Client.create_tweet and delete_tweet), so a TweetPublisher can
+be exercised without touching Twitter.
+
+The fake simulates:
+- a configurable latency for each media upload and each post
+- rate limit (429) and server (503) errors
+- posts whose response is lost (a read timeout after the tweet is made), and the 403 Twitter
+  returns for a tweet duplicating an earlier one
+- tweet IDs and media IDs, keeping the tweets posted so the order they were made can be checked
+"""
+import os
+import time
+import random
+import threading
+from collections import namedtuple
+from typing import List, Optional
+
+from publisher import TweetPublisher
+from rate_limiter import RetryPolicy
+
+# equivalents of the objects returned by tweepy
+FakeMedia = namedtuple('FakeMedia', ['media_id', 'media_id_string'])
+FakeResponse = namedtuple('FakeResponse', ['data', 'includes', 'errors', 'meta'])
+
+
+class FakeResponseStatus:
+    """
+    Equivalent of the requests response carried by the tweepy exceptions
+    """
+
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class FakeHTTPException(Exception):
+    """
+    Equivalent of tweepy.errors.HTTPException
+    """
+
+    def __init__(self, status_code: int, api_codes: Optional[List[int]] = None,
+                 api_messages: Optional[List[str]] = None):
+        super().__init__(f'{status_code} fake twitter error')
+        self.response = FakeResponseStatus(status_code)
+        self.api_codes = [] if api_codes is None else api_codes
+        self.api_messages = [] if api_messages is None else api_messages
+
+
+class ReadTimeout(Exception):
+    """
+    Equivalent of requests.exceptions.ReadTimeout, raised when the response to a request is lost
+    """
+
+
+class FakeTwitter:
+    """
+    Stand-in for the Twitter account the publisher posts to
+
+    :param upload_latency: time in seconds taken by each media upload
+    :param post_latency: time in seconds taken by each post (or delete)
+    :param rate_limit_error_rate: probability of a request failing with a 429
+    :param server_error_rate: probability of a request failing with a 503
+    :param post_timeout_rate: probability of a post being made but its response lost
+    :param seed: seed for the error injection
+    """
+
+    def __init__(self, upload_latency: float = 0.0, post_latency: float = 0.0,
+                 rate_limit_error_rate: float = 0.0, server_error_rate: float = 0.0,
+                 post_timeout_rate: float = 0.0, seed: int = 0):
+        self.upload_latency = upload_latency
+        self.post_latency = post_latency
+        self.rate_limit_error_rate = rate_limit_error_rate
+        self.server_error_rate = server_error_rate
+        self.post_timeout_rate = post_timeout_rate
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+        self.requests = 0
+        self.errors = 0
+        self.uploads: List[str] = []
+        self.tweets: List[dict] = []
+        self.__in_flight = 0
+        self.max_in_flight = 0
+
+    def _request(self, latency: float):
+        with self.__lock:
+            self.requests += 1
+            self.__in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.__in_flight)
+            draw = self.__random.random()
+        try:
+            time.sleep(latency)
+            if draw < self.rate_limit_error_rate:
+                status = 429
+            elif draw < self.rate_limit_error_rate + self.server_error_rate:
+                status = 503
+            else:
+                return
+            with self.__lock:
+                self.errors += 1
+            raise FakeHTTPException(status)
+        finally:
+            with self.__lock:
+                self.__in_flight -= 1
+
+    def media_upload(self, filename: str) -> FakeMedia:
+        if not os.path.exists(filename):
+            raise FileNotFoundError(filename)
+        self._request(self.upload_latency)
+        with self.__lock:
+            self.uploads.append(filename)
+            media_id = 1000 + len(self.uploads)
+        return FakeMedia(media_id=media_id, media_id_string=str(media_id))
+
+    def create_tweet(self, text: str, media_ids: Optional[List[str]] = None) -> FakeResponse:
+        self._request(self.post_latency)
+        with self.__lock:
+            if any(tweet['text'] == text for tweet in self.tweets):
+                self.errors += 1
+                raise FakeHTTPException(403, api_messages=[
+                    'You are not allowed to create a Tweet with duplicate content.'])
+            tweet_id = str(2000 + len(self.tweets))
+            self.tweets.append({'id': tweet_id, 'text': text, 'media_ids': media_ids})
+            timed_out = self.__random.random() < self.post_timeout_rate
+        if timed_out:
+            raise ReadTimeout(f'response to the post of {text} lost')
+        return FakeResponse(data={'id': tweet_id, 'text': text}, includes={}, errors=[], meta={})
+
+    def delete_tweet(self, id: str) -> FakeResponse:
+        self._request(self.post_latency)
+        with self.__lock:
+            self.tweets = [tweet for tweet in self.tweets if tweet['id'] != id]
+        return FakeResponse(data={'deleted': True}, includes={}, errors=[], meta={})
+
+
+def fake_publisher(fake_twitter: FakeTwitter, max_workers: int = 4) -> TweetPublisher:
+    """
+    TweetPublisher posting to a FakeTwitter, the fake stands in for both the v1.1 API and the
+    client
+    """
+    publisher = TweetPublisher(api_factory=lambda: fake_twitter,
+                               client_factory=lambda: fake_twitter,
+                               max_workers=max_workers,
+                               retry_policy=RetryPolicy())
+    # the fake does not need the back off to be realistic, just exercised
+    publisher.retry_policy.base_delay = 0.01
+    return publisher
@@ -0,0 +1,306 @@
+"""
+This module provides a local stand-in for the parts of the YouTube Data API v3 used by the
+Brain Blaze Analyser. It mimics the googleapiclient service objects, so a YouTubeWrapper can be
+pointed at it (see FakeYouTubeWrapper) and exercised without a network connection or any quota.
+
+The fake simulates:
+- channels with any number of videos (generated on demand, so 100k videos cost no memory)
+- pagination with page tokens, including the 500 result limit of search().list
+- a configurable latency for each request
+- the daily quota (403 quotaExceeded once used up), rate limit (403 rateLimitExceeded) and
+  server (503) errors
+- ETags and 304 (Not Modified) responses to conditional requests
+"""
+import json
+import time
+import random
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from urllib.parse import urlencode
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from google_access_lib import YouTubeWrapper
+from quota_ledger import QuotaTracker, quota_cost
+
+_timestamp_format = '%Y-%m-%dT%H:%M:%SZ'
+
+
+class FakeChannel:
+    """
+    A channel whose videos are published at a regular interval going back from the newest
+
+    :param index: number of the channel, used to generate the channel and video IDs
+    :param video_count: number of videos on the channel
+    :param newest: publish time of the newest video
+    :param interval: time between videos
+    """
+
+    def __init__(self, index: int, video_count: int, newest: datetime,
+                 interval: timedelta = timedelta(hours=12)):
+        self.index = index
+        self.channel_id = f'UC{index:022d}'
+        self.uploads_playlist_id = f'UU{index:022d}'
+        self.title = f'Channel {index}'
+        self.video_count = video_count
+        self.newest = newest
+        self.interval = interval
+
+    def video_id(self, video_index: int) -> str:
+        # video IDs are 11 characters like the real ones
+        return f'{self.index:03d}v{video_index:07d}'
+
+    def published(self, video_index: int) -> datetime:
+        return self.newest - self.interval * video_index
+
+    def index_range(self, published_after: Optional[datetime],
+                    published_before: Optional[datetime]) -> range:
+        """
+        Range of video indices (newest first) published between two dates
+        """
+        first = 0
+        if published_before is not None and published_before < self.newest:
+            first = int(-(-(self.newest - published_before) // self.interval))
+        last = self.video_count
+        if published_after is not None:
+            last = min(last, int((self.newest - published_after) // self.interval) + 1)
+        return range(first, max(first, last))
+
+
+class FakeRequest:
+    """
+    Equivalent of googleapiclient.http.HttpRequest for the fake service
+    """
+
+    def __init__(self, service: 'FakeYouTubeService', resource: str, handler, params: dict):
+        self.service = service
+        self.methodId = f'youtube.{resource}.list'
+        self.method = 'GET'
+        self.uri = f'https://youtube.googleapis.com/youtube/v3/{resource}?{urlencode(params)}'
+        self.headers = {}
+        self.__handler = handler
+        self.__params = params
+
+    def execute(self):
+        return self.service.execute(self, self.__handler, self.__params)
+
+
+class _FakeResource:
+
+    def __init__(self, service, resource, handler):
+        self.__service = service
+        self.__resource = resource
+        self.__handler = handler
+
+    def list(self, **kwargs):
+        return FakeRequest(self.__service, self.__resource, self.__handler, kwargs)
+
+
+class FakeYouTubeService:
+    """
+    Stand-in for the service object returned by googleapiclient.discovery.build('youtube', 'v3')
+
+    :param channels: channels available from the fake
+    :param latency: time in seconds taken by each request
+    :param daily_quota: quota units available before requests fail with quotaExceeded, None for
+                        no limit
+    :param rate_limit_error_rate: probability of a request failing with rateLimitExceeded
+    :param server_error_rate: probability of a request failing with a 503
+    :param seed: seed for the error injection
+    """
+
+    # most results search().list will return for a single query
+    search_result_limit = 500
+
+    def __init__(self, channels: List[FakeChannel], latency: float = 0.0,
+                 daily_quota: Optional[int] = None, rate_limit_error_rate: float = 0.0,
+                 server_error_rate: float = 0.0, seed: int = 0):
+        self.channel_map = {channel.channel_id: channel for channel in channels}
+        self.channel_index_map = {channel.index: channel for channel in channels}
+        self.playlists = {channel.uploads_playlist_id: channel for channel in channels}
+        self.latency = latency
+        self.daily_quota = daily_quota
+        self.rate_limit_error_rate = rate_limit_error_rate
+        self.server_error_rate = server_error_rate
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+        self.requests = 0
+        self.not_modified = 0
+        self.quota_used = 0
+
+    @classmethod
+    def with_channels(cls, channel_count: int, videos_per_channel: int, **kwargs):
+        """
+        Create a fake with a number of channels of the same size
+        """
+        newest = datetime.now(timezone.utc).replace(microsecond=0)
+        return cls(channels=[FakeChannel(index=index, video_count=videos_per_channel,
+                                         newest=newest)
+                             for index in range(channel_count)], **kwargs)
+
+    def search(self):
+        return _FakeResource(self, 'search', self._search)
+
+    def channels(self):
+        return _FakeResource(self, 'channels', self._channels)
+
+    def playlistItems(self):
+        return _FakeResource(self, 'playlistItems', self._playlist_items)
+
+    def videos(self):
+        return _FakeResource(self, 'videos', self._videos)
+
+    @staticmethod
+    def _error(status: int, reason: str) -> HttpError:
+        content = json.dumps({'error': {'code': status, 'message': reason,
+                                        'errors': [{'reason': reason}]}}).encode()
+        return HttpError(httplib2.Response({'status': status}), content)
+
+    def execute(self, request: FakeRequest, handler, params: dict):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        with self.__lock:
+            self.requests += 1
+            cost = quota_cost(request.methodId)
+            if self.daily_quota is not None and self.quota_used + cost > self.daily_quota:
+                raise self._error(403, 'quotaExceeded')
+            self.quota_used += cost
+
+            failure = self.__random.random()
+        if failure < self.rate_limit_error_rate:
+            raise self._error(403, 'rateLimitExceeded')
+        if failure < self.rate_limit_error_rate + self.server_error_rate:
+            raise self._error(503, 'backendError')
+
+        response = handler(**params)
+        response['etag'] = hashlib.md5(json.dumps(response, sort_keys=True).encode()).hexdigest()
+        if request.headers.get('If-None-Match') == response['etag']:
+            with self.__lock:
+                self.not_modified += 1
+            raise HttpError(httplib2.Response({'status': 304}), b'')
+
+        return response
+
+    @staticmethod
+    def _page(indices: range, pageToken: Optional[str], maxResults: int):
+        start = 0 if pageToken is None else int(pageToken)
+        page = indices[start:start + maxResults]
+        next_page_token = str(start + maxResults) if start + maxResults < len(indices) else None
+        return page, next_page_token
+
+    @staticmethod
+    def _date(value: Optional[str]) -> Optional[datetime]:
+        if value is None:
+            return None
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    def _search(self, channelId, publishedAfter=None, publishedBefore=None, pageToken=None,
+                maxResults=5, **kwargs):
+        channel = self.channel_map[channelId]
+        indices = channel.index_range(self._date(publishedAfter), self._date(publishedBefore))
+        indices = indices[:self.search_result_limit]
+        page, next_page_token = self._page(indices, pageToken, maxResults)
+
+        response = {'kind': 'youtube#searchListResponse',
+                    'pageInfo': {'totalResults': len(indices), 'resultsPerPage': maxResults},
+                    'items': [{'kind': 'youtube#searchResult',
+                               'id': {'kind': 'youtube#video',
+                                      'videoId': channel.video_id(video_index)},
+                               'snippet': {'publishedAt': f'{channel.published(video_index):{_timestamp_format}}',
+                                           'channelId': channel.channel_id,
+                                           'channelTitle': channel.title}}
+                              for video_index in page]}
+        if next_page_token is not None:
+            response['nextPageToken'] = next_page_token
+        return response
+
+    def _channels(self, id, part, pageToken=None, **kwargs):
+        items = []
+        for channel_id in id.split(','):
+            channel = self.channel_map.get(channel_id)
+            if channel is None:
+                continue
+            items.append({'kind': 'youtube#channel',
+                          'id': channel.channel_id,
+                          'snippet': {'title': channel.title},
+                          'contentDetails': {'relatedPlaylists': {
+                              'uploads': channel.uploads_playlist_id}}})
+        return {'kind': 'youtube#channelListResponse', 'items': items}
+
+    def _playlist_items(self, playlistId, pageToken=None, maxResults=5, **kwargs):
+        channel = self.playlists[playlistId]
+        page, next_page_token = self._page(range(channel.video_count), pageToken, maxResults)
+
+        items = []
+        for video_index in page:
+            published = f'{channel.published(video_index):{_timestamp_format}}'
+            items.append({'kind': 'youtube#playlistItem',
+                          'snippet': {'publishedAt': published,
+                                      'channelId': channel.channel_id,
+                                      'videoOwnerChannelId': channel.channel_id,
+                                      'resourceId': {'kind': 'youtube#video',
+                                                     'videoId': channel.video_id(video_index)}},
+                          'contentDetails': {'videoId': channel.video_id(video_index),
+                                             'videoPublishedAt': published}})
+
+        response = {'kind': 'youtube#playlistItemListResponse', 'items': items}
+        if next_page_token is not None:
+            response['nextPageToken'] = next_page_token
+        return response
+
+    def _videos(self, id, part, **kwargs):
+        video_ids = id.split(',')
+        if len(video_ids) > 50:
+            raise self._error(400, 'invalidFilters')
+
+        items = []
+        for video_id in video_ids:
+            channel = self.channel_index_map.get(int(video_id[:3]))
+            video_index = int(video_id[4:])
+            if channel is None or video_index >= channel.video_count:
+                continue
+
+            item = {'kind': 'youtube#video', 'id': video_id}
+            if 'snippet' in part:
+                item['snippet'] = {'publishedAt': f'{channel.published(video_index):{_timestamp_format}}',
+                                   'channelId': channel.channel_id,
+                                   'channelTitle': channel.title,
+                                   'title': f'{channel.title} video {video_index}',
+                                   'description': ''}
+            if 'contentDetails' in part:
+                item['contentDetails'] = {'duration': f'PT{5 + video_index % 50}M{video_index % 60}S'}
+            if 'statistics' in part:
+                item['statistics'] = {'viewCount': str(1000 + 37 * video_index),
+                                      'likeCount': str(10 + video_index % 500),
+                                      'commentCount': str(video_index % 100)}
+            if 'liveStreamingDetails' in part and video_index % 20 == 0:
+                item['liveStreamingDetails'] = {'actualStartTime': item.get('snippet', {}).get('publishedAt')}
+            items.append(item)
+
+        return {'kind': 'youtube#videoListResponse', 'items': items}
+
+
+class FakeYouTubeWrapper(YouTubeWrapper):
+    """
+    YouTubeWrapper connected to a FakeYouTubeService, the quota is tracked separately from the
+    real usage and is not written to the ledger
+
+    :param fake_service: the fake service to use
+    :param max_requests_per_second: request rate ceiling of the wrapper
+    """
+
+    def __init__(self, fake_service: FakeYouTubeService, max_requests_per_second: float = 1000.0):
+        super().__init__(max_requests_per_second=max_requests_per_second,
+                         quota_tracker=QuotaTracker(ledger_fn=None))
+        self.fake_service = fake_service
+        self.service = fake_service
+        # the fake does not need the back off to be realistic, just exercised
+        self.retry_policy.base_delay = 0.01
+
+    def _build_service(self):
+        return self.fake_service
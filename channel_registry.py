@@ -0,0 +1,171 @@
+"""
+This module provides the registry of the YouTube channels the scripts analyse, replacing the
+channel IDs that each script used to hard code. The registry file (channel_registry.json) has a
+line for each channel with its configuration:
+- key: short name the scripts refer to the channel by, for example brain_blaze
+- channel_id: YouTube channel ID
+- name: name of the channel
+- groups: the groups the channel is in, for example whistler for the channels shown on the
+  weekly infographic
+- first_published: optional date to synchronise the channel back to, by default each script
+  uses the period it needs
+
+Each channel's data (its videos, metadata, sync state and weekly totals) is already a partition
+of the video store keyed by the channel ID, with the tables indexed by channel. The scripts look
+up the channels they use in the registry and only read those channels' rows, so the cost of an
+analysis depends on the channels it uses rather than the number of channels in the registry, see
+benchmarks/bench_registry.py
+"""
+import os
+import json
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from dateutil.parser import isoparse
+
+# the registry is kept alongside the scripts, so they can be run from any directory
+DEFAULT_REGISTRY_FN = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   'channel_registry.json')
+
+
+class ChannelConfig(NamedTuple):
+    """
+    Configuration of a channel in the registry
+    """
+    key: str
+    channel_id: str
+    name: str
+    groups: Tuple[str, ...] = ()
+    # date to synchronise the channel back to, None to use the period the script needs
+    first_published: Optional[datetime] = None
+
+    @classmethod
+    def from_record(cls, record: dict) -> 'ChannelConfig':
+        first_published = record.get('first_published')
+        return cls(key=record['key'],
+                   channel_id=record['channel_id'],
+                   name=record['name'],
+                   groups=tuple(record.get('groups', [])),
+                   first_published=None if first_published is None else isoparse(first_published))
+
+    def to_record(self) -> dict:
+        record = {'key': self.key, 'channel_id': self.channel_id, 'name': self.name,
+                  'groups': list(self.groups)}
+        if self.first_published is not None:
+            record['first_published'] = f'{self.first_published:%Y-%m-%dT%H:%M:%SZ}'
+        return record
+
+
+class ChannelRegistry:
+    """
+    Registry of the channels, read from the registry file when first used
+
+    :param registry_fn: file name of the registry
+    """
+
+    def __init__(self, registry_fn: str = DEFAULT_REGISTRY_FN):
+        self.registry_fn = registry_fn
+        self.__configs: Optional[Dict[str, ChannelConfig]] = None
+
+    @property
+    def _configs(self) -> Dict[str, ChannelConfig]:
+        # configurations keyed by the channel key, in the order of the registry file
+        if self.__configs is None:
+            with open(self.registry_fn) as fp:
+                records = json.load(fp)['channels']
+            self.__configs = {}
+            for record in records:
+                config = ChannelConfig.from_record(record)
+                if config.key in self.__configs:
+                    raise ValueError(f'channel {config.key} is in {self.registry_fn} twice')
+                self.__configs[config.key] = config
+        return self.__configs
+
+    def __len__(self):
+        return len(self._configs)
+
+    def __contains__(self, key: str):
+        return key in self._configs
+
+    def __getitem__(self, key: str) -> ChannelConfig:
+        return self._configs[key]
+
+    def channel_id(self, key: str) -> str:
+        """
+        YouTube channel ID of a channel
+
+        :param key: key of the channel in the registry, for example brain_blaze
+        """
+        return self._configs[key].channel_id
+
+    def group(self, group: str) -> List[ChannelConfig]:
+        """
+        Configuration of the channels in a group, in the order of the registry file
+        """
+        return [config for config in self._configs.values() if group in config.groups]
+
+    def channel_ids(self, group: str) -> List[str]:
+        """
+        YouTube channel IDs of the channels in a group, in the order of the registry file
+        """
+        return [config.channel_id for config in self.group(group)]
+
+    def add(self, config: ChannelConfig):
+        """
+        Add (or replace) a channel and write the registry file
+
+        :param config: configuration of the channel
+        """
+        self._configs[config.key] = config
+        records = [json.dumps(config.to_record()) for config in self._configs.values()]
+        with open(self.registry_fn, 'w') as fp:
+            fp.write('{"channels": [\n  ' + ',\n  '.join(records) + '\n]}\n')
+
+
+# registries read for class level access, keyed by the class and the registry file it names, so
+# the file is only read once for each class
+_class_registries: Dict[Tuple[type, str], ChannelRegistry] = {}
+
+
+def _owner_registry(instance, owner) -> ChannelRegistry:
+    # an instance uses its own registry, the class reads the registry file it names
+    registry = getattr(instance, 'channel_registry', None) if instance is not None else None
+    if registry is None:
+        registry_fn = getattr(owner, '_channel_registry_fn', DEFAULT_REGISTRY_FN)
+        registry = _class_registries.get((owner, registry_fn))
+        if registry is None:
+            registry = _class_registries.setdefault((owner, registry_fn),
+                                                    ChannelRegistry(registry_fn))
+    return registry
+
+
+class RegisteredChannelID:
+    """
+    Class attribute holding the YouTube channel ID of a channel in the registry, so it can be
+    read from the class as well as from an instance
+
+        class DataSet:
+            brain_blaze_channel_ID = RegisteredChannelID('brain_blaze')
+
+    :param key: key of the channel in the registry
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __get__(self, instance, owner) -> str:
+        return _owner_registry(instance, owner).channel_id(self.key)
+
+
+class RegisteredChannelIDs:
+    """
+    Class attribute holding the YouTube channel IDs of a group of channels in the registry
+
+    :param group: name of the group
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+
+    def __get__(self, instance, owner) -> List[str]:
+        return _owner_registry(instance, owner).channel_ids(self.group)
@@ -0,0 +1,244 @@
+"""
+This module provides the incremental synchronisation of the video store with the YouTube API.
+Each channel has a high water mark (the newest publish date seen so far) stored in the video
+store, so an update only has to search for videos published after that mark rather than
+re-crawling the whole channel history
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from dateutil.parser import isoparse
+
+from video_store import VideoStore
+
+# time after which the data in the store is considered out of date
+one_day_secs = 24 * 60 * 60
+
+# time after which each part of the video metadata is considered out of date, the statistics
+# (views and likes) change daily whereas the title, duration and publish date almost never change
+metadata_max_age = 30 * one_day_secs
+statistics_max_age = one_day_secs
+
+# number of video metadata records written to the store in each transaction as they arrive from
+# the API, so the store is updated while the rest of the records are requested
+store_batch_size = 500
+
+
+def batches(records: Iterable, size: int) -> Iterable[list]:
+    """
+    Split a sequence (or generator) into lists of at most size items
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def sync_channel_videos(easy_wrapper, video_store: VideoStore, earliest_date: datetime,
+                        channel_id_list: List[str], engine: str = 'search',
+                        max_workers: int = 1, max_age: float = one_day_secs) -> List[dict]:
+    """
+    Retrieve the videos published on a list of channels using the video store, each channel is
+    handled in one of three ways:
+    - If the channel has not been synchronised (or not back as far as earliest date) it
+      retrieves all videos from earliest date
+    - If the channel was last synchronised more than max_age ago it only searches for videos
+      published after the high water mark of the channel and adds them to the store
+    - Otherwise the videos in the store are used as they are
+
+    :param easy_wrapper: YouTubeWrapper to use for the searches
+    :param video_store: store to read and update
+    :type video_store: VideoStore
+    :param earliest_date: date to start the search from
+    :type earliest_date: datetime
+    :param channel_id_list: list of the YouTube channel IDs to search
+    :type channel_id_list: List[str]
+    :param engine: the YouTubeWrapper.channel_videos engine to use, either 'search' or 'uploads'
+    :type engine: str
+    :param max_workers: number of channels to crawl concurrently
+    :type max_workers: int
+    :param max_age: time in seconds after which a channel is synchronised again
+    :type max_age: float
+
+    :return: list of videos published on or after earliest date
+    """
+    current_time = time.time()
+
+    search_plan = []
+    for channel_id in channel_id_list:
+        high_water_mark, covered_from, synced_at = video_store.sync_state(channel_id)
+
+        if covered_from is None or covered_from > earliest_date:
+            # the channel has not been synchronised back as far as the earliest date, so the
+            # full history has to be retrieved
+            search_plan.append((channel_id, earliest_date, None, earliest_date))
+        elif (current_time - max_age) > synced_at:
+            search_start_date = covered_from if high_water_mark is None else high_water_mark
+            search_plan.append((channel_id, search_start_date, high_water_mark, covered_from))
+        else:
+            print(f'{channel_id=} was synchronised less than {max_age / 3600:.0f} hours ago '
+                  f'no update performed')
+
+    def get_videos(plan_entry):
+        channel_id, search_start_date, _, _ = plan_entry
+        new_videos = easy_wrapper.channel_videos(channelID=channel_id,
+                                                 order='date',
+                                                 publishedAfter=search_start_date,
+                                                 engine=engine)
+        print(f'{channel_id=}: {len(new_videos)} videos found after {search_start_date:%Y-%m-%d %H:%M}')
+        return new_videos
+
+    if max_workers > 1 and len(search_plan) > 1:
+        # the channels are crawled concurrently, the overall request rate is limited by the
+        # wrapper's rate limiter. map returns the results in the order of the channel list so
+        # the store is updated the same way every time
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(search_plan))) as executor:
+            channel_results = list(executor.map(get_videos, search_plan))
+    else:
+        channel_results = [get_videos(plan_entry) for plan_entry in search_plan]
+
+    for (channel_id, _, high_water_mark, covered_from), new_videos in zip(search_plan,
+                                                                        channel_results):
+        video_store.upsert_videos(new_videos)
+        for video in new_videos:
+            published = isoparse(video['publishedAt'])
+            if high_water_mark is None or published > high_water_mark:
+                high_water_mark = published
+        video_store.update_sync_state(channel_id, high_water_mark=high_water_mark,
+                                      covered_from=covered_from)
+
+    return video_store.channel_videos(channel_id_list, published_after=earliest_date)
+
+
+def sync_video_details(easy_wrapper, video_store: VideoStore, video_ids: Iterable[str],
+                       max_age: Optional[float] = None,
+                       statistics_max_age: Optional[float] = None,
+                       view_history=None) -> List[dict]:
+    """
+    Retrieve the metadata for a list of videos using the video store, see refresh_video_details
+
+    :return: list of video metadata records in the order of the IDs
+    """
+    video_ids = list(video_ids)
+    refresh_video_details(easy_wrapper=easy_wrapper, video_store=video_store,
+                          video_ids=video_ids, max_age=max_age,
+                          statistics_max_age=statistics_max_age, view_history=view_history)
+
+    return video_store.details(video_ids)
+
+
+def refresh_video_details(easy_wrapper, video_store: VideoStore, video_ids: Iterable[str],
+                          max_age: Optional[float] = None,
+                          statistics_max_age: Optional[float] = None,
+                          view_history=None):
+    """
+    Bring the metadata of a list of videos in the video store up to date, without reading it
+    back, so the caller can stream it from the store (see VideoStore.iter_details). The parts of
+    the metadata are refreshed separately:
+    - videos that are not in the store (or whose metadata was fetched more than max_age ago) are
+      requested in full
+    - videos whose statistics were fetched more than statistics_max_age ago only have the
+      statistics requested, which are merged into the metadata in the store
+
+    :param easy_wrapper: YouTubeWrapper to use for the requests
+    :param video_store: store to read and update
+    :type video_store: VideoStore
+    :param video_ids: YouTube video IDs
+    :param max_age: optional time in seconds after which the metadata of a video is fetched
+                    again, if None the metadata of a video is only fetched once
+    :type max_age: float
+    :param statistics_max_age: optional time in seconds after which the statistics of a video
+                               are fetched again, if None they are only refreshed along with the
+                               rest of the metadata
+    :type statistics_max_age: float
+    :param view_history: optional ViewHistory to record the statistics fetched in, giving a
+                         daily snapshot of the videos refreshed
+    """
+    video_ids = list(video_ids)
+    fetched_at = video_store.detail_fetched_at(video_ids)
+
+    current_time = time.time()
+    stale_video_ids = []
+    stale_statistics_video_ids = []
+    for video_id in video_ids:
+        if video_id not in fetched_at:
+            stale_video_ids.append(video_id)
+            continue
+
+        detail_fetched_at, statistics_fetched_at = fetched_at[video_id]
+        if max_age is not None and (current_time - max_age) > detail_fetched_at:
+            stale_video_ids.append(video_id)
+        elif statistics_max_age is not None and \
+                (statistics_fetched_at is None or
+                 (current_time - statistics_max_age) > statistics_fetched_at):
+            stale_statistics_video_ids.append(video_id)
+
+    if len(stale_video_ids) > 0:
+        # the records are streamed into the store as the pages arrive rather than collected
+        # first
+        for batch in batches(easy_wrapper.iter_metadata_bulk(video_ids=stale_video_ids),
+                             store_batch_size):
+            video_store.upsert_details(batch)
+            if view_history is not None:
+                view_history.record({detail['video_id']: detail.get('statistics', {})
+                                     for detail in batch})
+    if len(stale_statistics_video_ids) > 0:
+        print(f'refreshing the statistics of {len(stale_statistics_video_ids)} videos')
+        statistics = easy_wrapper.get_statistics_bulk(video_ids=stale_statistics_video_ids)
+        video_store.update_statistics(statistics)
+        if view_history is not None:
+            view_history.record(statistics)
+    if len(stale_video_ids) == 0 and len(stale_statistics_video_ids) == 0:
+        print(f'metadata for all {len(video_ids)} videos is up to date no update performed')
+
+
+def poll_new_uploads(easy_wrapper, video_store: VideoStore, channel_id: str,
+                     earliest_date: datetime) -> (str, List[dict]):
+    """
+    Find the uploads of a channel that have not been handled yet, using the watermark and the
+    uploads already seen that are kept in the video store. The uploads playlist is walked newest
+    first and the walk stops at the first upload already seen (or published before the
+    watermark), so a poll that finds nothing new costs a single page (1 quota unit).
+
+    The uploads are not marked as seen here, the caller marks each one with
+    VideoStore.mark_uploads_seen once it has been handled, so a run that fails part way (or is
+    run again) only returns the uploads that were not handled
+
+    :param easy_wrapper: YouTubeWrapper to use for the requests
+    :param video_store: store holding the polling state, the new uploads are also added to it
+    :type video_store: VideoStore
+    :param channel_id: YouTube channel ID
+    :param earliest_date: on the first poll of a channel the uploads published before this are
+                          treated as already seen
+    :type earliest_date: datetime
+
+    :return: tuple of the ID of the uploads playlist and the new uploads (oldest first), each a
+             dictionary with the video_id, publishedAt and channel_id
+    """
+    playlist_id, watermark, seen_video_ids = video_store.upload_poll_state(channel_id)
+    if playlist_id is None:
+        playlist_id = easy_wrapper.uploads_playlist_id(channel_id)
+    cutoff = earliest_date if watermark is None else watermark
+
+    new_uploads = []
+    for upload in easy_wrapper.iter_playlist(playlist_id=playlist_id, caller='poll_new_uploads'):
+        if upload['video_id'] in seen_video_ids:
+            break
+        if upload['publishedAt'] is None:
+            # private and deleted videos do not have a publish date
+            continue
+        if isoparse(upload['publishedAt']) < cutoff:
+            if watermark is None:
+                # the first poll records where it stopped so the next poll stops there
+                video_store.mark_uploads_seen(channel_id, playlist_id, [upload])
+            break
+        new_uploads.append(upload)
+
+    video_store.upsert_videos(new_uploads)
+
+    return playlist_id, new_uploads[::-1]
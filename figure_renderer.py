@@ -0,0 +1,171 @@
+"""
+This module provides the rendering of plotly figures to image files. Starting the Kaleido renderer
+(which runs a headless Chromium) takes much longer than rendering a figure, so the figures are
+queued and rendered together by a renderer that is started once and kept running, optionally
+spread over a pool of processes each with its own renderer
+"""
+import os
+import time
+from multiprocessing import util
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+
+def _start_renderer() -> float:
+    """
+    Start the Kaleido renderer for this process and render an empty figure so the start up cost
+    is paid before the first real figure
+
+    Kaleido 1.x starts a new browser for every image unless its sync server is running, older
+    versions keep the browser of the plotly scope running once it has started
+
+    :return: time in seconds taken to start the renderer
+    """
+    import kaleido
+    import plotly.io as pio
+
+    start_time = time.perf_counter()
+    start_sync_server = getattr(kaleido, 'start_sync_server', None)
+    if start_sync_server is not None:
+        start_sync_server(silence_warnings=True)
+    pio.to_image({'data': [], 'layout': {}}, format='png', width=10, height=10)
+
+    return time.perf_counter() - start_time
+
+
+def _stop_renderer():
+    import kaleido
+
+    stop_sync_server = getattr(kaleido, 'stop_sync_server', None)
+    if stop_sync_server is not None:
+        stop_sync_server(silence_warnings=True)
+
+
+def _start_worker_renderer():
+    """
+    Start the renderer of a process of the pool, and stop it when the process exits. The pool's
+    processes leave through multiprocessing, which runs its finalizers but not the atexit hooks
+    """
+    _start_renderer()
+    util.Finalize(None, _stop_renderer, exitpriority=10)
+
+
+def _render_job(job: dict) -> dict:
+    """
+    Render a queued figure with the renderer of this process
+
+    :param job: the figure (as a dictionary), the file name and the write_image options
+    :return: timing of the render
+    """
+    import plotly.io as pio
+
+    start_time = time.perf_counter()
+    pio.write_image(job['figure'], job['file_name'], **job['options'])
+
+    return {'file_name': job['file_name'],
+            'render_time': time.perf_counter() - start_time,
+            'pid': os.getpid()}
+
+
+class FigureRenderer:
+    """
+    Queue of figures to be written as image files, rendered by a long lived Kaleido renderer
+
+    The renderer is started on the first render and stopped by close (or on leaving a with block)
+
+        with FigureRenderer() as renderer:
+            renderer.submit(fig, 'bb_infographic.png')
+            renderer.submit(fig2, 'bb_piechart.png')
+            renderer.render()
+
+    :param max_workers: number of processes to render the figures in, each process starts its own
+                        renderer so this is only worth while for large numbers of figures. If 1
+                        the figures are rendered in this process
+    """
+
+    def __init__(self, max_workers: int = 1):
+        if max_workers < 1:
+            raise ValueError(f'max_workers must be at least 1, got {max_workers}')
+        self.max_workers = max_workers
+        self.__jobs = []
+        self.__started = False
+        self.__executor: Optional[ProcessPoolExecutor] = None
+
+        # metrics
+        self.startup_time = 0.0
+        self.timings: List[dict] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, figure, file_name: str, **options):
+        """
+        Queue a figure to be rendered
+
+        :param figure: plotly figure (or figure dictionary)
+        :param file_name: image file to write, the format is taken from the extension
+        :param options: other arguments for plotly.io.write_image, for example scale
+        """
+        if hasattr(figure, 'to_dict'):
+            figure = figure.to_dict()
+        self.__jobs.append({'figure': figure, 'file_name': file_name, 'options': options})
+
+    def __len__(self):
+        return len(self.__jobs)
+
+    def render(self) -> List[dict]:
+        """
+        Render all the queued figures
+
+        :return: list of the timing of each figure rendered, each a dictionary with the file_name,
+                 the render_time in seconds and the pid of the process that rendered it
+        """
+        jobs, self.__jobs = self.__jobs, []
+        if len(jobs) == 0:
+            return []
+
+        if self.max_workers > 1 and len(jobs) > 1:
+            if self.__executor is None:
+                self.__executor = ProcessPoolExecutor(
+                    max_workers=min(self.max_workers, len(jobs)),
+                    initializer=_start_worker_renderer)
+            timings = list(self.__executor.map(_render_job, jobs))
+        else:
+            if not self.__started:
+                self.startup_time = _start_renderer()
+                self.__started = True
+            timings = [_render_job(job) for job in jobs]
+
+        self.timings += timings
+        return timings
+
+    def close(self):
+        """
+        Stop the renderer (or the pool of processes rendering the figures, each stops its own
+        renderer as it exits)
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+        if self.__started:
+            _stop_renderer()
+            self.__started = False
+
+    def summary(self) -> str:
+        """
+        Summary of the time taken to render the figures
+        """
+        if len(self.timings) == 0:
+            return 'no figures rendered'
+        render_times = [timing['render_time'] for timing in self.timings]
+        lines = [f'{len(render_times)} figures rendered in {sum(render_times):.2f}s '
+                 f'(mean {sum(render_times) / len(render_times):.2f}s, '
+                 f'max {max(render_times):.2f}s per figure)']
+        if self.startup_time > 0:
+            lines.append(f'renderer start up took {self.startup_time:.2f}s')
+        lines += [f'  {timing["file_name"]}: {timing["render_time"]:.2f}s'
+                  for timing in self.timings]
+        return '\n'.join(lines)
@@ -4,160 +4,498 @@ it started out as an extension to the YoutubeEasyWrapper, however, increasingly
 class was being overridden so the link was broken
 """
 import os
+import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qsl, urlencode
 
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from rate_limiter import RateLimiter, RetryPolicy
+from quota_ledger import QuotaTracker, default_tracker, describe_request
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 from datetime import datetime, timezone
-from time import sleep
+from time import sleep, perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from dateutil.parser import isoparse
 
 class GoogleAPIBase:
 
-    def __init__(self, service_name, api_version):
+    def __init__(self, service_name, api_version, max_requests_per_second: float = 10.0,
+                 quota_tracker: QuotaTracker = default_tracker):
         self.service = None
         self.__service_name = service_name
         self.__api_version = api_version
+        self.__api_key = None
+        self.__thread_local = threading.local()
+        # shared by every thread using this wrapper, so it is a ceiling for the wrapper as a whole
+        self.rate_limiter = RateLimiter(rate=max_requests_per_second)
+        self.retry_policy = RetryPolicy()
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        # by default all the wrappers in a process share a tracker so a single summary is written
+        self.quota_tracker = quota_tracker
+        # optional cache of responses (see VideoStore.cached_response and store_response), if set
+        # requests are made conditional on the ETag of the previous response
+        self.response_cache = None
 
     def initialize(self, api_key):
-        self.service = build(self.__service_name, self.__api_version, developerKey=api_key)
+        self.__api_key = api_key
+        self.service = self._build_service()
+
+    def _build_service(self):
+        """
+        Build a googleapiclient service object for the API, the discovery document shipped with
+        googleapiclient is used rather than fetching it from Google each time a service is built
+        """
+        return build(self.__service_name, self.__api_version, developerKey=self.__api_key,
+                     static_discovery=True, cache_discovery=False)
+
+    @property
+    def thread_service(self):
+        """
+        The service objects from googleapiclient share a single http connection and are not
+        thread safe, therefore any worker thread gets its own service object built from the same
+        API key, the main thread continues to use `service`
+        """
+        if threading.current_thread() is threading.main_thread():
+            return self.service
+
+        service = getattr(self.__thread_local, 'service', None)
+        if service is None:
+            service = self._build_service()
+            self.__thread_local.service = service
+        return service
+
+    # reasons given with a 403 response that indicate a temporary rate limit, rather than the
+    # daily quota being used up (which will not recover by retrying)
+    _rate_limit_reasons = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+    @classmethod
+    def _is_transient(cls, error: HttpError) -> bool:
+        """
+        Determine if a failed request is worth retrying
+        """
+        status = error.resp.status
+        if status == 429 or status >= 500:
+            return True
+        if status == 403:
+            try:
+                content = json.loads(error.content)
+                reasons = {entry.get('reason') for entry in content['error'].get('errors', [])}
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return False
+            return len(reasons & cls._rate_limit_reasons) > 0
+        return False
+
+    # endpoints whose responses are cached with their ETag so that a refresh can be made as a
+    # conditional request, the search results change too often for this to be worthwhile
+    _conditional_endpoints = {'youtube.videos.list',
+                              'youtube.channels.list',
+                              'youtube.playlistItems.list'}
+
+    @classmethod
+    def _is_conditional(cls, request, endpoint: str, parts: str) -> bool:
+        """
+        Determine if a request is worth caching for a conditional request. The statistics change
+        every day so a response including them is almost never unchanged, and the ID lists of the
+        bulk requests shift as videos are added so the same list is rarely requested again,
+        caching either would only grow the cache
+        """
+        if endpoint not in cls._conditional_endpoints:
+            return False
+        if 'statistics' in parts.split(','):
+            return False
+        ids = dict(parse_qsl(urlparse(request.uri).query)).get('id', '')
+        return ',' not in ids
+
+    @staticmethod
+    def _request_key(request) -> str:
+        """
+        Key identifying a request in the response cache, this is the method and URI with the
+        API key removed and the query parameters sorted
+        """
+        uri = urlparse(request.uri)
+        query = sorted((name, value) for name, value in parse_qsl(uri.query) if name != 'key')
+        return f'{request.method} {uri.path}?{urlencode(query)}'
+
+    def _execute(self, request, caller: Optional[str] = None):
+        """
+        Execute an API request, all requests made by the wrappers should go through this method
+        so that they respect the request rate ceiling and are retried with a jittered exponential
+        backoff if the API returns a rate limit (403 or 429) or server (5xx) error
+
+        If a response cache is set, requests to the endpoints that support it send the ETag of
+        the previous response in an If-None-Match header, if the API responds with 304 (Not
+        Modified) the cached response is returned
+
+        :param request: request object from the googleapiclient service
+        :param caller: wrapper method the request is made for, used to attribute the quota
+                       usage, by default the method calling _execute
+        :return: response from the API
+        """
+        endpoint, parts = describe_request(request)
+        # the wrapper method that made the request, used to attribute the quota usage
+        if caller is None:
+            caller = sys._getframe(1).f_code.co_name
+
+        request_key = None
+        cached_response = None
+        if self.response_cache is not None and self._is_conditional(request, endpoint, parts):
+            request_key = self._request_key(request)
+            cached_response = self.response_cache.cached_response(request_key)
+            if cached_response is not None:
+                request.headers['If-None-Match'] = cached_response[0]
+
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            start_time = perf_counter()
+            try:
+                response = request.execute()
+            except HttpError as error:
+                self.quota_tracker.record(endpoint=endpoint, parts=parts, caller=caller,
+                                          latency=perf_counter() - start_time,
+                                          status=error.resp.status)
+                if error.resp.status == 304 and cached_response is not None:
+                    # not modified since the cached response, which is kept from being pruned
+                    self.rate_limiter.report_success()
+                    self.response_cache.store_response(request_key, *cached_response)
+                    return cached_response[1]
+                if not self._is_transient(error) or attempt >= self.retry_policy.max_retries:
+                    raise
+                if error.resp.status < 500:
+                    self.rate_limiter.report_rate_limited()
+                delay = self.retry_policy.delay(attempt)
+                print(f'request failed with status {error.resp.status}, retrying in {delay:.1f}s')
+                self.retries += 1
+                self.backoff_seconds += delay
+                sleep(delay)
+                attempt += 1
+            else:
+                self.quota_tracker.record(endpoint=endpoint, parts=parts, caller=caller,
+                                          latency=perf_counter() - start_time)
+                self.rate_limiter.report_success()
+                if request_key is not None and 'etag' in response:
+                    self.response_cache.store_response(request_key, response['etag'], response)
+                return response
+
+    def _pages(self, list_method, caller: str, max_pages: int = 30000, **kwargs) -> Iterator[dict]:
+        """
+        Generator of the pages of a paginated list request, each page is yielded as soon as it
+        arrives so it can be processed before the next page is requested, and the next page is
+        only requested if the consumer asks for it
+
+        :param list_method: method of the service building the request, for example
+                            service.search().list
+        :param caller: wrapper method the pages are requested for, see _execute
+        :param max_pages: maximum number of pages to request after the first
+        :param kwargs: arguments of the request
+        """
+        results = self._execute(list_method(**kwargs), caller=caller)
+
+        current_page = 0
+        while results:
+            yield results
+
+            if 'nextPageToken' not in results or current_page >= max_pages:
+                break
+            kwargs['pageToken'] = results['nextPageToken']
+            results = self._execute(list_method(**kwargs), caller=caller)
+            current_page += 1
+
+    @property
+    def throttle_metrics(self) -> dict:
+        """
+        Time spent throttled by the rate limiter and backing off after failed requests
+        """
+        metrics = self.rate_limiter.metrics
+        metrics['retries'] = self.retries
+        metrics['backoff_seconds'] = self.backoff_seconds
+        return metrics
 
 class YouTubeWrapper(GoogleAPIBase):
 
-    def __init__(self):
-        super().__init__(service_name='youtube', api_version='v3')
+    # parts requested for the video metadata
+    metadata_parts = 'id, snippet, contentDetails, statistics, liveStreamingDetails'
+    # maximum number of video IDs the API will accept in a single videos().list call
+    max_ids_per_request = 50
+
+    def __init__(self, max_requests_per_second: float = 10.0,
+                 quota_tracker: QuotaTracker = default_tracker):
+        super().__init__(service_name='youtube', api_version='v3',
+                         max_requests_per_second=max_requests_per_second,
+                         quota_tracker=quota_tracker)
+        self.__uploads_playlists = {}
 
     def channel_videos(self, channelID,
                        publishedAfter: datetime = datetime(year=2001, month=1, day=1,
                                                            tzinfo=timezone.utc),
-                       publishedBefore: datetime = datetime.now(timezone.utc), **kwargs):
+                       publishedBefore: Optional[datetime] = None,
+                       engine: str = 'search', **kwargs) -> List[dict]:
+        """
+        Find the videos published on a channel between two dates, two engines are supported:
+        - search: uses search().list, this costs 100 quota units per page and the results can be
+          incomplete for large channels
+        - uploads: walks the channel's uploads playlist, this costs 1 quota unit per page and
+          returns every video
+
+        :param channelID: YouTube channel ID
+        :param publishedAfter: earliest publish date to return
+        :param publishedBefore: latest publish date to return, if None there is no limit
+        :param engine: either 'search' or 'uploads'
+
+        :return: list of videos, each a dictionary with the video_id, publishedAt and channel_id
+        """
+        return list(self.iter_channel_videos(channelID, publishedAfter=publishedAfter,
+                                             publishedBefore=publishedBefore, engine=engine,
+                                             **kwargs))
+
+    def iter_channel_videos(self, channelID,
+                            publishedAfter: datetime = datetime(year=2001, month=1, day=1,
+                                                                tzinfo=timezone.utc),
+                            publishedBefore: Optional[datetime] = None,
+                            engine: str = 'search', **kwargs) -> Iterator[dict]:
+        """
+        Generator version of channel_videos, the videos on each page are yielded as the page
+        arrives
+        """
+        if engine == 'uploads':
+            yield from self.iter_playlist(playlist_id=self.uploads_playlist_id(channelID),
+                                          publishedAfter=publishedAfter,
+                                          publishedBefore=publishedBefore)
+            return
+        if engine != 'search':
+            raise ValueError(f'unsupported channel video engine: {engine}')
+
         kwargs['channelId'] = channelID
-        kwargs['publishedBefore'] = publishedBefore.isoformat()
+        if publishedBefore is not None:
+            kwargs['publishedBefore'] = publishedBefore.isoformat()
         kwargs['publishedAfter'] = publishedAfter.isoformat()
         kwargs['maxResults'] = 50  # maximum number supported by the API
-        if 'order' in kwargs.items():
-            kwargs['order'] = kwargs['order']
-        else:
+        if 'order' not in kwargs:
             kwargs['order'] = 'relevance'
-        kwargs['part'] = 'id'
+        # the snippet costs no additional quota and provides the publish date needed for the
+        # incremental cache updates
+        kwargs['part'] = 'id,snippet'
         kwargs['type'] = 'video'
 
-        items = []
-        results = self.service.search().list(**kwargs).execute()
-
-        current_page = 0
-        max_pages = 30000
-        while results and current_page < max_pages:
-            items.extend(results['items'])
-
-            if 'nextPageToken' in results:
-                kwargs['pageToken'] = results['nextPageToken']
-                sleep(1)
-                results = self.service.search().list(**kwargs).execute()
-                current_page += 1
-            else:
-                break
-
-        output = []
-        for item in items:
-            result = dict()
-            result['video_id'] = item['id']['videoId']
-            output.append(result)
-
-        return output
+        for results in self._pages(self.thread_service.search().list, caller='channel_videos',
+                                   **kwargs):
+            for item in results['items']:
+                yield {'video_id': item['id']['videoId'],
+                       'publishedAt': item['snippet']['publishedAt'],
+                       'channel_id': item['snippet']['channelId']}
 
     def channel(self, channelID, **kwargs):
         kwargs['id'] = channelID
         kwargs['part'] = 'id,snippet'
 
-        items = []
-        results = self.service.channels().list(**kwargs).execute()
+        output = []
+        for results in self._pages(self.thread_service.channels().list, caller='channel',
+                                   **kwargs):
+            for item in results['items']:
+                output.append({'title': item['snippet']['title'], 'id': item['id']})
 
-        current_page = 0
-        max_pages = 30000
-        while results and current_page < max_pages:
-            items.extend(results['items'])
-
-            if 'nextPageToken' in results:
-                kwargs['pageToken'] = results['nextPageToken']
-                sleep(1)
-                results = self.service.search().list(**kwargs).execute()
-                current_page += 1
-            else:
-                break
+        return output
 
-        output = []
-        for item in items:
-            result = dict()
-            result['title'] = item['snippet']['title']
-            result['id'] = item['id']
-            output.append(result)
+    @staticmethod
+    def _metadata_record(result) -> dict:
+        """
+        Convert a single item from a videos().list response into the record format used by the
+        caches
+
+        :param result: item from the videos().list response
+        :return: video metadata record
+        """
+        # liveStreamingDetails is None for videos that were never live
+        output = dict.fromkeys(['video_id', 'title', 'description', 'publishedAt', 'tags',
+                                'contentDetails', 'statistics', 'liveStreamingDetails'], None)
+
+        output['video_id'] = result['id']
+        output['title'] = result['snippet']['title']
+        output['description'] = result['snippet']['description']
+        output['publishedAt'] = result['snippet']['publishedAt']
+        output['contentDetails'] = result['contentDetails']
+        output['Channel'] = result['snippet']['channelTitle']
+        output['channel_id'] = result['snippet']['channelId']
+        if 'liveStreamingDetails' in result.keys():
+            output['liveStreamingDetails'] = result['liveStreamingDetails']
+        output['statistics'] = result['statistics']
 
         return output
 
     def get_metadata(self, video_id):
-        list_videos_by_id = self.service.videos().list(id=video_id,
-                                                       part="id, snippet, contentDetails, statistics, liveStreamingDetails").execute()
+        list_videos_by_id = self._execute(self.thread_service.videos().list(id=video_id,
+                                                                            part=self.metadata_parts))
         results = list_videos_by_id.get("items", [])
         if len(results) > 1:
-            output = []
-            for result in results:
-                output_record = dict.fromkeys(
-                    ['video_id', 'title', 'description', 'publishedAt', 'tags', 'contentDetails',
-                     'statistics', 'liveStreamingDetails'], None)
-
-                output_record['video_id'] = result['id']
-                output_record['title'] = result['snippet']['title']
-                output_record['description'] = result['snippet']['description']
-                output_record['publishedAt'] = result['snippet']['publishedAt']
-                output_record['contentDetails'] = result['contentDetails']
-                output_record['Channel'] = result['snippet']['channelTitle']
-                if 'liveStreamingDetails' in result.keys():
-                    output_record['liveStreamingDetails'] = result['liveStreamingDetails']
-                output_record['statistics'] = result['statistics']
-
-                output.append(output_record)
+            output = [self._metadata_record(result) for result in results]
         else:
-            output = dict.fromkeys(['video_id', 'title', 'description', 'publishedAt', 'tags', 'contentDetails', 'statistics'], None)
-
-            output['video_id'] = results[0]['id']
-            output['title'] = results[0]['snippet']['title']
-            output['description'] = results[0]['snippet']['description']
-            output['publishedAt'] = results[0]['snippet']['publishedAt']
-            output['contentDetails'] = results[0]['contentDetails']
-            output['Channel'] = results[0]['snippet']['channelTitle']
-            if 'liveStreamingDetails' in results[0].keys():
-                output['liveStreamingDetails'] = results[0]['liveStreamingDetails']
-            output['statistics'] = results[0]['statistics']
+            output = self._metadata_record(results[0])
 
         return output
 
-    def get_playlist(self, playlist_id:str, **kwargs):
-
+    def _iter_videos_list_bulk(self, video_ids: Iterable[str], part: str,
+                               max_workers: int, caller: str) -> Iterator[List[dict]]:
+        """
+        Request any number of videos with videos().list, the IDs are split into chunks of 50
+        (the most the API accepts in one call) and the chunks are requested concurrently. The
+        items of each chunk are yielded as soon as the chunk (and all the chunks before it) has
+        arrived
+
+        :return: generator of lists of the response items of each chunk, in the order the IDs
+                 were supplied, videos that no longer exist (deleted or private) are omitted
+        """
+        # remove any duplicates whilst preserving the order
+        video_ids = list(dict.fromkeys(video_ids))
+        chunks = [video_ids[start_point:start_point + self.max_ids_per_request]
+                  for start_point in range(0, len(video_ids), self.max_ids_per_request)]
+
+        def get_videos_chunk(chunk):
+            results = self._execute(self.thread_service.videos().list(id=','.join(chunk),
+                                                                      part=part,
+                                                                      maxResults=self.max_ids_per_request),
+                                    caller=caller)
+            items = {item['id']: item for item in results.get("items", [])}
+            return [items[video_id] for video_id in chunk if video_id in items]
+
+        if len(chunks) > 1 and max_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+                yield from executor.map(get_videos_chunk, chunks)
+        else:
+            for chunk in chunks:
+                yield get_videos_chunk(chunk)
+
+    def iter_metadata_bulk(self, video_ids: Iterable[str], max_workers: int = 4) -> Iterator[dict]:
+        """
+        Generator version of get_metadata_bulk, the records of each chunk of 50 videos are
+        yielded as the chunk arrives so they can be stored or processed while the rest are
+        requested
+        """
+        for chunk_items in self._iter_videos_list_bulk(video_ids=video_ids,
+                                                       part=self.metadata_parts,
+                                                       max_workers=max_workers,
+                                                       caller='get_metadata_bulk'):
+            for item in chunk_items:
+                yield self._metadata_record(item)
+
+    def get_metadata_bulk(self, video_ids: Iterable[str], max_workers: int = 4) -> List[dict]:
+        """
+        Retrieve the metadata for any number of videos, the IDs are split into chunks of 50 (the
+        most the API accepts in one call) and the chunks are requested concurrently
+
+        :param video_ids: YouTube video IDs to retrieve
+        :type video_ids: Iterable[str]
+        :param max_workers: maximum number of requests in flight at once
+        :type max_workers: int
+
+        :return: list of video metadata records (same format as get_metadata) in the order the
+                 IDs were supplied, videos that no longer exist (deleted or private) are omitted
+        """
+        return list(self.iter_metadata_bulk(video_ids=video_ids, max_workers=max_workers))
+
+    def get_statistics_bulk(self, video_ids: Iterable[str],
+                            max_workers: int = 4) -> Dict[str, dict]:
+        """
+        Retrieve only the statistics (views, likes and comments) for any number of videos, this
+        is much smaller than the full metadata so is used to keep the statistics of videos
+        already in the cache up to date
+
+        :param video_ids: YouTube video IDs to retrieve
+        :type video_ids: Iterable[str]
+        :param max_workers: maximum number of requests in flight at once
+        :type max_workers: int
+
+        :return: dictionary of the statistics keyed by video ID, videos that no longer exist are
+                 omitted
+        """
+        return {item['id']: item['statistics']
+                for chunk_items in self._iter_videos_list_bulk(video_ids=video_ids,
+                                                               part='id, statistics',
+                                                               max_workers=max_workers,
+                                                               caller='get_statistics_bulk')
+                for item in chunk_items}
+
+    def uploads_playlist_id(self, channelID: str) -> str:
+        """
+        ID of the playlist containing all the uploads of a channel, this is only looked up once
+        for each channel
+
+        :param channelID: YouTube channel ID
+        :return: playlist ID
+        """
+        if channelID not in self.__uploads_playlists:
+            results = self._execute(self.thread_service.channels().list(id=channelID,
+                                                                       part='contentDetails'))
+            for item in results.get('items', []):
+                self.__uploads_playlists[item['id']] = \
+                    item['contentDetails']['relatedPlaylists']['uploads']
+
+        return self.__uploads_playlists[channelID]
+
+    def get_playlist(self, playlist_id:str, publishedAfter: Optional[datetime] = None,
+                     publishedBefore: Optional[datetime] = None, **kwargs) -> List[dict]:
+        """
+        Retrieve the videos in a playlist
+
+        If publishedAfter is given, the playlist is assumed to be in reverse chronological
+        order (as the uploads playlists are) and the retrieval stops at the first page that
+        only contains videos published before that date
+
+        :param playlist_id: YouTube playlist ID
+        :param publishedAfter: optional earliest video publish date to return
+        :param publishedBefore: optional latest video publish date to return
+
+        :return: list of videos, each a dictionary with the video_id, publishedAt and channel_id
+        """
+        return list(self.iter_playlist(playlist_id, publishedAfter=publishedAfter,
+                                       publishedBefore=publishedBefore, **kwargs))
+
+    def iter_playlist(self, playlist_id:str, publishedAfter: Optional[datetime] = None,
+                      publishedBefore: Optional[datetime] = None,
+                      caller: str = 'get_playlist', **kwargs) -> Iterator[dict]:
+        """
+        Generator version of get_playlist, the videos on each page are yielded as the page
+        arrives
+        """
         kwargs['playlistId'] = playlist_id
         kwargs['maxResults'] = 50  # maximum number supported by the API
-        kwargs['part'] = 'snippet'
-
-        items = []
-        results = self.service.playlistItems().list(**kwargs).execute()
-
-        current_page = 0
-        max_pages = 30000
-        while results and current_page < max_pages:
-            items.extend(results['items'])
-
-            if 'nextPageToken' in results:
-                kwargs['pageToken'] = results['nextPageToken']
-                sleep(1)
-                results = self.service.playlistItems().list(**kwargs).execute()
-                current_page += 1
+        kwargs['part'] = 'snippet,contentDetails'
+
+        def in_range(item):
+            published = item['contentDetails'].get('videoPublishedAt')
+            if published is None:
+                # private and deleted videos do not have a publish date
+                return False
+            published = isoparse(published)
+            if publishedAfter is not None and published < publishedAfter:
+                return False
+            if publishedBefore is not None and published > publishedBefore:
+                return False
+            return True
+
+        for results in self._pages(self.thread_service.playlistItems().list, caller=caller,
+                                   **kwargs):
+            if publishedAfter is None and publishedBefore is None:
+                page_items = results['items']
             else:
+                page_items = [item for item in results['items'] if in_range(item)]
+
+            for item in page_items:
+                yield {'video_id': item['snippet']['resourceId']['videoId'],
+                       'publishedAt': item['contentDetails'].get('videoPublishedAt'),
+                       'channel_id': item['snippet'].get('videoOwnerChannelId',
+                                                         item['snippet']['channelId'])}
+
+            if publishedAfter is not None and len(page_items) == 0 and \
+                    all(isoparse(item['contentDetails']['videoPublishedAt']) < publishedAfter
+                        for item in results['items']
+                        if 'videoPublishedAt' in item['contentDetails']):
+                # the rest of the playlist is older than the requested date range
                 break
-
-        output = []
-        for item in items:
-            result = dict()
-            result['video_id'] = item['snippet']['resourceId']['videoId']
-            output.append(result)
-
-        return output
@@ -0,0 +1,33 @@
+"""
+This module provides the parsing of the ISO8601 durations YouTube uses for the video durations,
+it only depends on the standard library so it can be used without loading pandas
+"""
+import re
+from datetime import timedelta
+from typing import Optional
+
+# ISO8601 durations as used by YouTube, for example PT1H2M3S or P1DT2H for videos over a day
+_ISO8601_duration_pattern = r'^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?' \
+                            r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+_ISO8601_duration_seconds = {'weeks': 7 * 24 * 60 * 60,
+                             'days': 24 * 60 * 60,
+                             'hours': 60 * 60,
+                             'minutes': 60,
+                             'seconds': 1}
+
+def ISO8601_duration_to_time_delta(value: str) -> Optional[timedelta]:
+    """
+    function to convert ISO8601 relative periods (used for video durations) into a Python
+    timedelta
+
+    :param value: a string containing a ISO duration
+    :return: duration as a timedelta
+    """
+
+    analysis = re.match(_ISO8601_duration_pattern, value)
+    if analysis is None or not any(analysis.groupdict().values()):
+        print(f'failed to process: {value}')
+        return None
+
+    return timedelta(**{unit: int(count) for unit, count in analysis.groupdict().items()
+                        if count is not None})
@@ -0,0 +1,294 @@
+"""
+This module provides the publishing of the reports and new video announcements to Twitter. The
+media for all the posts are uploaded concurrently before anything is posted, the posts are then
+made in parallel unless their order matters (for example a series of announcements which should
+appear in the order the videos were published), each step is retried with a jittered
+exponential backoff if Twitter reports a rate limit, server or network error and the latency of
+every step is recorded.
+
+Posting is not idempotent, a post whose response is lost (for example a read timeout) may still
+have been made, so posts are only retried when Twitter reports an error and a post rejected as
+a duplicate of an earlier one is taken as already made.
+
+tweepy is only imported when a publisher is built from credentials (see
+TweetPublisher.from_credentials), so the daily job does not pay for it when there is nothing to
+tweet. The clients are passed in as factories so the publisher can be pointed at a stand-in,
+see benchmarks/fake_twitter.py
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from rate_limiter import RetryPolicy
+
+# HTTP status codes returned by Twitter that are worth retrying
+transient_status_codes = {420, 429, 500, 502, 503, 504}
+
+# names of the network errors raised by requests (which tweepy uses), these are not subclasses of
+# the built in ConnectionError and TimeoutError
+_network_error_names = {'ConnectionError', 'Timeout', 'ConnectTimeout', 'ReadTimeout'}
+
+
+# error code and message Twitter returns (with a 403) for a tweet identical to a recent one, the
+# code is returned by the v1.1 API and the message by the v2 API
+_duplicate_error_code = 187
+_duplicate_error_message = 'duplicate content'
+
+
+def is_transient(error: Exception, idempotent: bool = True) -> bool:
+    """
+    Determine if a failed Twitter request is worth retrying
+
+    :param error: exception raised by the tweepy client
+    :param idempotent: whether the request can safely be repeated, if not network errors are not
+                       retried as the request may have been made before the connection failed
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status in transient_status_codes
+    if not idempotent:
+        return False
+    return isinstance(error, (ConnectionError, TimeoutError)) or \
+        type(error).__name__ in _network_error_names
+
+
+def is_duplicate(error: Exception) -> bool:
+    """
+    Determine if a failed post was rejected because it duplicates a tweet already made
+
+    :param error: exception raised by the tweepy client
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status != 403:
+        return False
+    return _duplicate_error_code in getattr(error, 'api_codes', []) or \
+        any(_duplicate_error_message in message.lower()
+            for message in getattr(error, 'api_messages', []))
+
+
+class Post(NamedTuple):
+    """
+    A tweet to be published
+    """
+    text: str
+    # file names of the images attached to the tweet
+    media: Tuple[str, ...] = ()
+    # reference for the caller, for example the video being announced, passed back to on_posted
+    tag: object = None
+
+
+class TweetPublisher:
+    """
+    Publisher of tweets with attached media
+
+        publisher = TweetPublisher.from_credentials(...)
+        tweet_ids = publisher.publish([Post('first', media=('a.png',)),
+                                       Post('second', media=('b.png',))])
+        print(publisher.summary())
+
+    :param api_factory: function returning a tweepy.API (the v1.1 API is needed for the media
+                        upload), called once in each thread that uploads
+    :param client_factory: function returning a tweepy.Client, called once in each thread that
+                           posts
+    :param max_workers: maximum number of uploads and posts made at the same time
+    :param retry_policy: backoff used when a step fails with a transient error
+    """
+
+    def __init__(self, api_factory: Callable, client_factory: Callable, max_workers: int = 4,
+                 retry_policy: Optional[RetryPolicy] = None):
+        if max_workers < 1:
+            raise ValueError(f'max_workers must be at least 1, got {max_workers}')
+        self.__api_factory = api_factory
+        self.__client_factory = client_factory
+        self.max_workers = max_workers
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self.__thread_local = threading.local()
+        self.__lock = threading.Lock()
+
+        # metrics
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.timings: List[dict] = []
+
+    @classmethod
+    def from_credentials(cls, consumer_key: str, consumer_secret: str, access_token: str,
+                         access_secret: str, **kwargs) -> 'TweetPublisher':
+        """
+        Publisher using the Twitter account of a set of credentials
+
+        :param kwargs: other arguments of the publisher, for example max_workers
+        """
+        import tweepy
+
+        def api_factory():
+            auth = tweepy.OAuthHandler(consumer_key=consumer_key, consumer_secret=consumer_secret)
+            auth.set_access_token(key=access_token, secret=access_secret)
+            return tweepy.API(auth)
+
+        def client_factory():
+            return tweepy.Client(consumer_key=consumer_key, consumer_secret=consumer_secret,
+                                 access_token=access_token, access_token_secret=access_secret)
+
+        return cls(api_factory=api_factory, client_factory=client_factory, **kwargs)
+
+    @property
+    def thread_api(self):
+        # the tweepy clients hold a requests session, so each thread has its own client
+        api = getattr(self.__thread_local, 'api', None)
+        if api is None:
+            api = self.__api_factory()
+            self.__thread_local.api = api
+        return api
+
+    @property
+    def thread_client(self):
+        client = getattr(self.__thread_local, 'client', None)
+        if client is None:
+            client = self.__client_factory()
+            self.__thread_local.client = client
+        return client
+
+    def _step(self, step: str, target: str, function: Callable, idempotent: bool = True):
+        """
+        Run a step, retrying it with a backoff if it fails with a transient error, and record its
+        latency
+
+        :param step: name of the step for the timings, for example upload
+        :param target: what the step acts on for the timings, for example the file name
+        :param function: function making the request
+        :param idempotent: whether the request can safely be repeated, see is_transient
+        :return: result of the function
+        """
+        start_time = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                result = function()
+            except Exception as error:
+                if not is_transient(error, idempotent=idempotent) or \
+                        attempt >= self.retry_policy.max_retries:
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                print(f'{step} of {target} failed ({error}), retrying in {delay:.1f}s')
+                with self.__lock:
+                    self.retries += 1
+                    self.backoff_seconds += delay
+                time.sleep(delay)
+                attempt += 1
+            else:
+                with self.__lock:
+                    self.timings.append({'step': step,
+                                         'target': target,
+                                         'latency': time.perf_counter() - start_time,
+                                         'attempts': attempt + 1})
+                return result
+
+    def _map(self, function: Callable, items: list, parallel: bool = True) -> list:
+        """
+        Apply a function to each item, in a pool of threads if parallel, the results are in the
+        order of the items. If any fails the rest are still completed before the first error is
+        raised
+        """
+        if not parallel or self.max_workers == 1 or len(items) <= 1:
+            return [function(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            futures = [executor.submit(function, item) for item in items]
+        return [future.result() for future in futures]
+
+    def upload_media(self, file_names: Iterable[str]) -> Dict[str, str]:
+        """
+        Upload images concurrently
+
+        :param file_names: image files to upload, each is uploaded once
+        :return: media ID keyed by file name
+        """
+        file_names = list(dict.fromkeys(file_names))
+
+        def upload(file_name: str) -> str:
+            return self._step('upload', file_name,
+                              lambda: self.thread_api.media_upload(file_name)).media_id_string
+
+        return dict(zip(file_names, self._map(upload, file_names)))
+
+    def post(self, text: str, media_ids: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Post a tweet, a post rejected as a duplicate is taken as already made (for example by an
+        earlier run whose response was lost)
+
+        :param text: text of the tweet
+        :param media_ids: optional IDs of the uploaded media to attach
+        :return: ID of the tweet, None if it had already been posted
+        """
+        try:
+            response = self._step('post', text,
+                                  lambda: self.thread_client.create_tweet(text=text,
+                                                                          media_ids=media_ids),
+                                  idempotent=False)
+        except Exception as error:
+            if not is_duplicate(error):
+                raise
+            print(f'post of {text} rejected as a duplicate, it has already been posted')
+            return None
+        return response.data['id']
+
+    def publish(self, posts: List[Post], ordered: bool = False,
+                on_posted: Optional[Callable[[Post, Optional[str]], None]] = None) \
+            -> List[Optional[str]]:
+        """
+        Upload the media of a set of posts and then publish them
+
+        :param posts: tweets to publish
+        :param ordered: if True the tweets are posted one after another in the order given,
+                        otherwise they are posted in parallel
+        :param on_posted: optional function called with each post and its tweet ID as soon as it
+                          is posted, for example to record that it has been announced, so that a
+                          failure part way through does not lose track of the posts made. A post
+                          that had already been made is passed with a tweet ID of None
+        :return: IDs of the tweets in the order of the posts, None for those already posted
+        """
+        start_time = time.perf_counter()
+        media_ids = self.upload_media(file_name for post in posts for file_name in post.media)
+
+        def publish_post(post: Post) -> Optional[str]:
+            tweet_id = self.post(post.text,
+                                 media_ids=[media_ids[file_name] for file_name in post.media]
+                                 if len(post.media) > 0 else None)
+            if on_posted is not None:
+                on_posted(post, tweet_id)
+            return tweet_id
+
+        tweet_ids = self._map(publish_post, posts, parallel=not ordered)
+        self.timings.append({'step': 'publish',
+                             'target': f'{len(posts)} posts',
+                             'latency': time.perf_counter() - start_time,
+                             'attempts': 1})
+        return tweet_ids
+
+    def delete(self, tweet_ids: List[Optional[str]]):
+        """
+        Delete tweets, for example the ones made in test mode
+
+        :param tweet_ids: IDs of the tweets, None (a post that had already been made) is skipped
+        """
+        def delete_tweet(tweet_id: str):
+            self._step('delete', tweet_id, lambda: self.thread_client.delete_tweet(id=tweet_id))
+
+        self._map(delete_tweet, [tweet_id for tweet_id in tweet_ids if tweet_id is not None])
+
+    def summary(self) -> str:
+        """
+        Summary of the time taken by each step
+        """
+        if len(self.timings) == 0:
+            return 'nothing published'
+        lines = []
+        for step in dict.fromkeys(timing['step'] for timing in self.timings):
+            latencies = [timing['latency'] for timing in self.timings if timing['step'] == step]
+            lines.append(f'{step}: {len(latencies)} in {sum(latencies):.2f}s '
+                         f'(mean {sum(latencies) / len(latencies):.2f}s, '
+                         f'max {max(latencies):.2f}s)')
+        if self.retries > 0:
+            lines.append(f'{self.retries} retries, {self.backoff_seconds:.1f}s backing off')
+        return '\n'.join(lines)
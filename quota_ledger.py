@@ -0,0 +1,180 @@
+"""
+This module keeps track of the YouTube Data API quota used by the wrappers. Every request is
+recorded with its endpoint, parts, latency and quota cost. At the end of the run a summary is
+printed and appended to a local ledger file, so the usage can be followed across runs.
+
+Running this module prints the totals accumulated in the ledger:
+
+    python quota_ledger.py
+"""
+import os
+import sys
+import json
+import atexit
+import argparse
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+from zoneinfo import ZoneInfo
+
+# Quota cost of each API method, see https://developers.google.com/youtube/v3/determine_quota_cost
+# methods that are not listed cost one unit (all the list methods except search)
+QUOTA_COSTS = {'youtube.search.list': 100,
+               'youtube.videos.insert': 1600,
+               'youtube.videos.update': 50,
+               'youtube.playlists.insert': 50,
+               'youtube.playlistItems.insert': 50}
+DEFAULT_QUOTA_COST = 1
+
+# the daily quota resets at midnight Pacific Time
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+DEFAULT_LEDGER_FN = 'quota_ledger.jsonl'
+
+
+def quota_cost(endpoint: str) -> int:
+    return QUOTA_COSTS.get(endpoint, DEFAULT_QUOTA_COST)
+
+
+def describe_request(request) -> (str, str):
+    """
+    Extract the endpoint and parts from a googleapiclient request object
+
+    :param request: request object from the googleapiclient service
+    :return: endpoint (for example youtube.search.list) and the parts requested
+    """
+    endpoint = getattr(request, 'methodId', None) or 'unknown'
+    query = parse_qs(urlparse(getattr(request, 'uri', '')).query)
+    parts = ','.join(sorted(part.strip() for entry in query.get('part', [])
+                            for part in entry.split(',')))
+    return endpoint, parts
+
+
+class QuotaTracker:
+    """
+    Records every request made through the wrappers, this is thread safe so it can be shared by
+    the crawler threads
+
+    :param ledger_fn: file the run summary is appended to at exit, None to disable the ledger
+    """
+
+    def __init__(self, ledger_fn: Optional[str] = DEFAULT_LEDGER_FN):
+        self.ledger_fn = ledger_fn
+        self.started = datetime.now(timezone.utc)
+        self.__lock = threading.Lock()
+        self.__entries = {}
+        self.__registered = False
+
+    def record(self, endpoint: str, parts: str, caller: str, latency: float,
+               status: int = 200):
+        """
+        Record a single request (one page of results)
+
+        :param endpoint: API method, for example youtube.search.list
+        :param parts: parts requested
+        :param caller: wrapper method that made the request
+        :param latency: time taken for the request in seconds
+        :param status: HTTP status of the response
+        """
+        key = (endpoint, parts, caller)
+        with self.__lock:
+            if not self.__registered and self.ledger_fn is not None:
+                atexit.register(self.write_summary)
+                self.__registered = True
+
+            entry = self.__entries.setdefault(key, {'endpoint': endpoint,
+                                                    'parts': parts,
+                                                    'caller': caller,
+                                                    'pages': 0,
+                                                    'errors': 0,
+                                                    'quota': 0,
+                                                    'latency_seconds': 0.0})
+            entry['pages'] += 1
+            if status >= 400:
+                entry['errors'] += 1
+            # failed requests still use quota
+            entry['quota'] += quota_cost(endpoint)
+            entry['latency_seconds'] += latency
+
+    @property
+    def total_quota(self) -> int:
+        with self.__lock:
+            return sum(entry['quota'] for entry in self.__entries.values())
+
+    def summary(self) -> dict:
+        """
+        Summary of the requests made in this run
+        """
+        with self.__lock:
+            entries = sorted((dict(entry) for entry in self.__entries.values()),
+                             key=lambda entry: entry['quota'], reverse=True)
+
+        return {'script': os.path.basename(sys.argv[0]) if sys.argv[0] else 'interactive',
+                'started': self.started.isoformat(),
+                'finished': datetime.now(timezone.utc).isoformat(),
+                'quota_day': f'{self.started.astimezone(QUOTA_TIMEZONE):%Y-%m-%d}',
+                'total_quota': sum(entry['quota'] for entry in entries),
+                'total_pages': sum(entry['pages'] for entry in entries),
+                'requests': entries}
+
+    def write_summary(self):
+        """
+        Print the summary of this run and append it to the ledger
+        """
+        summary = self.summary()
+        if summary['total_pages'] == 0:
+            return
+
+        print(f'YouTube API usage: {summary["total_quota"]} quota units '
+              f'in {summary["total_pages"]} requests')
+        for entry in summary['requests']:
+            print(f'  {entry["quota"]:6d} units {entry["pages"]:5d} pages '
+                  f'{entry["latency_seconds"]:7.2f}s  {entry["endpoint"]}'
+                  f'[{entry["parts"]}] from {entry["caller"]}')
+
+        if self.ledger_fn is not None:
+            with open(self.ledger_fn, 'a') as fp:
+                fp.write(json.dumps(summary) + '\n')
+
+
+def read_ledger(ledger_fn: str = DEFAULT_LEDGER_FN) -> list:
+    """
+    Read all the run summaries from a ledger
+    """
+    if not os.path.isfile(ledger_fn):
+        return []
+    with open(ledger_fn) as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+def ledger_totals(ledger_fn: str = DEFAULT_LEDGER_FN) -> dict:
+    """
+    Accumulate the quota usage in a ledger by quota day, script and endpoint
+
+    :return: dictionary keyed by quota day of dictionaries keyed by (script, endpoint, caller)
+    """
+    totals = {}
+    for run in read_ledger(ledger_fn):
+        day = totals.setdefault(run['quota_day'], {})
+        for entry in run['requests']:
+            key = (run['script'], entry['endpoint'], entry['caller'])
+            day[key] = day.get(key, 0) + entry['quota']
+
+    return totals
+
+
+default_tracker = QuotaTracker()
+
+parse = argparse.ArgumentParser(description='Summarise the YouTube API quota ledger')
+parse.add_argument('-ledger', type=str, default=DEFAULT_LEDGER_FN)
+
+if __name__ == "__main__":
+
+    command_args = parse.parse_args()
+
+    for quota_day, day_totals in sorted(ledger_totals(command_args.ledger).items()):
+        print(f'{quota_day}: {sum(day_totals.values())} quota units')
+        for (script, endpoint, caller), quota in sorted(day_totals.items(),
+                                                        key=lambda item: item[1], reverse=True):
+            print(f'  {quota:6d} units  {script} {endpoint} from {caller}')
@@ -0,0 +1,107 @@
+"""
+This module provides the rate limiting used by the Google API wrappers so that a number of
+threads can make requests without exceeding an overall request rate, together with the retry
+policy used when the API reports that it is overloaded
+"""
+import random
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread safe token bucket, each request takes a token and tokens are replenished at a fixed
+    rate up to a maximum burst size
+
+    The rate adapts to the API: each time the API reports a rate limit the rate is halved (down
+    to min_rate) and every successful request recovers part of the rate back towards the
+    configured maximum
+
+    :param rate: average number of requests per second allowed
+    :param burst: maximum number of requests that can be made back to back
+    :param min_rate: lowest rate the limiter will back off to
+    """
+
+    def __init__(self, rate: float, burst: int = 1, min_rate: float = 0.1):
+        if rate <= 0:
+            raise ValueError(f'rate must be positive, got {rate}')
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.__tokens = float(self.burst)
+        self.__last_refill = time.monotonic()
+        self.__lock = threading.Lock()
+
+        # metrics
+        self.requests = 0
+        self.throttled_seconds = 0.0
+        self.rate_limited_responses = 0
+
+    def __refill(self):
+        now = time.monotonic()
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__last_refill) * self.rate)
+        self.__last_refill = now
+
+    def acquire(self):
+        """
+        Take a token from the bucket, blocking until one is available
+        """
+        while True:
+            with self.__lock:
+                self.__refill()
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    self.requests += 1
+                    return
+                wait_time = (1 - self.__tokens) / self.rate
+                self.throttled_seconds += wait_time
+
+            time.sleep(wait_time)
+
+    def report_success(self):
+        """
+        Recover the rate after a successful request (additive increase)
+        """
+        with self.__lock:
+            self.rate = min(self.max_rate, self.rate + 0.05 * self.max_rate)
+
+    def report_rate_limited(self):
+        """
+        Reduce the rate after the API has reported a rate limit (multiplicative decrease)
+        """
+        with self.__lock:
+            self.rate_limited_responses += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    @property
+    def metrics(self) -> dict:
+        return {'requests': self.requests,
+                'throttled_seconds': self.throttled_seconds,
+                'rate_limited_responses': self.rate_limited_responses,
+                'current_rate': self.rate}
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff used when a request fails with a transient error
+
+    :param max_retries: number of retries before the error is raised
+    :param base_delay: delay before the first retry in seconds
+    :param max_delay: upper limit on the delay between retries in seconds
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 64.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """
+        Time to wait before a retry, using the "full jitter" approach so that a number of
+        threads that failed together do not all retry together
+
+        :param attempt: retry number, starting from 0
+        :return: delay in seconds
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
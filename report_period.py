@@ -0,0 +1,94 @@
+"""
+This module provides the reporting period used by the weekly reports, rather than each script
+working out the dates from the day it is run. A report covers the week ending at midnight on a
+Monday, so any week (for example when regenerating old reports) can be reported on
+"""
+import datetime
+from typing import Iterator, Optional
+
+
+def midnight_monday(date: datetime.date) -> datetime.datetime:
+    """
+    Midnight (UTC) at the start of the Monday on or before a date
+    """
+    return datetime.datetime.combine(time=datetime.time(),
+                                     date=date - datetime.timedelta(days=date.weekday()),
+                                     tzinfo=datetime.timezone.utc)
+
+
+class ReportPeriod:
+    """
+    Period covered by a weekly report
+
+    :param week_end: midnight (UTC) on the Monday the reported week ends on
+    :param history_weeks: number of weeks shown in the report, ending with the reported week
+    """
+
+    def __init__(self, week_end: datetime.datetime, history_weeks: int = 12):
+        if week_end.weekday() != 0 or week_end.time() != datetime.time() or \
+                week_end.utcoffset() != datetime.timedelta(0):
+            raise ValueError(f'a report period must end at midnight UTC on a Monday, '
+                             f'got {week_end}')
+        if history_weeks < 1:
+            raise ValueError(f'history_weeks must be at least 1, got {history_weeks}')
+        self.week_end = week_end
+        self.history_weeks = history_weeks
+
+    @classmethod
+    def for_date(cls, date: Optional[datetime.date] = None, **kwargs) -> 'ReportPeriod':
+        """
+        Report period for the last complete week on or before a date
+
+        :param date: date of the report, if None today is used
+        """
+        if date is None:
+            date = datetime.date.today()
+        return cls(week_end=midnight_monday(date), **kwargs)
+
+    @classmethod
+    def weeks(cls, first_date: datetime.date, last_date: datetime.date,
+              **kwargs) -> Iterator['ReportPeriod']:
+        """
+        Report periods for every week between two dates (inclusive), oldest first
+
+        :param first_date: date of the first report
+        :param last_date: date of the last report
+        """
+        week_end = midnight_monday(first_date)
+        last_week_end = midnight_monday(last_date)
+        while week_end <= last_week_end:
+            yield cls(week_end=week_end, **kwargs)
+            week_end += datetime.timedelta(weeks=1)
+
+    @property
+    def previous_week_end(self) -> datetime.datetime:
+        """
+        Midnight on the Monday the week before the reported week ends on, used for the deltas
+        """
+        return self.week_end - datetime.timedelta(weeks=1)
+
+    @property
+    def plot_start(self) -> datetime.datetime:
+        """
+        Midnight on the Monday the first week shown in the report ends on
+        """
+        return self.week_end - datetime.timedelta(weeks=self.history_weeks)
+
+    @property
+    def earliest_date(self) -> datetime.datetime:
+        """
+        Earliest publish date of the videos needed for the report
+        """
+        return self.plot_start - datetime.timedelta(weeks=1)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(week_end={self.week_end!r}, ' \
+               f'history_weeks={self.history_weeks})'
+
+    def __eq__(self, other):
+        if not isinstance(other, ReportPeriod):
+            return NotImplemented
+        return self.week_end == other.week_end and self.history_weeks == other.history_weeks
+
+    def __hash__(self):
+        return hash((self.week_end, self.history_weeks))
@@ -0,0 +1,71 @@
+"""
+Tests of BrainBlazeAnalyser, the data set is run against the fake YouTube API
+"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import BrainBlazeAnalyser
+from BrainBlazeAnalyser import BrainBlazeDataSet, ISO8601_timestamps_to_datetime
+from benchmarks.fake_youtube import FakeYouTubeService, FakeYouTubeWrapper
+
+
+def test_timestamps_with_mixed_precision():
+    timestamps = ISO8601_timestamps_to_datetime(['2024-01-01T10:00:00Z',
+                                                 '2024-01-02T11:30:15.250Z',
+                                                 '2024-01-03T12:00:00.5Z',
+                                                 None])
+
+    assert list(timestamps[:3]) == [pd.Timestamp('2024-01-01T10:00:00', tz='UTC'),
+                                    pd.Timestamp('2024-01-02T11:30:15.250', tz='UTC'),
+                                    pd.Timestamp('2024-01-03T12:00:00.500', tz='UTC')]
+    assert pd.isna(timestamps[3])
+
+
+@pytest.fixture
+def data_set_class(tmp_path, monkeypatch):
+    fake_service = FakeYouTubeService.with_channels(channel_count=1, videos_per_channel=300)
+    channel = next(iter(fake_service.channel_map.values()))
+    monkeypatch.setattr(BrainBlazeAnalyser, 'YouTubeWrapper',
+                        lambda: FakeYouTubeWrapper(fake_service))
+
+    registry_fn = os.path.join(tmp_path, 'channel_registry.json')
+    with open(registry_fn, 'w') as fp:
+        json.dump({'channels': [{'key': 'brain_blaze', 'channel_id': channel.channel_id,
+                                 'name': channel.title, 'groups': ['brain_blaze']}]}, fp)
+
+    class FakeBrainBlazeDataSet(BrainBlazeDataSet):
+        _video_store_fn = os.path.join(tmp_path, 'store.sqlite')
+        _view_history_dir = os.path.join(tmp_path, 'view_history')
+        _channel_registry_fn = registry_fn
+
+    return FakeBrainBlazeDataSet
+
+
+def test_data_set_streams_the_details_from_the_store(data_set_class):
+    data_set = data_set_class(api_key='fake')
+
+    # only the IDs are held, the records are read from the store when the DataFrame is built
+    assert len(data_set.brain_blaze_video_ids) == 300
+    assert all(isinstance(video_id, str) for video_id in data_set.brain_blaze_video_ids)
+    DataFrame = data_set.DataFrame
+    assert list(DataFrame.index) == list(data_set.brain_blaze_video_ids)
+    assert list(DataFrame.index) == \
+        [detail['video_id'] for detail in data_set.brain_blaze_videos_detail]
+
+
+def test_added_videos_extend_the_DataFrame(data_set_class):
+    data_set = data_set_class(api_key='fake')
+    video_ids = data_set.brain_blaze_video_ids
+
+    data_set.brain_blaze_video_ids = video_ids[:200]
+    assert len(data_set.DataFrame) == 200
+    data_set.add_videos(video_ids[150:])
+    extended = data_set.DataFrame
+
+    data_set.brain_blaze_video_ids = video_ids
+    rebuilt = data_set.DataFrame
+    assert list(extended.index) == list(video_ids)
+    assert extended.equals(rebuilt)
@@ -0,0 +1,34 @@
+"""
+Tests of the channel registry
+"""
+import json
+import os
+
+from channel_registry import ChannelRegistry, RegisteredChannelID, RegisteredChannelIDs, \
+    DEFAULT_REGISTRY_FN
+
+
+def test_default_registry_does_not_depend_on_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert ChannelRegistry().channel_id('brain_blaze') == 'UCYY5GWf7MHFJ6DZeHreoXgw'
+    assert os.path.isabs(DEFAULT_REGISTRY_FN)
+
+
+def test_class_level_access_reads_the_registry_once(tmp_path):
+    registry_fn = os.path.join(tmp_path, 'channel_registry.json')
+    with open(registry_fn, 'w') as fp:
+        json.dump({'channels': [{'key': 'brain_blaze', 'channel_id': 'UCbb', 'name': 'Brain Blaze',
+                                 'groups': ['whistler']},
+                                {'key': 'other', 'channel_id': 'UCother', 'name': 'Other',
+                                 'groups': ['whistler']}]}, fp)
+
+    class Owner:
+        _channel_registry_fn = registry_fn
+        brain_blaze_channel_ID = RegisteredChannelID('brain_blaze')
+        whistler_channels = RegisteredChannelIDs('whistler')
+
+    assert Owner.brain_blaze_channel_ID == 'UCbb'
+    # later changes to the file are not read again
+    os.remove(registry_fn)
+    assert Owner.whistler_channels == ['UCbb', 'UCother']
+    assert Owner.brain_blaze_channel_ID == 'UCbb'
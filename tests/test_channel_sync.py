@@ -0,0 +1,105 @@
+"""
+Tests of the synchronisation of the video store against the fake YouTube API
+"""
+import os
+import random
+import threading
+
+from benchmarks.bench_analysis import synthetic_detail
+from benchmarks.fake_youtube import FakeYouTubeService, FakeYouTubeWrapper
+from channel_sync import sync_video_details, store_batch_size
+from video_store import VideoStore
+
+
+class CachingFakeYouTubeWrapper(FakeYouTubeWrapper):
+    """
+    Fake wrapper that caches every response, so the worker threads fetching the metadata write
+    to the store while the main thread stores the earlier batches
+    """
+
+    @classmethod
+    def _is_conditional(cls, request, endpoint: str, parts: str) -> bool:
+        return True
+
+
+def sync_concurrently(tmp_path, wrapper_class) -> (VideoStore, list, list):
+    fake_service = FakeYouTubeService.with_channels(channel_count=1,
+                                                    videos_per_channel=3 * store_batch_size,
+                                                    latency=0.001)
+    channel = next(iter(fake_service.channel_map.values()))
+    video_ids = [channel.video_id(video_index) for video_index in range(channel.video_count)]
+
+    video_store = VideoStore(os.path.join(tmp_path, 'store.sqlite'))
+    wrapper = wrapper_class(fake_service)
+    wrapper.response_cache = video_store
+    details = sync_video_details(wrapper, video_store, video_ids)
+    return video_store, video_ids, details
+
+
+def test_sync_with_the_response_cache_from_worker_threads(tmp_path):
+    video_store, video_ids, details = sync_concurrently(tmp_path, CachingFakeYouTubeWrapper)
+    with video_store:
+        assert [detail['video_id'] for detail in details] == video_ids
+        connection = video_store.connection
+        assert connection.execute(
+            'SELECT COUNT(*) FROM videos WHERE detail IS NOT NULL').fetchone()[0] == len(video_ids)
+        assert connection.execute('SELECT COUNT(*) FROM video_weeks').fetchone()[0] == len(video_ids)
+        # one cached response for each request of 50 videos
+        assert connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0] == \
+            len(video_ids) // 50
+
+
+def test_sync_with_the_response_cache(tmp_path):
+    video_store, video_ids, details = sync_concurrently(tmp_path, FakeYouTubeWrapper)
+    with video_store:
+        assert len(details) == len(video_ids)
+        assert video_store.connection.execute(
+            'SELECT COUNT(*) FROM video_weeks').fetchone()[0] == len(video_ids)
+
+
+def test_store_written_from_many_threads(tmp_path):
+    # the responses are cached from the worker threads while the main thread stores metadata,
+    # without the store's lock the writes end up inside each other's transactions
+    rng = random.Random(0)
+    details = [synthetic_detail(index, rng) for index in range(store_batch_size)]
+    errors = []
+    stop = threading.Event()
+
+    with VideoStore(os.path.join(tmp_path, 'store.sqlite')) as video_store:
+        def cache_responses(thread_index):
+            index = 0
+            while not stop.is_set():
+                try:
+                    video_store.store_response(f'GET /{thread_index}/{index}', 'etag',
+                                               {'items': list(range(100))})
+                except Exception as error:
+                    errors.append(error)
+                index += 1
+
+        threads = [threading.Thread(target=cache_responses, args=(thread_index,))
+                   for thread_index in range(4)]
+        for thread in threads:
+            thread.start()
+        try:
+            for _ in range(20):
+                video_store.upsert_details(details)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        assert errors == []
+        assert video_store.connection.execute(
+            'SELECT COUNT(*) FROM video_weeks').fetchone()[0] == len(details)
+
+
+def test_metadata_records_mark_the_streams(tmp_path):
+    video_store, video_ids, details = sync_concurrently(tmp_path, FakeYouTubeWrapper)
+    with video_store:
+        # every record has the key, it is None for the videos that were never live
+        assert all('liveStreamingDetails' in detail for detail in details)
+        streams = {detail['video_id'] for detail in details
+                   if detail['liveStreamingDetails'] is not None}
+        assert 0 < len(streams) < len(details)
+        assert {video_id for video_id, in video_store.connection.execute(
+            'SELECT video_id FROM video_weeks WHERE stream = 1')} == streams
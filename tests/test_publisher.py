@@ -0,0 +1,40 @@
+"""
+Tests of the publisher against the fake Twitter
+"""
+import pytest
+
+from benchmarks.fake_twitter import FakeHTTPException, FakeTwitter, ReadTimeout, fake_publisher
+from publisher import Post, is_duplicate, is_transient
+
+
+def test_post_is_not_retried_after_a_lost_response():
+    fake_twitter = FakeTwitter(post_timeout_rate=1.0)
+    publisher = fake_publisher(fake_twitter)
+
+    with pytest.raises(ReadTimeout):
+        publisher.post('New Brain Blaze Video: video 0')
+    assert len(fake_twitter.tweets) == 1
+    assert publisher.retries == 0
+
+
+def test_rerun_after_a_lost_response_marks_the_post_made():
+    fake_twitter = FakeTwitter()
+    posts = [Post(f'New Brain Blaze Video: video {index}', tag=index) for index in range(3)]
+    # the first run made the first post but lost its response
+    fake_twitter.create_tweet(posts[0].text)
+
+    posted = []
+    tweet_ids = fake_publisher(fake_twitter).publish(
+        posts, ordered=True, on_posted=lambda post, tweet_id: posted.append(post.tag))
+
+    assert posted == [0, 1, 2]
+    assert tweet_ids[0] is None and None not in tweet_ids[1:]
+    assert [tweet['text'] for tweet in fake_twitter.tweets] == [post.text for post in posts]
+
+
+def test_error_classification():
+    assert is_transient(ReadTimeout())
+    assert not is_transient(ReadTimeout(), idempotent=False)
+    assert is_transient(FakeHTTPException(503), idempotent=False)
+    assert is_duplicate(FakeHTTPException(403, api_codes=[187]))
+    assert not is_duplicate(FakeHTTPException(403, api_codes=[326]))
@@ -0,0 +1,508 @@
+"""
+This module provides the persistent store for the video data retrieved from the YouTube API. It
+replaces the JSON cache files that each of the analysis classes used to keep, so all the scripts
+share the same data and only fetch the videos that they do not already have.
+
+The store is a SQLite database with the following tables:
+- videos: one row per video keyed by video_id, holding the channel, the publish date, the
+  metadata record (as returned by YouTubeWrapper.get_metadata) and when each was fetched
+- channels: the channel records (as returned by YouTubeWrapper.channel)
+- sync_state: the per-channel high water marks used by the incremental channel sync
+- upload_polls and seen_uploads: the watermark and the videos already handled for each channel
+  polled for new uploads (see channel_sync.poll_new_uploads)
+- responses: raw API responses with their ETag, so the wrapper can make conditional requests,
+  these are discarded once they have not been used for response_max_age
+- video_weeks and weekly_totals: the weekly totals for each channel, kept up to date as the
+  metadata is updated (see weekly_cube)
+
+The database runs in write-ahead log mode, updates are appended to the log (so the cost of an
+update depends on the number of videos changed rather than the size of the store) and an
+interrupted run can not leave a partly written store. The log is folded back into the database
+periodically by SQLite and when the store is closed.
+"""
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dateutil.parser import isoparse
+
+from weekly_cube import WeeklyCube
+
+DEFAULT_STORE_FN = 'brain_blaze_video_store.sqlite'
+
+# cached API responses older than this are discarded when the store is closed, a response that
+# has not been requested again in this time is unlikely to be
+response_max_age = 30 * 24 * 60 * 60
+
+# number of pages in the write-ahead log before SQLite folds it back into the database
+_wal_checkpoint_pages = 1000
+
+_schema = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    channel_id TEXT,
+    published_at TEXT,
+    listed_at REAL,
+    detail TEXT,
+    detail_fetched_at REAL,
+    statistics_fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS videos_channel_published ON videos (channel_id, published_at);
+CREATE INDEX IF NOT EXISTS videos_published ON videos (published_at);
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS responses (
+    request_key TEXT PRIMARY KEY,
+    etag TEXT NOT NULL,
+    body TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_fetched ON responses (fetched_at);
+CREATE TABLE IF NOT EXISTS sync_state (
+    channel_id TEXT PRIMARY KEY,
+    high_water_mark TEXT,
+    covered_from TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS upload_polls (
+    channel_id TEXT PRIMARY KEY,
+    playlist_id TEXT,
+    watermark TEXT,
+    polled_at REAL
+);
+CREATE TABLE IF NOT EXISTS seen_uploads (
+    channel_id TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    published_at TEXT,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (channel_id, video_id)
+);
+"""
+
+# seen uploads published this long before the watermark are discarded, the poll stops at the
+# newest seen upload so only the recent ones are needed
+_seen_upload_retention = timedelta(days=90)
+
+
+def normalise_timestamp(value) -> Optional[str]:
+    """
+    Convert a timestamp (either a datetime or an ISO8601 string) to the UTC format used by the
+    YouTube API, so that timestamps in the store can be compared as strings
+
+    :param value: timestamp to convert, None is passed straight through
+    :return: timestamp in the form YYYY-MM-DDTHH:MM:SSZ
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = isoparse(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return f'{value.astimezone(timezone.utc):%Y-%m-%dT%H:%M:%SZ}'
+
+
+class VideoStore:
+    """
+    SQLite backed store of the YouTube video data
+
+    The response cache is used from the wrapper's worker threads while the main thread updates
+    the rest of the store, for example channel_sync stores a batch of metadata while the next
+    batch is being fetched, so every method holds the store's lock while it uses the connection
+
+    :param store_fn: filename of the SQLite database, created if it does not exist
+    """
+
+    def __init__(self, store_fn: str = DEFAULT_STORE_FN):
+        self.store_fn = store_fn
+        # the response cache is used by the wrapper from its worker threads, so the connection
+        # is shared between threads with the access serialised by a lock. A transaction is open
+        # on the connection (not on a thread), so a write from one thread in the middle of
+        # another's transaction would fail, all the methods must take the lock
+        self.connection = sqlite3.connect(store_fn, check_same_thread=False)
+        self.__lock = threading.RLock()
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # in WAL mode a commit is durable once it is in the log, it does not need to wait for
+        # the database file to be synchronised
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(f'PRAGMA wal_autocheckpoint={_wal_checkpoint_pages:d}')
+        self.connection.executescript(_schema)
+        self.weekly_cube = WeeklyCube(self.connection)
+        self.__upgrade_schema()
+
+    def __upgrade_schema(self):
+        # stores created before the statistics were refreshed separately do not have the column
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(videos)')}
+        if 'statistics_fetched_at' not in columns:
+            with self.connection:
+                self.connection.execute('ALTER TABLE videos ADD COLUMN statistics_fetched_at REAL')
+                self.connection.execute('UPDATE videos SET statistics_fetched_at=detail_fetched_at')
+        # stores created before the weekly totals were kept have them built from the metadata
+        if len(self.weekly_cube) == 0 and self.connection.execute(
+                'SELECT 1 FROM videos WHERE detail IS NOT NULL LIMIT 1').fetchone() is not None:
+            with self.connection:
+                self.weekly_cube.rebuild(
+                    json.loads(detail) for detail, in
+                    self.connection.execute('SELECT detail FROM videos WHERE detail IS NOT NULL'))
+
+    def checkpoint(self):
+        """
+        Fold the write-ahead log back into the database and truncate the log
+        """
+        with self.__lock:
+            self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def snapshot(self, snapshot_fn: str):
+        """
+        Write a consistent copy of the store to a single file, for example to archive it. The
+        copy is written to a temporary file which is renamed once complete, so the snapshot file
+        is never partly written
+
+        :param snapshot_fn: filename of the snapshot
+        """
+        directory = os.path.dirname(os.path.abspath(snapshot_fn))
+        file_descriptor, temporary_fn = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(file_descriptor)
+        try:
+            snapshot_connection = sqlite3.connect(temporary_fn)
+            with self.__lock, snapshot_connection:
+                self.connection.backup(snapshot_connection)
+            snapshot_connection.close()
+            os.replace(temporary_fn, snapshot_fn)
+        except BaseException:
+            os.remove(temporary_fn)
+            raise
+
+    def close(self):
+        self.prune_responses()
+        self.checkpoint()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ------------------------------------------------------------------------------------------
+    # videos found on the channels
+    # ------------------------------------------------------------------------------------------
+    def upsert_videos(self, videos: Iterable[dict]):
+        """
+        Add (or update) the videos found by a channel search
+
+        :param videos: videos as returned by YouTubeWrapper.channel_videos, each must have a
+                       video_id, publishedAt and channel_id
+        """
+        listed_at = time.time()
+        with self.__lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO videos (video_id, channel_id, published_at, listed_at) '
+                'VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (video_id) DO UPDATE SET channel_id=excluded.channel_id, '
+                'published_at=excluded.published_at, listed_at=excluded.listed_at',
+                [(video['video_id'], video['channel_id'],
+                  normalise_timestamp(video['publishedAt']), listed_at)
+                 for video in videos])
+
+    def channel_videos(self, channel_id_list: List[str],
+                       published_after: Optional[datetime] = None,
+                       published_before: Optional[datetime] = None) -> List[dict]:
+        """
+        Videos published on a list of channels, the videos are returned in the order of the
+        channel list and newest first within each channel
+
+        :param channel_id_list: YouTube channel IDs
+        :param published_after: optional earliest publish date to return
+        :param published_before: optional latest publish date to return
+
+        :return: list of videos, each a dictionary with the video_id, publishedAt and channel_id
+        """
+        query = 'SELECT video_id, published_at, channel_id FROM videos WHERE channel_id = ?'
+        date_arguments = []
+        if published_after is not None:
+            query += ' AND published_at >= ?'
+            date_arguments.append(normalise_timestamp(published_after))
+        if published_before is not None:
+            query += ' AND published_at <= ?'
+            date_arguments.append(normalise_timestamp(published_before))
+        query += ' ORDER BY published_at DESC'
+
+        videos = []
+        with self.__lock:
+            for channel_id in channel_id_list:
+                for video_id, published_at, video_channel_id in \
+                        self.connection.execute(query, [channel_id] + date_arguments):
+                    videos.append({'video_id': video_id,
+                                   'publishedAt': published_at,
+                                   'channel_id': video_channel_id})
+
+        return videos
+
+    # ------------------------------------------------------------------------------------------
+    # video metadata
+    # ------------------------------------------------------------------------------------------
+    def upsert_details(self, details: Iterable[dict]):
+        """
+        Add (or update) the metadata of videos
+
+        :param details: video metadata records as returned by YouTubeWrapper.get_metadata_bulk
+        """
+        details = list(details)
+        fetched_at = time.time()
+        with self.__lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO videos (video_id, channel_id, published_at, detail, detail_fetched_at, '
+                'statistics_fetched_at) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (video_id) DO UPDATE SET '
+                'channel_id=COALESCE(videos.channel_id, excluded.channel_id), '
+                'published_at=COALESCE(videos.published_at, excluded.published_at), '
+                'detail=excluded.detail, detail_fetched_at=excluded.detail_fetched_at, '
+                'statistics_fetched_at=excluded.statistics_fetched_at',
+                [(detail['video_id'], detail.get('channel_id'),
+                  normalise_timestamp(detail.get('publishedAt')), json.dumps(detail), fetched_at,
+                  fetched_at)
+                 for detail in details])
+            self.weekly_cube.update_details(details)
+
+    def update_statistics(self, statistics: Dict[str, dict]):
+        """
+        Replace the statistics in the metadata of videos already in the store, leaving the rest
+        of the metadata as it is
+
+        :param statistics: statistics keyed by video ID, as returned by
+                           YouTubeWrapper.get_statistics_bulk
+        """
+        fetched_at = time.time()
+        with self.__lock, self.connection:
+            self.connection.executemany(
+                "UPDATE videos SET detail=json_set(detail, '$.statistics', json(?)), "
+                "statistics_fetched_at=? WHERE video_id=? AND detail IS NOT NULL",
+                [(json.dumps(video_statistics), fetched_at, video_id)
+                 for video_id, video_statistics in statistics.items()])
+            self.weekly_cube.update_views({video_id: video_statistics.get('viewCount')
+                                           for video_id, video_statistics in statistics.items()})
+
+    def details(self, video_ids: Iterable[str]) -> List[dict]:
+        """
+        Metadata of a set of videos, videos without metadata in the store are omitted
+
+        :param video_ids: YouTube video IDs
+        :return: list of video metadata records in the order the IDs were supplied
+        """
+        return list(self.iter_details(video_ids))
+
+    def iter_details(self, video_ids: Iterable[str]) -> Iterator[dict]:
+        """
+        Generator version of details, the records are read from the database a chunk at a time
+        so only one chunk of the records is held at once
+
+        :param video_ids: YouTube video IDs
+        :return: generator of video metadata records in the order the IDs were supplied
+        """
+        for chunk in self.__chunks(list(video_ids)):
+            # the lock is not held while the records are yielded, the caller may write to the
+            # store between the chunks
+            with self.__lock:
+                records = dict(self.connection.execute(
+                    f'SELECT video_id, detail FROM videos WHERE detail IS NOT NULL AND '
+                    f'video_id IN ({",".join("?" * len(chunk))})', chunk))
+            for video_id in chunk:
+                if video_id in records:
+                    yield json.loads(records[video_id])
+
+    def detail_fetched_at(self, video_ids: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """
+        Time (seconds since the epoch) the metadata and the statistics of each video were last
+        fetched, videos without metadata in the store are omitted
+
+        :return: dictionary keyed by video ID of tuples of the metadata and statistics times
+        """
+        fetched_at = {}
+        with self.__lock:
+            for chunk in self.__chunks(list(video_ids)):
+                for video_id, detail_fetched_at, statistics_fetched_at in self.connection.execute(
+                        f'SELECT video_id, detail_fetched_at, statistics_fetched_at FROM videos '
+                        f'WHERE detail IS NOT NULL AND video_id IN ({",".join("?" * len(chunk))})',
+                        chunk):
+                    fetched_at[video_id] = (detail_fetched_at, statistics_fetched_at)
+
+        return fetched_at
+
+    @staticmethod
+    def __chunks(values: list, size: int = 500):
+        # SQLite limits the number of parameters in a single query
+        for start_point in range(0, len(values), size):
+            yield values[start_point:start_point + size]
+
+    # ------------------------------------------------------------------------------------------
+    # channels
+    # ------------------------------------------------------------------------------------------
+    def upsert_channels(self, channels: Iterable[dict]):
+        """
+        Add (or update) channel records
+
+        :param channels: channel records as returned by YouTubeWrapper.channel
+        """
+        fetched_at = time.time()
+        with self.__lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO channels (channel_id, record, fetched_at) VALUES (?, ?, ?)',
+                [(channel['id'], json.dumps(channel), fetched_at) for channel in channels])
+
+    def channels(self, channel_id_list: List[str], max_age: Optional[float] = None) -> List[dict]:
+        """
+        Channel records in the order of the channel list
+
+        :param channel_id_list: YouTube channel IDs
+        :param max_age: if supplied, records fetched more than this many seconds ago are omitted
+        """
+        oldest = 0.0 if max_age is None else time.time() - max_age
+        records = {}
+        with self.__lock:
+            rows = self.connection.execute(
+                f'SELECT channel_id, record FROM channels WHERE fetched_at >= ? AND '
+                f'channel_id IN ({",".join("?" * len(channel_id_list))})',
+                [oldest] + list(channel_id_list)).fetchall()
+        for channel_id, record in rows:
+            records[channel_id] = json.loads(record)
+
+        return [records[channel_id] for channel_id in channel_id_list if channel_id in records]
+
+    # ------------------------------------------------------------------------------------------
+    # channel sync state
+    # ------------------------------------------------------------------------------------------
+    def sync_state(self, channel_id: str) -> (Optional[datetime], Optional[datetime], Optional[float]):
+        """
+        Synchronisation state of a channel
+
+        :param channel_id: YouTube channel ID
+        :return: tuple of the high water mark (newest publish date seen), the date the store is
+                 complete from and the time of the last sync (seconds since the epoch), each is
+                 None if the channel has never been synchronised
+        """
+        with self.__lock:
+            row = self.connection.execute(
+                'SELECT high_water_mark, covered_from, synced_at FROM sync_state '
+                'WHERE channel_id = ?', (channel_id,)).fetchone()
+        if row is None:
+            return None, None, None
+
+        high_water_mark, covered_from, synced_at = row
+        return (None if high_water_mark is None else isoparse(high_water_mark),
+                None if covered_from is None else isoparse(covered_from),
+                synced_at)
+
+    def update_sync_state(self, channel_id: str, high_water_mark: Optional[datetime],
+                          covered_from: datetime):
+        with self.__lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO sync_state (channel_id, high_water_mark, covered_from, '
+                'synced_at) VALUES (?, ?, ?, ?)',
+                (channel_id, normalise_timestamp(high_water_mark),
+                 normalise_timestamp(covered_from), time.time()))
+
+    # ------------------------------------------------------------------------------------------
+    # upload polling state
+    # ------------------------------------------------------------------------------------------
+    def upload_poll_state(self, channel_id: str) -> (Optional[str], Optional[datetime], set):
+        """
+        State of the polling of a channel for new uploads
+
+        :param channel_id: YouTube channel ID
+        :return: tuple of the ID of the uploads playlist, the watermark (newest publish date of
+                 the uploads seen) and the set of the IDs of the uploads seen, the playlist and
+                 watermark are None if the channel has never been polled
+        """
+        with self.__lock:
+            row = self.connection.execute(
+                'SELECT playlist_id, watermark FROM upload_polls WHERE channel_id = ?',
+                (channel_id,)).fetchone()
+            seen_video_ids = {video_id for video_id, in self.connection.execute(
+                'SELECT video_id FROM seen_uploads WHERE channel_id = ?', (channel_id,))}
+        playlist_id, watermark = (None, None) if row is None else row
+
+        return playlist_id, None if watermark is None else isoparse(watermark), seen_video_ids
+
+    def mark_uploads_seen(self, channel_id: str, playlist_id: str, uploads: Iterable[dict]):
+        """
+        Record uploads of a channel as handled, so they are not returned by a later poll, and
+        move the watermark up to the newest of them
+
+        :param channel_id: YouTube channel ID
+        :param playlist_id: ID of the uploads playlist of the channel
+        :param uploads: uploads as returned by channel_sync.poll_new_uploads
+        """
+        seen_at = time.time()
+        rows = [(channel_id, upload['video_id'], normalise_timestamp(upload['publishedAt']),
+                 seen_at) for upload in uploads]
+        with self.__lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO seen_uploads (channel_id, video_id, published_at, '
+                'seen_at) VALUES (?, ?, ?, ?)', rows)
+            # the newest seen upload is never discarded so it always holds the watermark
+            watermark, = self.connection.execute(
+                'SELECT MAX(published_at) FROM seen_uploads WHERE channel_id = ?',
+                (channel_id,)).fetchone()
+            self.connection.execute(
+                'INSERT INTO upload_polls (channel_id, playlist_id, watermark, polled_at) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (channel_id) DO UPDATE SET '
+                'playlist_id=excluded.playlist_id, watermark=excluded.watermark, '
+                'polled_at=excluded.polled_at',
+                (channel_id, playlist_id, watermark, seen_at))
+            if watermark is not None:
+                self.connection.execute(
+                    'DELETE FROM seen_uploads WHERE channel_id = ? AND published_at < ?',
+                    (channel_id,
+                     normalise_timestamp(isoparse(watermark) - _seen_upload_retention)))
+
+    # ------------------------------------------------------------------------------------------
+    # API responses
+    # ------------------------------------------------------------------------------------------
+    def cached_response(self, request_key: str) -> Optional[Tuple[str, dict]]:
+        """
+        Previous response to an API request
+
+        :param request_key: key identifying the request (see GoogleAPIBase._request_key)
+        :return: tuple of the ETag and the response body, None if the request is not cached
+        """
+        with self.__lock:
+            row = self.connection.execute(
+                'SELECT etag, body FROM responses WHERE request_key = ?',
+                (request_key,)).fetchone()
+        if row is None:
+            return None
+        etag, body = row
+        return etag, json.loads(body)
+
+    def store_response(self, request_key: str, etag: str, body: dict):
+        """
+        Cache an API response along with its ETag
+
+        :param request_key: key identifying the request (see GoogleAPIBase._request_key)
+        :param etag: ETag of the response
+        :param body: response body
+        """
+        with self.__lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses (request_key, etag, body, fetched_at) '
+                'VALUES (?, ?, ?, ?)', (request_key, etag, json.dumps(body), time.time()))
+
+    def prune_responses(self, max_age: float = response_max_age) -> int:
+        """
+        Discard the cached responses that were fetched (or last confirmed unchanged) more than
+        max_age ago
+
+        :param max_age: age in seconds
+        :return: number of responses discarded
+        """
+        with self.__lock, self.connection:
+            return self.connection.execute('DELETE FROM responses WHERE fetched_at < ?',
+                                           (time.time() - max_age,)).rowcount
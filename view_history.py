@@ -0,0 +1,300 @@
+"""
+This module provides the daily history of the video statistics. The video store only keeps the
+latest statistics of each video, whereas this keeps a snapshot of the views, likes and comments
+of every tracked video for each day, so the growth of the views after a video is published can
+be analysed, for example the views each video had after its first week.
+
+The history is kept in a directory of memory mapped matrices of video × day, one file per
+statistic for each block of days (a year by default). Each video has a row, the rows are
+allocated in the order the videos are first seen and the row of each video is kept in an append
+only index file. The values are stored as unsigned 32 bit integers offset by one, so zero marks a
+day without a snapshot; files are extended with zeros (which the file system stores sparsely) as
+videos are added, so the history stays cheap as the days pile up and only the blocks for the
+days being read or written are mapped.
+
+    python view_history.py -youtubeapikey <key>
+
+records today's snapshot of the statistics of every video in the video store
+"""
+import os
+import json
+import argparse
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+DEFAULT_VIEW_HISTORY_DIR = 'view_history'
+
+# the statistics kept for each video, as named in the statistics part of the API response
+history_metrics = ('viewCount', 'likeCount', 'commentCount')
+
+_missing = 0
+# largest value that can be stored, larger values are saturated
+_max_value = np.iinfo(np.uint32).max - 1
+
+
+class ViewHistory:
+    """
+    Daily snapshots of the statistics of the videos
+
+    :param directory: directory the history is kept in, created if it does not exist
+    :param start_date: first day the history can hold, this is fixed when the history is created
+    :param days_per_block: number of days in each file, this is fixed when the history is created
+    """
+
+    def __init__(self, directory: str = DEFAULT_VIEW_HISTORY_DIR,
+                 start_date: date = date(year=2019, month=9, day=1), days_per_block: int = 366):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        settings_fn = os.path.join(directory, 'settings.json')
+        if os.path.exists(settings_fn):
+            with open(settings_fn) as fp:
+                settings = json.load(fp)
+        else:
+            settings = {'start_date': start_date.isoformat(),
+                        'days_per_block': days_per_block,
+                        'video_capacity': 1024}
+            self.__write_settings(settings)
+        self.start_date = date.fromisoformat(settings['start_date'])
+        self.days_per_block = settings['days_per_block']
+        self.__video_capacity = settings['video_capacity']
+
+        self.__index_fn = os.path.join(directory, 'video_ids.txt')
+        self.__rows: Dict[str, int] = {}
+        if os.path.exists(self.__index_fn):
+            with open(self.__index_fn) as fp:
+                for row, video_id in enumerate(fp.read().split()):
+                    self.__rows[video_id] = row
+
+        # the memory maps of the blocks used so far, keyed by statistic and block number
+        self.__blocks: Dict[tuple, np.memmap] = {}
+
+    def __write_settings(self, settings: dict):
+        settings_fn = os.path.join(self.directory, 'settings.json')
+        with open(settings_fn + '.tmp', 'w') as fp:
+            json.dump(settings, fp, indent=1)
+        os.replace(settings_fn + '.tmp', settings_fn)
+
+    def __block_fn(self, metric: str, block: int) -> str:
+        return os.path.join(self.directory, f'{metric}_{block:04d}.u32')
+
+    def __block(self, metric: str, block: int, create: bool) -> Optional[np.memmap]:
+        """
+        Memory map of a block of days for a statistic, None if the block does not exist and is
+        not to be created
+        """
+        key = (metric, block)
+        if key not in self.__blocks:
+            block_fn = self.__block_fn(metric, block)
+            if not os.path.exists(block_fn):
+                if not create:
+                    return None
+                open(block_fn, 'wb').close()
+            self.__resize(block_fn)
+            self.__blocks[key] = np.memmap(block_fn, dtype=np.uint32, mode='r+',
+                                           shape=(self.__video_capacity, self.days_per_block))
+
+        return self.__blocks[key]
+
+    def __resize(self, block_fn: str):
+        # the file is extended with zeros, i.e. days without a snapshot
+        size = self.__video_capacity * self.days_per_block * np.dtype(np.uint32).itemsize
+        if os.path.getsize(block_fn) < size:
+            with open(block_fn, 'r+b') as fp:
+                fp.truncate(size)
+
+    def __add_videos(self, video_ids: Iterable[str]):
+        new_video_ids = [video_id for video_id in dict.fromkeys(video_ids)
+                         if video_id not in self.__rows]
+        if len(new_video_ids) == 0:
+            return
+
+        required = len(self.__rows) + len(new_video_ids)
+        if required > self.__video_capacity:
+            # the rows are the first dimension so growing the capacity only extends the files
+            self.flush()
+            self.__blocks.clear()
+            while self.__video_capacity < required:
+                self.__video_capacity *= 2
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith('.u32'):
+                    self.__resize(os.path.join(self.directory, file_name))
+            self.__write_settings({'start_date': self.start_date.isoformat(),
+                                   'days_per_block': self.days_per_block,
+                                   'video_capacity': self.__video_capacity})
+
+        with open(self.__index_fn, 'a') as fp:
+            for video_id in new_video_ids:
+                self.__rows[video_id] = len(self.__rows)
+                fp.write(video_id + '\n')
+
+    def __day_number(self, day: date) -> int:
+        day_number = (day - self.start_date).days
+        if day_number < 0:
+            raise ValueError(f'{day} is before the start of the history {self.start_date}')
+        return day_number
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def __contains__(self, video_id: str):
+        return video_id in self.__rows
+
+    def record(self, statistics: Dict[str, dict], day: Optional[date] = None):
+        """
+        Record a snapshot of the statistics of videos, a later snapshot on the same day replaces
+        the earlier one
+
+        :param statistics: statistics keyed by video ID, as returned by
+                           YouTubeWrapper.get_statistics_bulk
+        :param day: day of the snapshot, by default today (UTC)
+        """
+        if len(statistics) == 0:
+            return
+        if day is None:
+            day = datetime.now(timezone.utc).date()
+        block, column = divmod(self.__day_number(day), self.days_per_block)
+
+        self.__add_videos(statistics.keys())
+        for metric in history_metrics:
+            rows = []
+            values = []
+            for video_id, video_statistics in statistics.items():
+                value = video_statistics.get(metric)
+                if value is None:
+                    # for example the likes of a video with them hidden
+                    continue
+                rows.append(self.__rows[video_id])
+                values.append(min(int(value), _max_value) + 1)
+            if len(rows) > 0:
+                self.__block(metric, block, create=True)[rows, column] = values
+
+    def series(self, video_ids: List[str], first_day: date, last_day: date,
+               metric: str = 'viewCount') -> np.ndarray:
+        """
+        Daily values of a statistic for a set of videos
+
+        :param video_ids: YouTube video IDs
+        :param first_day: first day to return
+        :param last_day: last day to return
+        :param metric: statistic to return, one of history_metrics
+        :return: array of videos × days, NaN where there is no snapshot
+        """
+        if metric not in history_metrics:
+            raise ValueError(f'unsupported metric {metric}, expected one of {history_metrics}')
+        first_day_number = self.__day_number(first_day)
+        last_day_number = self.__day_number(last_day)
+        output = np.full((len(video_ids), last_day_number - first_day_number + 1), np.nan)
+
+        known = [(output_row, self.__rows[video_id]) for output_row, video_id
+                 in enumerate(video_ids) if video_id in self.__rows]
+        if len(known) == 0:
+            return output
+        output_rows, rows = (np.array(values) for values in zip(*known))
+
+        for block in range(first_day_number // self.days_per_block,
+                           last_day_number // self.days_per_block + 1):
+            block_data = self.__block(metric, block, create=False)
+            if block_data is None:
+                continue
+            block_start = block * self.days_per_block
+            start = max(first_day_number, block_start)
+            stop = min(last_day_number, block_start + self.days_per_block - 1) + 1
+            values = block_data[rows, start - block_start:stop - block_start].astype(np.float64)
+            values[values == _missing] = np.nan
+            output[output_rows, start - first_day_number:stop - first_day_number] = values - 1
+
+        return output
+
+    def growth_curves(self, published: Dict[str, date], days: int,
+                      metric: str = 'viewCount') -> np.ndarray:
+        """
+        Daily values of a statistic for a set of videos aligned to the day each was published, so
+        the growth of videos published on different days can be compared
+
+        :param published: day each video was published, keyed by video ID
+        :param days: number of days after publication to return
+        :param metric: statistic to return, one of history_metrics
+        :return: array of videos (in the order of published) × days since publication (0 to
+                 days), NaN where there is no snapshot
+        """
+        output = np.full((len(published), days + 1), np.nan)
+        # the videos published on the same day are read together
+        by_day: Dict[date, List[int]] = {}
+        video_ids = list(published.keys())
+        for output_row, published_day in enumerate(published.values()):
+            if isinstance(published_day, datetime):
+                published_day = published_day.astimezone(timezone.utc).date()
+            by_day.setdefault(published_day, []).append(output_row)
+
+        for published_day, output_rows in by_day.items():
+            first_day = max(published_day, self.start_date)
+            offset = (first_day - published_day).days
+            if offset > days:
+                continue
+            last_day = date.fromordinal(published_day.toordinal() + days)
+            output[output_rows, offset:] = self.series([video_ids[row] for row in output_rows],
+                                                       first_day=first_day, last_day=last_day,
+                                                       metric=metric)
+
+        return output
+
+    def value_after_days(self, published: Dict[str, date], days: int,
+                         metric: str = 'viewCount') -> Dict[str, Optional[float]]:
+        """
+        The value of a statistic of each video a number of days after it was published, for
+        example the views in the first week. If there is no snapshot for that day the latest
+        snapshot before it is used
+
+        :param published: day each video was published, keyed by video ID
+        :param days: number of days after publication
+        :param metric: statistic to return, one of history_metrics
+        :return: value keyed by video ID, None for videos without a snapshot in that period
+        """
+        curves = self.growth_curves(published, days=days, metric=metric)
+        output = {}
+        for video_id, curve in zip(published.keys(), curves):
+            recorded = np.flatnonzero(~np.isnan(curve))
+            output[video_id] = None if len(recorded) == 0 else float(curve[recorded[-1]])
+
+        return output
+
+    def flush(self):
+        for block_data in self.__blocks.values():
+            block_data.flush()
+
+    def close(self):
+        self.flush()
+        self.__blocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+parse = argparse.ArgumentParser(description='Record a daily snapshot of the video statistics')
+parse.add_argument('-youtubeapikey', type=str, required=True)
+parse.add_argument('-history_dir', type=str, default=DEFAULT_VIEW_HISTORY_DIR)
+
+if __name__ == "__main__":
+
+    from google_access_lib import YouTubeWrapper
+    from video_store import VideoStore, DEFAULT_STORE_FN
+
+    command_args = parse.parse_args()
+
+    easy_wrapper = YouTubeWrapper()
+    easy_wrapper.initialize(api_key=command_args.youtubeapikey)
+
+    with VideoStore(DEFAULT_STORE_FN) as video_store, \
+            ViewHistory(command_args.history_dir) as view_history:
+        video_ids = [video_id for video_id, in video_store.connection.execute(
+            'SELECT video_id FROM videos WHERE detail IS NOT NULL')]
+        statistics = easy_wrapper.get_statistics_bulk(video_ids=video_ids)
+        video_store.update_statistics(statistics)
+        view_history.record(statistics)
+        print(f'statistics of {len(statistics)} videos recorded')
@@ -0,0 +1,254 @@
+"""
+This module provides the weekly aggregate of the videos in the video store, the number of videos,
+their total duration and their total views × duration for each channel and week. The reports
+read the totals for the weeks they show rather than grouping every video each time they run.
+
+The aggregate is held in two tables of the video store:
+- video_weeks: the contribution of each video (its channel, week, duration and views)
+- weekly_totals: the totals for each channel and week
+
+The totals are maintained by triggers on video_weeks, so adding a video or updating its
+statistics only changes the totals of its own week and the totals are always consistent with
+the contributions. The weeks are labelled the same way as pandas' W-MON grouping, by midnight
+(UTC) on the Monday they end on, a video published at any time on a Monday belongs to the week
+ending that Monday.
+
+The videos are split by whether they are streams and whether they are archive videos (longer
+than three hours, normally a compilation of many episodes) as the reports exclude these
+"""
+import sqlite3
+from datetime import datetime, time, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from dateutil.parser import isoparse
+
+from iso8601 import ISO8601_duration_to_time_delta
+
+# videos longer than this are archive videos with multiple episodes
+archive_duration = 3 * 60 * 60
+
+_schema = """
+CREATE TABLE IF NOT EXISTS video_weeks (
+    video_id TEXT PRIMARY KEY,
+    channel_id TEXT,
+    channel TEXT,
+    week_end TEXT NOT NULL,
+    stream INTEGER NOT NULL,
+    archive INTEGER NOT NULL,
+    duration REAL,
+    views INTEGER
+);
+CREATE TABLE IF NOT EXISTS weekly_totals (
+    channel_id TEXT,
+    week_end TEXT NOT NULL,
+    stream INTEGER NOT NULL,
+    archive INTEGER NOT NULL,
+    channel TEXT,
+    video_count INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    views_seconds REAL NOT NULL,
+    PRIMARY KEY (channel_id, week_end, stream, archive)
+);
+CREATE INDEX IF NOT EXISTS weekly_totals_week ON weekly_totals (week_end);
+CREATE TRIGGER IF NOT EXISTS video_weeks_insert AFTER INSERT ON video_weeks
+BEGIN
+    INSERT INTO weekly_totals (channel_id, week_end, stream, archive, channel, video_count,
+                               duration, views_seconds)
+    VALUES (NEW.channel_id, NEW.week_end, NEW.stream, NEW.archive, NEW.channel,
+            NEW.duration IS NOT NULL, COALESCE(NEW.duration, 0),
+            COALESCE(NEW.duration * NEW.views, 0))
+    ON CONFLICT (channel_id, week_end, stream, archive) DO UPDATE SET
+        channel=excluded.channel,
+        video_count=video_count + excluded.video_count,
+        duration=duration + excluded.duration,
+        views_seconds=views_seconds + excluded.views_seconds;
+END;
+CREATE TRIGGER IF NOT EXISTS video_weeks_delete AFTER DELETE ON video_weeks
+BEGIN
+    UPDATE weekly_totals SET
+        video_count=video_count - (OLD.duration IS NOT NULL),
+        duration=duration - COALESCE(OLD.duration, 0),
+        views_seconds=views_seconds - COALESCE(OLD.duration * OLD.views, 0)
+    WHERE channel_id IS OLD.channel_id AND week_end=OLD.week_end AND stream=OLD.stream AND
+        archive=OLD.archive;
+    DELETE FROM weekly_totals WHERE channel_id IS OLD.channel_id AND week_end=OLD.week_end AND
+        stream=OLD.stream AND archive=OLD.archive AND video_count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS video_weeks_update AFTER UPDATE ON video_weeks
+BEGIN
+    UPDATE weekly_totals SET
+        video_count=video_count - (OLD.duration IS NOT NULL),
+        duration=duration - COALESCE(OLD.duration, 0),
+        views_seconds=views_seconds - COALESCE(OLD.duration * OLD.views, 0)
+    WHERE channel_id IS OLD.channel_id AND week_end=OLD.week_end AND stream=OLD.stream AND
+        archive=OLD.archive;
+    DELETE FROM weekly_totals WHERE channel_id IS OLD.channel_id AND week_end=OLD.week_end AND
+        stream=OLD.stream AND archive=OLD.archive AND video_count <= 0;
+    INSERT INTO weekly_totals (channel_id, week_end, stream, archive, channel, video_count,
+                               duration, views_seconds)
+    VALUES (NEW.channel_id, NEW.week_end, NEW.stream, NEW.archive, NEW.channel,
+            NEW.duration IS NOT NULL, COALESCE(NEW.duration, 0),
+            COALESCE(NEW.duration * NEW.views, 0))
+    ON CONFLICT (channel_id, week_end, stream, archive) DO UPDATE SET
+        channel=excluded.channel,
+        video_count=video_count + excluded.video_count,
+        duration=duration + excluded.duration,
+        views_seconds=views_seconds + excluded.views_seconds;
+END;
+"""
+
+
+def week_ending(published: datetime) -> datetime:
+    """
+    Midnight (UTC) on the Monday ending the week a video was published in, matching the labels
+    of pandas' W-MON grouping (which groups by the date, so the whole of a Monday is in the week
+    ending that day)
+
+    :param published: publish date of the video
+    """
+    published = published.astimezone(timezone.utc)
+    return datetime.combine(published.date(), time(), tzinfo=timezone.utc) + \
+        timedelta(days=(7 - published.weekday()) % 7)
+
+
+def video_contribution(detail: dict) -> tuple:
+    """
+    Contribution of a video to the weekly totals
+
+    :param detail: video metadata record as returned by YouTubeWrapper.get_metadata_bulk
+    :return: row of the video_weeks table
+    """
+    duration = ISO8601_duration_to_time_delta(detail['contentDetails']['duration'])
+    if duration is not None:
+        duration = duration.total_seconds()
+    views = detail.get('statistics', {}).get('viewCount')
+
+    return (detail['video_id'], detail.get('channel_id'), detail.get('Channel'),
+            f'{week_ending(isoparse(detail["publishedAt"])):%Y-%m-%dT%H:%M:%SZ}',
+            int(detail.get('liveStreamingDetails') is not None),
+            int(duration is not None and duration > archive_duration),
+            duration,
+            None if views is None else int(views))
+
+
+class WeeklyCube:
+    """
+    Weekly totals of the videos for each channel, held in the video store database. The updates
+    are made in the caller's transaction so the totals are updated along with the videos
+
+    :param connection: connection to the video store database
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.connection.executescript(_schema)
+
+    def update_details(self, details: Iterable[dict]):
+        """
+        Add (or replace) the contributions of videos
+
+        :param details: video metadata records as returned by YouTubeWrapper.get_metadata_bulk
+        """
+        self.connection.executemany(
+            'INSERT INTO video_weeks (video_id, channel_id, channel, week_end, stream, archive, '
+            'duration, views) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (video_id) DO UPDATE SET channel_id=excluded.channel_id, '
+            'channel=excluded.channel, week_end=excluded.week_end, stream=excluded.stream, '
+            'archive=excluded.archive, duration=excluded.duration, views=excluded.views',
+            [video_contribution(detail) for detail in details])
+
+    def update_views(self, views: dict):
+        """
+        Update the views of videos already in the totals
+
+        :param views: view counts keyed by video ID
+        """
+        self.connection.executemany(
+            'UPDATE video_weeks SET views=? WHERE video_id=?',
+            [(int(view_count), video_id) for video_id, view_count in views.items()
+             if view_count is not None])
+
+    def rebuild(self, details: Iterable[dict]):
+        """
+        Discard the totals and rebuild them from the metadata of every video
+
+        :param details: metadata records of every video in the store
+        """
+        self.connection.execute('DELETE FROM video_weeks')
+        self.connection.execute('DELETE FROM weekly_totals')
+        self.update_details(details)
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM video_weeks').fetchone()[0]
+
+    def totals(self, channel_id_list: Optional[List[str]] = None,
+               first_week: Optional[datetime] = None, last_week: Optional[datetime] = None,
+               include_streams: bool = True, include_archives: bool = True,
+               exclude_video_ids: Iterable[str] = ()) -> List[dict]:
+        """
+        Weekly totals for each channel, the cost depends on the number of weeks and channels
+        requested rather than the number of videos
+
+        :param channel_id_list: optional YouTube channel IDs to return, by default all channels
+        :param first_week: optional end of the first week to return
+        :param last_week: optional end of the last week to return
+        :param include_streams: include the streamed videos in the totals
+        :param include_archives: include the archive videos (over three hours long) in the
+                                 totals
+        :param exclude_video_ids: videos to leave out of the totals, for example a stream that
+                                  was not marked as one
+        :return: list of the totals, each a dictionary with the channel_id, Channel, week_end
+                 (a datetime), video_count, duration (seconds) and views_seconds, ordered by
+                 channel and week
+        """
+        conditions = []
+        arguments = []
+        if channel_id_list is not None:
+            conditions.append(f'channel_id IN ({",".join("?" * len(channel_id_list))})')
+            arguments += list(channel_id_list)
+        if first_week is not None:
+            conditions.append('week_end >= ?')
+            arguments.append(f'{first_week.astimezone(timezone.utc):%Y-%m-%dT%H:%M:%SZ}')
+        if last_week is not None:
+            conditions.append('week_end <= ?')
+            arguments.append(f'{last_week.astimezone(timezone.utc):%Y-%m-%dT%H:%M:%SZ}')
+        if not include_streams:
+            conditions.append('stream = 0')
+        if not include_archives:
+            conditions.append('archive = 0')
+        where = '' if len(conditions) == 0 else ' WHERE ' + ' AND '.join(conditions)
+
+        totals = {}
+        for channel_id, channel, week_end, video_count, duration, views_seconds in \
+                self.connection.execute(
+                    f'SELECT channel_id, MAX(channel), week_end, SUM(video_count), SUM(duration), '
+                    f'SUM(views_seconds) FROM weekly_totals{where} '
+                    f'GROUP BY channel_id, week_end ORDER BY channel_id, week_end', arguments):
+            totals[(channel_id, week_end)] = {'channel_id': channel_id,
+                                              'Channel': channel,
+                                              'week_end': week_end,
+                                              'video_count': video_count,
+                                              'duration': duration,
+                                              'views_seconds': views_seconds}
+
+        # the excluded videos are taken back out of the totals they contributed to
+        exclude_video_ids = list(exclude_video_ids)
+        if len(exclude_video_ids) > 0:
+            excluded = ' AND '.join(conditions +
+                                    [f'video_id IN ({",".join("?" * len(exclude_video_ids))})'])
+            for channel_id, week_end, duration, views in self.connection.execute(
+                    f'SELECT channel_id, week_end, duration, views FROM video_weeks '
+                    f'WHERE {excluded}', arguments + exclude_video_ids):
+                total = totals.get((channel_id, week_end))
+                if total is None or duration is None:
+                    continue
+                total['video_count'] -= 1
+                total['duration'] -= duration
+                total['views_seconds'] -= duration * (views or 0)
+                if total['video_count'] <= 0:
+                    del totals[(channel_id, week_end)]
+
+        for total in totals.values():
+            total['week_end'] = isoparse(total['week_end'])
+
+        return list(totals.values())
@@ -0,0 +1,107 @@
+"""
+This module provides the indicators shown on the weekly infographic. The weekly totals are
+reshaped once and every indicator (the totals, the Brain Blaze share, count and duration, their
+change from the previous week, means and maxima) is computed from that, rather than each gauge
+reshaping the totals again
+"""
+from typing import List, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from report_period import ReportPeriod
+
+
+class Indicator(NamedTuple):
+    """
+    An indicator shown as a gauge on the infographic
+    """
+    # value for the reported week
+    value: float
+    # value for the week before, the gauge shows the change from this
+    reference: float
+    # mean of the weeks with videos, shown as the threshold of the gauge
+    mean: float
+    # largest value of the weeks with videos
+    maximum: float
+
+    @property
+    def delta(self) -> float:
+        return self.value - self.reference
+
+
+def _finite(value) -> float:
+    # the mean or maximum of a channel without any videos is NaN
+    return 0.0 if pd.isna(value) else float(value)
+
+
+def _indicator(weekly: pd.Series, period: ReportPeriod) -> Indicator:
+    """
+    Build an indicator from a weekly series, the weeks without videos are NaN and are left out of
+    the mean and maximum but count as zero for the reported and previous week
+    """
+    return Indicator(value=_finite(weekly.get(period.week_end)),
+                     reference=_finite(weekly.get(period.previous_week_end)),
+                     mean=_finite(weekly.mean()),
+                     maximum=_finite(weekly.max()))
+
+
+class WeeklyMetrics:
+    """
+    Indicators for the weekly infographic of a report period
+
+    :param grouped_count: number of videos by channel and week, as returned by
+                          weekly_channel_totals_from_cube
+    :param grouped_duration: total duration in minutes by channel and week
+    :param channel_list: names of the channels shown in the report
+    :param period: period of the report
+    :param focus_channel: channel with its own indicators
+    """
+
+    def __init__(self, grouped_count: pd.Series, grouped_duration: pd.Series,
+                 channel_list: List[str], period: ReportPeriod,
+                 focus_channel: str = 'Brain Blaze'):
+        self.period = period
+        self.channel_list = channel_list
+        self.focus_channel = focus_channel
+
+        # the totals are reshaped to a table of weeks by channel once, a channel is NaN in the
+        # weeks it had no videos
+        durations = grouped_duration.unstack('Channel')
+        counts = grouped_count.unstack('Channel')
+        extra_channels = [channel for channel in durations.columns if channel not in channel_list]
+        columns = list(channel_list) + extra_channels
+        durations = durations.reindex(columns=columns)
+        counts = counts.reindex(index=durations.index, columns=columns)
+
+        # the channels without any videos in the report period
+        self.inactive_channels = [channel for channel in channel_list
+                                  if durations[channel].isna().all()]
+
+        weekly_total = durations.sum(axis=1, min_count=1)
+        share = durations.div(weekly_total, axis=0) * 100
+
+        self.total_duration = _indicator(weekly_total, period)
+        self.focus_share = _indicator(share[focus_channel], period)
+        self.focus_count = _indicator(counts[focus_channel], period)
+        self.focus_duration = _indicator(durations[focus_channel], period)
+
+        # duration of each channel in each week shown, inactive channels are zero
+        self.durations = durations.loc[period.plot_start:period.week_end].copy()
+        self.durations[self.inactive_channels] = 0
+
+    @property
+    def weeks(self) -> pd.DatetimeIndex:
+        """
+        The weeks shown in the report (the Monday each week ends on)
+        """
+        return self.durations.index
+
+    @property
+    def this_week_durations(self) -> pd.Series:
+        """
+        Duration in minutes of each channel in the reported week
+        """
+        if self.period.week_end not in self.durations.index:
+            return pd.Series(np.zeros(len(self.durations.columns)), index=self.durations.columns)
+        return self.durations.loc[self.period.week_end].fillna(0)